@@ -4,13 +4,18 @@ Machine Learning API routes.
 
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field
-from typing import Dict, Any, List, Optional
+from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from pydantic import BaseModel, Field, model_validator
+from typing import Dict, Any, List, Optional, Union, Literal
 import logging
 import numpy as np
+import asyncio
+import secrets
 from functools import lru_cache
 
+from core.config import settings
 from core.ml_models import MLModelManager
+from core.timeline import encode_curves
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -42,12 +47,45 @@ class MoodAnalysisRequest(BaseModel):
 
 class ClusteringRequest(BaseModel):
     features_matrix: List[List[float]]
-    n_clusters: int = 8
+    n_clusters: Union[int, Literal["auto"]] = Field(8, description="Number of clusters, or 'auto' to select it")
+    k_min: int = Field(2, ge=2, description="Smallest k evaluated in auto mode")
+    k_max: int = Field(12, ge=2, description="Largest k evaluated in auto mode")
+    selection_criterion: Literal["silhouette", "davies_bouldin", "elbow"] = "silhouette"
+    compute_silhouette: bool = Field(True, description="Compute a sampled silhouette score")
+    include_indices: bool = Field(True, description="Include per-cluster segment indices")
+
+    @model_validator(mode='after')
+    def check_k_range(self) -> 'ClusteringRequest':
+        if self.k_min > self.k_max:
+            raise ValueError("k_min must not be greater than k_max")
+        return self
 
 class VisualParametersRequest(BaseModel):
     audio_features: AudioFeatures
     mood_analysis: MoodAnalysis
 
+class GenreTimelineRequest(BaseModel):
+    mfcc_features: List[List[float]]
+    window_seconds: float = Field(3.0, gt=0, description="Length of each analysis window in seconds")
+    hop_seconds: float = Field(1.5, gt=0, description="Hop between consecutive windows in seconds")
+    frame_rate: Optional[float] = Field(None, gt=0, description="Feature frames per second (defaults to sample_rate / hop_length)")
+
+class MoodTimelineRequest(BaseModel):
+    audio_features: Dict[str, Any]
+    window_seconds: float = Field(3.0, gt=0, description="Length of each analysis window in seconds")
+    hop_seconds: float = Field(1.5, gt=0, description="Hop between consecutive windows in seconds")
+    frame_rate: Optional[float] = Field(None, gt=0, description="Feature frames per second (defaults to sample_rate / hop_length)")
+
+class VisualCurvesRequest(BaseModel):
+    audio_features: Dict[str, Any]
+    fps: float = Field(30, gt=0, description="Frame rate of the curves")
+    duration: Optional[float] = Field(None, gt=0, description="Curve duration in seconds (defaults to the audio duration)")
+    encoding: Literal["base64", "list"] = Field("base64", description="base64 float32 (little-endian) buffers or JSON lists")
+
+class ModelReloadRequest(BaseModel):
+    model_names: Optional[List[str]] = Field(None, description="Models to reload (all when omitted)")
+    wait: bool = Field(False, description="Wait for the swap to finish before responding")
+
 # Dependency injection with caching
 @lru_cache(maxsize=1)
 def get_ml_manager() -> MLModelManager:
@@ -56,6 +94,20 @@ def get_ml_manager() -> MLModelManager:
         raise RuntimeError("MLModelManager not initialized")
     return _ml_manager
 
+security = HTTPBasic()
+
+def authenticate_admin(credentials: HTTPBasicCredentials = Depends(security)):
+    """Require the configured admin credentials."""
+    if not settings.ADMIN_USERNAME or not settings.ADMIN_PASSWORD:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    valid_username = secrets.compare_digest(credentials.username, settings.ADMIN_USERNAME)
+    valid_password = secrets.compare_digest(credentials.password, settings.ADMIN_PASSWORD)
+    if not (valid_username and valid_password):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+# Keep references to background reloads so they are not garbage collected
+_reload_tasks = set()
+
 @router.post("/classify-genre")
 async def classify_genre(
     request: GenreClassificationRequest,
@@ -93,6 +145,47 @@ async def analyze_mood(
         logger.exception(f"Error analyzing mood: {e}")
         raise HTTPException(status_code=500, detail="Error analyzing mood")
 
+@router.post("/classify-genre-timeline")
+async def classify_genre_timeline(
+    request: GenreTimelineRequest,
+    ml_manager: MLModelManager = Depends(get_ml_manager)
+):
+    """Classify genre per overlapping time window of the MFCC features."""
+    try:
+        mfcc_array = np.array(request.mfcc_features, dtype=np.float32)
+        results = await ml_manager.classify_audio_genre_timeline(
+            mfcc_array, request.window_seconds, request.hop_seconds, request.frame_rate
+        )
+        
+        return JSONResponse({
+            "status": "success",
+            "results": results
+        })
+        
+    except Exception as e:
+        logger.exception(f"Error classifying genre timeline: {e}")
+        raise HTTPException(status_code=500, detail="Error classifying genre timeline")
+
+@router.post("/analyze-mood-timeline")
+async def analyze_mood_timeline(
+    request: MoodTimelineRequest,
+    ml_manager: MLModelManager = Depends(get_ml_manager)
+):
+    """Analyze mood per overlapping time window of the audio features."""
+    try:
+        results = await ml_manager.analyze_audio_mood_timeline(
+            request.audio_features, request.window_seconds, request.hop_seconds, request.frame_rate
+        )
+        
+        return JSONResponse({
+            "status": "success",
+            "results": results
+        })
+        
+    except Exception as e:
+        logger.exception(f"Error analyzing mood timeline: {e}")
+        raise HTTPException(status_code=500, detail="Error analyzing mood timeline")
+
 @router.post("/cluster-segments")
 async def cluster_segments(
     request: ClusteringRequest,
@@ -102,7 +195,9 @@ async def cluster_segments(
     try:
         features_array = np.array(request.features_matrix)
         results = await ml_manager.cluster_audio_segments(
-            features_array, request.n_clusters
+            features_array, request.n_clusters,
+            request.compute_silhouette, request.include_indices,
+            (request.k_min, request.k_max), request.selection_criterion
         )
         
         return JSONResponse({
@@ -110,6 +205,10 @@ async def cluster_segments(
             "results": results
         })
         
+    except ValueError as e:
+        # Too few segments for the requested k (or k range)
+        logger.error(f"Invalid clustering request: {e}")
+        raise HTTPException(status_code=400, detail=f"Clustering error: {str(e)}")
     except Exception as e:
         logger.exception(f"Error clustering segments: {e}")
         raise HTTPException(status_code=500, detail="Error clustering segments")
@@ -134,6 +233,28 @@ async def generate_visual_parameters(
         logger.exception(f"Error generating visual parameters: {e}")
         raise HTTPException(status_code=500, detail="Error generating visual parameters")
 
+@router.post("/generate-visual-curves")
+async def generate_visual_curves(
+    request: VisualCurvesRequest,
+    ml_manager: MLModelManager = Depends(get_ml_manager)
+):
+    """Generate per-frame visual parameter curves aligned to the requested fps."""
+    try:
+        results = await ml_manager.generate_visual_parameter_curves(
+            request.audio_features, request.fps, request.duration
+        )
+        results["encoding"] = request.encoding
+        results["curves"] = encode_curves(results["curves"], request.encoding)
+        
+        return JSONResponse({
+            "status": "success",
+            "results": results
+        })
+        
+    except Exception as e:
+        logger.exception(f"Error generating visual curves: {e}")
+        raise HTTPException(status_code=500, detail="Error generating visual curves")
+
 @router.get("/models/status")
 async def get_models_status(
     ml_manager: MLModelManager = Depends(get_ml_manager)
@@ -151,6 +272,48 @@ async def get_models_status(
         logger.exception(f"Error getting models status: {e}")
         raise HTTPException(status_code=500, detail="Error getting models status")
 
+@router.post("/models/reload", dependencies=[Depends(authenticate_admin)])
+async def reload_models(
+    request: ModelReloadRequest,
+    ml_manager: MLModelManager = Depends(get_ml_manager)
+):
+    """Hot-swap models from settings.ML_CACHE_DIR without a restart. Requires authentication.
+
+    This process reloads right away (``wait`` waits for it only); other worker
+    processes pick the request up from a reload marker within ML_WATCH_INTERVAL.
+    """
+    model_names = request.model_names or list(ml_manager.MODEL_FILES)
+    unknown = [name for name in model_names if name not in ml_manager.MODEL_FILES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown models: {', '.join(unknown)}")
+    
+    try:
+        ml_manager.announce_reload(model_names)
+        if request.wait:
+            results = {}
+            for name in model_names:
+                results[name] = await ml_manager.reload_model(name)
+            return JSONResponse({
+                "status": "success",
+                "reloaded": results
+            })
+        
+        for name in model_names:
+            task = asyncio.create_task(ml_manager.reload_model(name))
+            _reload_tasks.add(task)
+            task.add_done_callback(_reload_tasks.discard)
+            # Failures are logged and recorded in the model status
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        
+        return JSONResponse({
+            "status": "accepted",
+            "reloading": model_names
+        }, status_code=202)
+        
+    except Exception as e:
+        logger.exception(f"Error reloading models: {e}")
+        raise HTTPException(status_code=500, detail="Error reloading models")
+
 @router.get("/models/genres")
 async def get_genre_labels(
     ml_manager: MLModelManager = Depends(get_ml_manager)
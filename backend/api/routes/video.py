@@ -2,18 +2,22 @@
 Video generation API routes.
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
 from fastapi.responses import JSONResponse, FileResponse
-from pydantic import BaseModel
-from typing import Dict, Any, Optional, List
+from pydantic import BaseModel, Field
+from typing import Dict, Any, Optional, List, Literal
 import logging
 import tempfile
 import os
+import shutil
+from uuid import uuid4
 from pathlib import Path
 from functools import lru_cache
 
 from core.video_generator import VideoGenerator
 from core.ml_models import MLModelManager
+from core.render_jobs import RenderJob, RenderJobQueue, FINISHED_STATES
+from core.thumbnails import thumbnail_dir
 from utils.file_validator import file_validator
 
 router = APIRouter()
@@ -22,12 +26,15 @@ logger = logging.getLogger(__name__)
 # Global instances (will be set by main.py)
 _video_generator: Optional[VideoGenerator] = None
 _ml_manager: Optional[MLModelManager] = None
+_render_jobs: Optional[RenderJobQueue] = None
 
-def set_global_instances(video_generator: VideoGenerator, ml_manager: MLModelManager):
+def set_global_instances(video_generator: VideoGenerator, ml_manager: MLModelManager,
+                         render_jobs: Optional[RenderJobQueue] = None):
     """Set global instances from main.py startup."""
-    global _video_generator, _ml_manager
+    global _video_generator, _ml_manager, _render_jobs
     _video_generator = video_generator
     _ml_manager = ml_manager
+    _render_jobs = render_jobs
 
 async def validate_audio_file(file: UploadFile) -> str:
     """
@@ -102,17 +109,32 @@ async def validate_video_file(file: UploadFile) -> str:
         logger.error(f"Error validating video file {file.filename}: {e}")
         raise HTTPException(status_code=400, detail=f"Video file validation error: {str(e)}")
 
+class EncoderOptions(BaseModel):
+    backend: Optional[Literal["ffmpeg", "opencv"]] = None
+    quality: Optional[Literal["draft", "fast", "balanced", "quality"]] = None
+    codec: Optional[str] = Field(None, description="ffmpeg video codec, e.g. libx264")
+    preset: Optional[str] = Field(None, description="Encoder speed preset (overrides the quality preset)")
+    crf: Optional[int] = Field(None, ge=0, le=51)
+    threads: Optional[int] = Field(None, ge=0, description="Encoder threads (0 = auto)")
+
 class VideoConfig(BaseModel):
     fps: int = 30
     width: int = 1920
     height: int = 1080
     duration: Optional[float] = None
+    render_workers: Optional[int] = Field(None, ge=1, description="Processes for chunked rendering (defaults to VIDEO_RENDER_WORKERS)")
+    draft: bool = Field(False, description="Low-resolution, low frame rate preview of this config")
+    encoder: Optional[EncoderOptions] = None
 
 class ParticleConfig(BaseModel):
-    num_particles: int = 100
+    num_particles: int = Field(100, ge=1, le=1_000_000)
     fps: int = 30
     width: int = 1920
     height: int = 1080
+    blend_mode: Literal['replace', 'additive', 'alpha'] = 'replace'
+    seed: Optional[int] = Field(None, ge=0)  # Defaults to a hash of the render inputs
+    draft: bool = Field(False, description="Low-resolution, low frame rate preview of this config")
+    encoder: Optional[EncoderOptions] = None
 
 class EffectConfig(BaseModel):
     type: str
@@ -135,6 +157,37 @@ def get_ml_manager() -> MLModelManager:
         raise RuntimeError("MLModelManager not initialized")
     return _ml_manager
 
+@lru_cache(maxsize=1)
+def get_render_jobs() -> RenderJobQueue:
+    """Get cached RenderJobQueue instance."""
+    if _render_jobs is None:
+        raise RuntimeError("RenderJobQueue not initialized")
+    return _render_jobs
+
+async def run_render_job(render_jobs: RenderJobQueue, kind: str, params: Dict[str, Any],
+                         job_id: Optional[str] = None, client_id: Optional[str] = None) -> RenderJob:
+    """Queue a render and wait for it without blocking the event loop.
+
+    With ``client_id``, progress events go to that /ws/video-generation client.
+    """
+    job = await render_jobs.submit(kind, params, job_id=job_id, client_id=client_id)
+    try:
+        job = await render_jobs.wait(job.id)
+    except KeyError:
+        # Removed from RENDER_JOBS_DIR while it was queued
+        raise HTTPException(status_code=404, detail="Render job not found")
+    if job.status != "completed":
+        raise RuntimeError(job.error or f"Render job {job.id} {job.status}")
+    return job
+
+def stage_job_input(render_jobs: RenderJobQueue, job_id: str, tmp_file_path: str, filename: str) -> str:
+    """Move a validated upload into the job's directory so it outlives the request."""
+    job_dir = render_jobs.job_files_dir(job_id)
+    job_dir.mkdir(parents=True, exist_ok=True)
+    staged_path = job_dir / f"input{Path(filename).suffix}"
+    shutil.move(tmp_file_path, staged_path)
+    return str(staged_path)
+
 class ReactiveVideoRequest(BaseModel):
     audio_features: Dict[str, Any]
     video_config: VideoConfig
@@ -142,21 +195,26 @@ class ReactiveVideoRequest(BaseModel):
 @router.post("/create-reactive")
 async def create_reactive_video(
     request: ReactiveVideoRequest,
-    video_generator: VideoGenerator = Depends(get_video_generator)
+    client_id: Optional[str] = None,
+    render_jobs: RenderJobQueue = Depends(get_render_jobs)
 ):
     """Create an audio-reactive video from extracted audio features."""
     try:
-        # Generate video
-        video_path = await video_generator.create_audio_reactive_video(
-            request.audio_features, request.video_config.dict()
-        )
+        # Generate video on the render queue
+        job = await run_render_job(render_jobs, "reactive", client_id=client_id, params={
+            "audio_features": request.audio_features,
+            "video_config": request.video_config.dict()
+        })
         
         return JSONResponse({
             "status": "success",
-            "video_path": video_path,
+            "job_id": job.id,
+            "video_path": job.result["video_path"],
             "config": request.video_config.dict()
         })
         
+    except HTTPException:
+        raise
     except (ValueError, TypeError, RuntimeError) as e:
         logger.error(f"Error creating reactive video: {e}")
         raise HTTPException(status_code=500, detail="Error creating reactive video")
@@ -170,29 +228,32 @@ async def create_reactive_video(
 @router.post("/create-spectrogram")
 async def create_spectrogram_video(
     audio_file: UploadFile = File(...),
-    spectrogram_type: str = "mel",
-    video_generator: VideoGenerator = Depends(get_video_generator)
+    spectrogram_type: Literal["mel", "chroma", "stft"] = "mel",
+    fps: int = Query(20, ge=1, le=60),
+    draft: bool = False,
+    client_id: Optional[str] = None,
+    render_jobs: RenderJobQueue = Depends(get_render_jobs)
 ):
     """Create a spectrogram visualization video."""
     try:
-        # Validate audio file using robust validation
-        content = await validate_audio_file(audio_file)
-        
-        # Save uploaded file temporarily
-        tmp_file_path = None
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(audio_file.filename).suffix) as tmp_file:
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
+        # Validate audio file using robust validation (streams it to a temporary file)
+        tmp_file_path = await validate_audio_file(audio_file)
         
         try:
-            # Generate spectrogram video
-            video_path = await video_generator.create_spectrogram_video(
-                tmp_file_path, spectrogram_type
-            )
+            # Generate spectrogram video on the render queue
+            job_id = uuid4().hex
+            audio_path = stage_job_input(render_jobs, job_id, tmp_file_path, audio_file.filename)
+            job = await run_render_job(render_jobs, "spectrogram", client_id=client_id, job_id=job_id, params={
+                "audio_path": audio_path,
+                "spectrogram_type": spectrogram_type,
+                "fps": fps,
+                "draft": draft
+            })
             
             return JSONResponse({
                 "status": "success",
-                "video_path": video_path,
+                "job_id": job.id,
+                "video_path": job.result["video_path"],
                 "spectrogram_type": spectrogram_type,
                 "audio_filename": audio_file.filename
             })
@@ -202,6 +263,8 @@ async def create_spectrogram_video(
             if os.path.exists(tmp_file_path):
                 os.unlink(tmp_file_path)
                 
+    except HTTPException:
+        raise
     except (ValueError, TypeError, RuntimeError) as e:
         logger.error(f"Error creating spectrogram video: {e}")
         raise HTTPException(status_code=500, detail="Error creating spectrogram video")
@@ -219,21 +282,26 @@ class ParticleVideoRequest(BaseModel):
 @router.post("/create-particles")
 async def create_particle_video(
     request: ParticleVideoRequest,
-    video_generator: VideoGenerator = Depends(get_video_generator)
+    client_id: Optional[str] = None,
+    render_jobs: RenderJobQueue = Depends(get_render_jobs)
 ):
     """Create a particle system video synchronized to audio."""
     try:
-        # Generate particle video
-        video_path = await video_generator.create_particle_system_video(
-            request.audio_features, request.particle_config.dict()
-        )
+        # Generate particle video on the render queue
+        job = await run_render_job(render_jobs, "particles", client_id=client_id, params={
+            "audio_features": request.audio_features,
+            "particle_config": request.particle_config.dict()
+        })
         
         return JSONResponse({
             "status": "success",
-            "video_path": video_path,
+            "job_id": job.id,
+            "video_path": job.result["video_path"],
             "particle_config": request.particle_config.dict()
         })
         
+    except HTTPException:
+        raise
     except (ValueError, TypeError, RuntimeError) as e:
         logger.error(f"Error creating particle video: {e}")
         raise HTTPException(status_code=500, detail="Error creating particle video")
@@ -300,18 +368,13 @@ async def add_audio_to_video(
 async def apply_video_effects(
     effects: List[EffectConfig],
     video_file: UploadFile = File(...),
+    parallel: Optional[bool] = None,
     video_generator: VideoGenerator = Depends(get_video_generator)
 ):
     """Apply effects to a video."""
     try:
-        # Validate video file using robust validation
-        content = await validate_video_file(video_file)
-        
-        # Save uploaded file temporarily
-        tmp_file_path = None
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(video_file.filename).suffix) as tmp_file:
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
+        # Validate video file using robust validation (streams it to a temporary file)
+        tmp_file_path = await validate_video_file(video_file)
         
         try:
             # Convert effects to dict format
@@ -319,7 +382,7 @@ async def apply_video_effects(
             
             # Apply effects
             output_path = await video_generator.apply_video_effects(
-                tmp_file_path, effects_dict
+                tmp_file_path, effects_dict, parallel=parallel
             )
             
             return JSONResponse({
@@ -352,36 +415,36 @@ class MoodVideoRequest(BaseModel):
 @router.post("/generate-from-mood")
 async def generate_video_from_mood(
     request: MoodVideoRequest,
-    video_generator: VideoGenerator = Depends(get_video_generator),
-    ml_manager: MLModelManager = Depends(get_ml_manager)
+    client_id: Optional[str] = None,
+    render_jobs: RenderJobQueue = Depends(get_render_jobs)
 ):
     """Generate video with visual parameters based on mood analysis."""
     try:
-        # Generate visual parameters from mood
-        visual_params = await ml_manager.generate_visual_parameters(
-            request.audio_features, request.mood_analysis
-        )
+        # Visual parameters are generated from the mood when the job starts
+        job = await run_render_job(render_jobs, "mood", client_id=client_id, params={
+            "audio_features": request.audio_features,
+            "mood_analysis": request.mood_analysis,
+            "video_config": request.video_config.dict()
+        })
         
-        # Create enhanced video config with visual parameters
+        response_params = job.result["visual_parameters"]
         enhanced_config = request.video_config.dict()
         enhanced_config.update({
-            "visual_parameters": visual_params,
+            "visual_parameters": response_params,
             "mood_based": True
         })
         
-        # Generate video
-        video_path = await video_generator.create_audio_reactive_video(
-            request.audio_features, enhanced_config
-        )
-        
         return JSONResponse({
             "status": "success",
-            "video_path": video_path,
-            "visual_parameters": visual_params,
+            "job_id": job.id,
+            "video_path": job.result["video_path"],
+            "visual_parameters": response_params,
             "mood": request.mood_analysis.get("top_mood"),
             "config": enhanced_config
         })
         
+    except HTTPException:
+        raise
     except (ValueError, TypeError, RuntimeError) as e:
         logger.error(f"Error generating mood-based video: {e}")
         raise HTTPException(status_code=500, detail="Error generating mood-based video")
@@ -392,6 +455,185 @@ async def generate_video_from_mood(
         logger.error(f"Unhandled error generating mood-based video: {e}")
         raise HTTPException(status_code=500, detail="An unexpected error occurred.")
 
+class RenderJobRequest(BaseModel):
+    kind: Literal["reactive", "particles", "mood"]
+    audio_features: Dict[str, Any]
+    video_config: Optional[VideoConfig] = None
+    particle_config: Optional[ParticleConfig] = None
+    mood_analysis: Optional[Dict[str, Any]] = None
+    priority: int = 0
+    client_id: Optional[str] = None  # /ws/video-generation client to stream progress to
+    stream: bool = Field(False, description="Publish the render as HLS while it is rendering")
+
+def _job_or_404(render_jobs: RenderJobQueue, job_id: str) -> RenderJob:
+    job = render_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Render job not found")
+    return job
+
+@router.post("/jobs")
+async def submit_render_job(
+    request: RenderJobRequest,
+    render_jobs: RenderJobQueue = Depends(get_render_jobs)
+):
+    """Queue a render and return its job id immediately."""
+    if request.kind == "particles" and request.particle_config is None:
+        raise HTTPException(status_code=400, detail="particles jobs need particle_config")
+    if request.kind in ("reactive", "mood") and request.video_config is None:
+        raise HTTPException(status_code=400, detail=f"{request.kind} jobs need video_config")
+    if request.kind == "mood" and request.mood_analysis is None:
+        raise HTTPException(status_code=400, detail="mood jobs need mood_analysis")
+    
+    params: Dict[str, Any] = {"audio_features": request.audio_features, "stream": request.stream}
+    if request.kind == "particles":
+        params["particle_config"] = request.particle_config.dict()
+    else:
+        params["video_config"] = request.video_config.dict()
+    if request.kind == "mood":
+        params["mood_analysis"] = request.mood_analysis
+    
+    try:
+        job = await render_jobs.submit(request.kind, params, request.priority, client_id=request.client_id)
+        return JSONResponse(job.summary(), status_code=202)
+    except (ValueError, OSError) as e:
+        logger.error(f"Error queueing render job: {e}")
+        raise HTTPException(status_code=500, detail="Error queueing render job")
+
+@router.post("/jobs/spectrogram")
+async def submit_spectrogram_job(
+    audio_file: UploadFile = File(...),
+    spectrogram_type: Literal["mel", "chroma", "stft"] = "mel",
+    fps: int = Query(20, ge=1, le=60),
+    draft: bool = False,
+    stream: bool = False,
+    priority: int = 0,
+    client_id: Optional[str] = None,
+    render_jobs: RenderJobQueue = Depends(get_render_jobs)
+):
+    """Queue a spectrogram video render for an uploaded audio file."""
+    tmp_file_path = await validate_audio_file(audio_file)
+    try:
+        job_id = uuid4().hex
+        audio_path = stage_job_input(render_jobs, job_id, tmp_file_path, audio_file.filename)
+        job = await render_jobs.submit("spectrogram", {
+            "audio_path": audio_path,
+            "spectrogram_type": spectrogram_type,
+            "fps": fps,
+            "draft": draft,
+            "stream": stream
+        }, priority, job_id=job_id, client_id=client_id)
+        return JSONResponse(job.summary(), status_code=202)
+    except (ValueError, OSError) as e:
+        logger.error(f"Error queueing spectrogram job: {e}")
+        raise HTTPException(status_code=500, detail="Error queueing spectrogram job")
+    finally:
+        if os.path.exists(tmp_file_path):
+            os.unlink(tmp_file_path)
+
+@router.get("/jobs")
+async def list_render_jobs(
+    status: Optional[Literal["queued", "running", "completed", "failed", "cancelled"]] = None,
+    render_jobs: RenderJobQueue = Depends(get_render_jobs)
+):
+    """List render jobs, newest first."""
+    return JSONResponse({"jobs": [job.summary() for job in render_jobs.list(status)]})
+
+@router.get("/jobs/{job_id}")
+async def get_render_job(
+    job_id: str,
+    render_jobs: RenderJobQueue = Depends(get_render_jobs)
+):
+    """Status and progress of a render job."""
+    return JSONResponse(_job_or_404(render_jobs, job_id).summary())
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_render_job(
+    job_id: str,
+    render_jobs: RenderJobQueue = Depends(get_render_jobs)
+):
+    """Cancel a queued or running render job."""
+    job = _job_or_404(render_jobs, job_id)
+    if job.status in FINISHED_STATES:
+        raise HTTPException(status_code=409, detail=f"Render job already {job.status}")
+    job = render_jobs.cancel(job_id)
+    return JSONResponse(job.summary())
+
+@router.post("/jobs/{job_id}/promote")
+async def promote_render_job(
+    job_id: str,
+    priority: Optional[int] = None,
+    render_jobs: RenderJobQueue = Depends(get_render_jobs)
+):
+    """Queue the full-quality render of a draft job's config."""
+    _job_or_404(render_jobs, job_id)
+    try:
+        job = await render_jobs.promote(job_id, priority)
+        return JSONResponse(job.summary(), status_code=202)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except OSError as e:
+        logger.error(f"Error promoting render job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail="Error promoting render job")
+
+# Files written to a job's stream directory
+STREAM_MEDIA_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".ts": "video/mp2t"}
+
+@router.get("/jobs/{job_id}/stream/{filename}")
+async def get_render_job_stream(
+    job_id: str,
+    filename: str,
+    render_jobs: RenderJobQueue = Depends(get_render_jobs)
+):
+    """HLS playlist (index.m3u8) and segments of a job submitted with ``stream``.
+
+    The playlist grows while the job renders and is closed with #EXT-X-ENDLIST when it completes.
+    """
+    _job_or_404(render_jobs, job_id)
+    media_type = STREAM_MEDIA_TYPES.get(Path(filename).suffix)
+    if media_type is None or ".." in filename or "/" in filename or "\\" in filename:
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    path = render_jobs.stream_dir(job_id) / filename
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Stream file not available yet")
+    # Segments never change once written; the playlist does until the render ends
+    headers = {"Cache-Control": "no-cache"} if media_type == STREAM_MEDIA_TYPES[".m3u8"] else None
+    return FileResponse(path=str(path), media_type=media_type, headers=headers)
+
+# Files written next to a rendered video's sprite sheets
+THUMBNAIL_MEDIA_TYPES = {".jpg": "image/jpeg", ".json": "application/json", ".vtt": "text/vtt"}
+
+@router.get("/jobs/{job_id}/thumbnails/{filename}")
+async def get_render_job_thumbnails(
+    job_id: str,
+    filename: str,
+    render_jobs: RenderJobQueue = Depends(get_render_jobs)
+):
+    """Thumbnail sprite sheets of a completed job and their indexes (thumbnails.json, thumbnails.vtt)."""
+    job = _job_or_404(render_jobs, job_id)
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail=f"Render job is {job.status}")
+    media_type = THUMBNAIL_MEDIA_TYPES.get(Path(filename).suffix)
+    if media_type is None or ".." in filename or "/" in filename or "\\" in filename:
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    path = thumbnail_dir(job.result["video_path"]) / filename
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Thumbnail file not found")
+    return FileResponse(path=str(path), media_type=media_type)
+
+@router.get("/jobs/{job_id}/result")
+async def get_render_job_result(
+    job_id: str,
+    render_jobs: RenderJobQueue = Depends(get_render_jobs)
+):
+    """Download the video produced by a completed render job."""
+    job = _job_or_404(render_jobs, job_id)
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail=f"Render job is {job.status}")
+    video_path = Path(job.result["video_path"])
+    if not video_path.exists():
+        raise HTTPException(status_code=410, detail="Render output no longer exists")
+    return FileResponse(path=str(video_path), filename=video_path.name, media_type="video/mp4")
+
 @router.get("/download/{filename}")
 async def download_video(filename: str):
     """Download generated video file."""
@@ -4,7 +4,7 @@ WebSocket routes for real-time communication.
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from typing import Dict, List
+from typing import Dict, List, Optional, Any, Callable, Awaitable, Set, Tuple
 import json
 import logging
 import asyncio
@@ -234,6 +234,68 @@ async def send_video_update(client_id: str, update_data: Dict):
     })
     await manager.send_to_client(client_id, message)
 
+class ProgressCoalescer:
+    """Rate-limits progress updates to at most ``max_rate`` per second per key.
+
+    Updates published while a key is throttled replace each other, so the
+    newest value is the one eventually sent. Final updates skip the throttle
+    and are sent right away, superseding anything still pending.
+    """
+    
+    def __init__(self, send: Callable[[str, Dict], Awaitable], max_rate: float):
+        self._send = send
+        self.interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self._pending: Dict[str, Tuple[str, Dict]] = {}
+        self._last_sent: Dict[str, float] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        # Keep references to sends in flight so they are not garbage collected
+        self._sends: Set[asyncio.Task] = set()
+    
+    def publish(self, key: str, client_id: str, data: Dict, final: bool = False):
+        """Queue an update; must be called on the event loop."""
+        self._pending[key] = (client_id, data)
+        if final:
+            timer = self._timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+            self._flush(key)
+            self._last_sent.pop(key, None)
+            return
+        if key in self._timers:
+            return  # A send is already scheduled and will pick up this value
+        loop = asyncio.get_running_loop()
+        delay = self._last_sent.get(key, float("-inf")) + self.interval - loop.time()
+        if delay <= 0:
+            self._flush(key)
+        else:
+            self._timers[key] = loop.call_later(delay, self._flush, key)
+    
+    def _flush(self, key: str):
+        self._timers.pop(key, None)
+        item = self._pending.pop(key, None)
+        if item is None:
+            return
+        self._last_sent[key] = asyncio.get_running_loop().time()
+        task = asyncio.create_task(self._send(*item))
+        self._sends.add(task)
+        task.add_done_callback(self._send_done)
+    
+    def _send_done(self, task: asyncio.Task):
+        self._sends.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error sending progress update: {task.exception()}")
+
+# Render job progress goes out through send_video_update, throttled per job
+video_progress = ProgressCoalescer(send_video_update, settings.WS_PROGRESS_MAX_RATE)
+
+def publish_render_job(job: Dict[str, Any]):
+    """RenderJobQueue listener: push job progress to the client that submitted it."""
+    client_id = job.get("client_id")
+    if not client_id:
+        return
+    final = job["status"] in ("completed", "failed", "cancelled")
+    video_progress.publish(job["id"], client_id, {"event": "render_job", **job}, final=final)
+
 async def broadcast_system_notification(notification: str):
     """Broadcast a system notification to all connected clients."""
     message = json.dumps({
@@ -247,6 +309,8 @@ async def broadcast_system_notification(notification: str):
 security = HTTPBasic()
 
 def authenticate(credentials: HTTPBasicCredentials = Depends(security)):
+    if not settings.ADMIN_USERNAME or not settings.ADMIN_PASSWORD:
+        raise HTTPException(status_code=401, detail="Unauthorized")
     if credentials.username != settings.ADMIN_USERNAME or credentials.password != settings.ADMIN_PASSWORD:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
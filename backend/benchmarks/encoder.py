@@ -0,0 +1,63 @@
+"""
+Encoder throughput benchmark.
+
+Encodes synthetic frames with every quality preset and the OpenCV fallback and
+reports frames per second. Run from the backend directory:
+
+    python -m benchmarks.encoder --frames 300 --width 1920 --height 1080
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from core.video_encoder import ENCODER_PRESETS, create_encoder, ffmpeg_available
+
+def synthetic_frames(n_frames: int, width: int, height: int):
+    """Moving gradient frames, so the encoder sees realistic motion."""
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    for i in range(n_frames):
+        frame[..., 0] = (x + i * 4) % 256
+        frame[..., 1] = (y + i * 2) % 256
+        frame[..., 2] = (x[::-1] + y) / 2
+        yield frame
+
+def run(backend: str, quality: str, n_frames: int, width: int, height: int, fps: int) -> dict:
+    """Encode ``n_frames`` and return throughput and output size."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = Path(tmp_dir) / "bench.mp4"
+        start = time.perf_counter()
+        with create_encoder(str(output_path), width, height, fps, {'backend': backend, 'quality': quality}) as out:
+            for frame in synthetic_frames(n_frames, width, height):
+                out.write(frame)
+        elapsed = time.perf_counter() - start
+        size_mb = output_path.stat().st_size / 1e6
+    return {'fps': n_frames / elapsed, 'seconds': elapsed, 'size_mb': size_mb}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--fps', type=int, default=30)
+    args = parser.parse_args()
+
+    cases = [('opencv', 'balanced')]
+    if ffmpeg_available():
+        cases += [('ffmpeg', quality) for quality in ENCODER_PRESETS]
+    else:
+        print("ffmpeg not found; only the OpenCV fallback is benchmarked")
+
+    print(f"{args.frames} frames at {args.width}x{args.height}")
+    print(f"{'backend':<8} {'quality':<9} {'fps':>8} {'seconds':>8} {'MB':>8}")
+    for backend, quality in cases:
+        result = run(backend, quality, args.frames, args.width, args.height, args.fps)
+        print(f"{backend:<8} {quality:<9} {result['fps']:>8.1f} {result['seconds']:>8.2f} {result['size_mb']:>8.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Frame loop benchmark.
+
+Renders reactive frames the way the renderer used to - a freshly allocated
+RGB frame per call, converted by the encoder - and the way it does now: BGR
+drawn into one reused buffer and converted straight into a pooled buffer in
+the encoder's input layout. Reports per-frame time and bytes allocated per
+frame (tracemalloc), then the end-to-end encode rate of both pipelines.
+Run from the backend directory:
+
+    python -m benchmarks.frames --frames 300 --width 1920 --height 1080
+"""
+
+import argparse
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from core.timeline import FeatureTimeline
+from core.video_encoder import (BGR_CONVERSIONS, FrameSink, create_encoder, frame_shape,
+                                native_encoder_options, native_input_format)
+from core.video_generator import VideoGenerator
+
+def reference_frame(frame_idx: int, timeline: FeatureTimeline, tempo: float, width: int, height: int,
+                    frequency_bins) -> np.ndarray:
+    """The original reactive frame: a new RGB array and one cv2.line per wave column."""
+    time = frame_idx / timeline.fps
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    beat_intensity = timeline.value('beat_intensity', frame_idx)
+    spectral_intensity = timeline.value('spectral_intensity', frame_idx, 0.5)
+    center_x, center_y = width // 2, height // 2
+    circle_color = (int(255 * beat_intensity), int(255 * spectral_intensity), int(255 * (1 - spectral_intensity)))
+    cv2.circle(frame, (center_x, center_y), int(50 + beat_intensity * 100), circle_color, -1)
+    wave_y = center_y + int(100 * np.sin(time * tempo / 60 * 2 * np.pi))
+    for x in range(0, width, 10):
+        wave_height = int(20 * spectral_intensity * np.sin(x * 0.01 + time * 5))
+        cv2.line(frame, (x, wave_y), (x, wave_y + wave_height), (100, 200, 255), 2)
+    num_bars = min(len(frequency_bins), 32)
+    bar_width = width // num_bars
+    for i, bin_value in enumerate(frequency_bins[:num_bars]):
+        bar_height = int(bin_value * height * 0.3)
+        color_intensity = int(255 * (i / num_bars))
+        cv2.rectangle(frame, (i * bar_width, height - bar_height), (i * bar_width + bar_width - 2, height),
+                      (color_intensity, 255 - color_intensity, 128), -1)
+    return frame
+
+def build_timeline(n_frames: int, fps: int) -> FeatureTimeline:
+    duration = n_frames / fps
+    features = {
+        'duration': duration,
+        'beats': list(np.arange(0.25, duration, 0.5)),
+        'spectral_centroid': list(np.random.default_rng(0).random(n_frames) * 3000)
+    }
+    return FeatureTimeline.build(features, fps, n_frames, {})
+
+def frame_loops(timeline: FeatureTimeline, width: int, height: int, input_pix_fmt: str):
+    """Old and new frame step, each producing a frame in its encoder's input layout."""
+    generator = VideoGenerator()
+    bins = list(np.linspace(0.1, 1.0, 32))
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    buffer = np.empty(frame_shape(input_pix_fmt, width, height), dtype=np.uint8)
+    code = BGR_CONVERSIONS[input_pix_fmt]
+
+    def old(frame_idx: int) -> np.ndarray:
+        # ffmpeg took the RGB frame as is (and converted it itself); OpenCV
+        # converted every frame to BGR into a new array
+        rgb = reference_frame(frame_idx, timeline, 120.0, width, height, bins)
+        return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR) if input_pix_fmt == 'bgr24' else rgb
+
+    def new(frame_idx: int) -> np.ndarray:
+        generator._generate_reactive_frame(frame_idx, timeline, 120.0, width, height, bins, 1.0, frame)
+        if code is None:
+            np.copyto(buffer, frame)
+        else:
+            cv2.cvtColor(frame, code, dst=buffer)
+        return buffer
+
+    return old, new
+
+def profile(step, n_frames: int) -> dict:
+    """Mean milliseconds and bytes allocated per frame (after one warm-up frame)."""
+    step(0)
+    start = time.perf_counter()
+    for frame_idx in range(n_frames):
+        step(frame_idx)
+    ms = (time.perf_counter() - start) * 1000 / n_frames
+
+    tracemalloc.start()
+    allocated = 0
+    for frame_idx in range(min(n_frames, 30)):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        step(frame_idx)
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return {'ms': ms, 'kb': allocated / min(n_frames, 30) / 1024}
+
+def encode(n_frames: int, width: int, height: int, fps: int, new: bool) -> float:
+    """End-to-end frames per second of rendering plus encoding with the ffmpeg backend."""
+    timeline = build_timeline(n_frames, fps)
+    old_step, _ = frame_loops(timeline, width, height, 'rgb24')
+    generator = VideoGenerator()
+    bins = list(np.linspace(0.1, 1.0, 32))
+    options = {'quality': 'fast'}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = str(Path(tmp_dir) / "bench.mp4")
+        start = time.perf_counter()
+        if new:
+            frame = np.empty((height, width, 3), dtype=np.uint8)
+            with FrameSink(output_path, width, height, fps, native_encoder_options(width, height, options)) as sink:
+                for frame_idx in range(n_frames):
+                    generator._generate_reactive_frame(frame_idx, timeline, 120.0, width, height, bins, 1.0, frame)
+                    sink.write_bgr(frame)
+        else:
+            with create_encoder(output_path, width, height, fps, options) as out:
+                for frame_idx in range(n_frames):
+                    out.write(old_step(frame_idx))
+        return n_frames / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--fps', type=int, default=30)
+    args = parser.parse_args()
+
+    timeline = build_timeline(args.frames, args.fps)
+    native = native_input_format(args.width, args.height)
+    cases = [('opencv', 'bgr24')]
+    if native == 'yuv420p':
+        cases.append(('ffmpeg', 'yuv420p'))
+    print(f"{args.frames} frames at {args.width}x{args.height}, render loop only")
+    print(f"{'backend':<8} {'loop':<4} {'input':<8} {'ms/frame':>9} {'KiB/frame':>10}")
+    for backend, input_pix_fmt in cases:
+        old, new = frame_loops(timeline, args.width, args.height, input_pix_fmt)
+        for label, step, layout in (('old', old, 'bgr24' if backend == 'opencv' else 'rgb24'),
+                                    ('new', new, input_pix_fmt)):
+            result = profile(step, args.frames)
+            print(f"{backend:<8} {label:<4} {layout:<8} {result['ms']:>9.2f} {result['kb']:>10.1f}")
+
+    if native == 'yuv420p':
+        # The old ffmpeg loop leaves the RGB -> YUV conversion to ffmpeg, so compare end to end
+        print("\nrender + ffmpeg encode (quality 'fast')")
+        for label, new in (('old rgb24', False), ('new yuv420p', True)):
+            print(f"{label:<12} {encode(args.frames, args.width, args.height, args.fps, new):>8.1f} fps")
+    else:
+        print("\nffmpeg not found; end-to-end encode not benchmarked")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Particle rasterizer benchmark.
+
+Times ParticleRasterizer against the per-particle loops it replaces:
+cv2.circle into a freshly allocated frame for opaque particles, and a
+per-particle ROI accumulation for additive blending. Opaque particles are
+timed both as rendered (the loop below MIN_BATCH_DENSITY) and always batched.
+Also reports how far each output drifts from its reference. Run from the backend directory:
+
+    python -m benchmarks.particles --counts 1000 10000 100000
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from core.particles import ParticleRasterizer, ParticleSystem
+
+def _visible_arrays(particles: ParticleSystem):
+    visible = particles.visible()
+    life = particles.life[visible]
+    xs = particles.positions[visible, 0].astype(np.int32).tolist()
+    ys = particles.positions[visible, 1].astype(np.int32).tolist()
+    radii = (particles.sizes[visible] * life).astype(np.int32).tolist()
+    colors = particles.colors[visible] * life[:, None]
+    return xs, ys, radii, colors
+
+def reference_opaque(particles: ParticleSystem) -> np.ndarray:
+    """The original renderer: one cv2.circle call per particle into a new frame."""
+    frame = np.zeros((particles.height, particles.width, 3), dtype=np.uint8)
+    xs, ys, radii, colors = _visible_arrays(particles)
+    for x, y, radius, color in zip(xs, ys, radii, colors.astype(np.uint8).tolist()):
+        cv2.circle(frame, (x, y), radius, color, -1)
+    return frame
+
+def reference_additive(particles: ParticleSystem) -> np.ndarray:
+    """Additive blending one particle at a time with a disc sprite per ROI."""
+    pad = 64
+    accum = np.zeros((particles.height + 2 * pad, particles.width + 2 * pad, 3), dtype=np.float32)
+    sprites = {}
+    xs, ys, radii, colors = _visible_arrays(particles)
+    for x, y, radius, color in zip(xs, ys, radii, colors.astype(np.float32)):
+        sprite = sprites.get(radius)
+        if sprite is None:
+            dy, dx = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+            sprite = sprites[radius] = (dx * dx + dy * dy <= radius * radius + radius).astype(np.float32)[..., None]
+        accum[y + pad - radius:y + pad + radius + 1, x + pad - radius:x + pad + radius + 1] += sprite * color
+    return np.minimum(accum[pad:-pad, pad:-pad], 255).astype(np.uint8)
+
+def timed(render, repeats: int) -> float:
+    """Best wall time of ``repeats`` calls, in milliseconds."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        render()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--counts', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{args.width}x{args.height}, best of {args.repeats}; ms per frame, mean |diff| vs reference in brackets")
+    print(f"{'particles':>9} {'opaque ref':>11} {'replace':>15} {'batched':>8} {'additive ref':>13} {'additive':>15} "
+          f"{'alpha':>8}")
+    for count in args.counts:
+        particles = ParticleSystem(count, args.width, args.height, np.random.default_rng(0))
+        for _ in range(5):
+            particles.update(0.5)
+
+        rasterizers = {mode: ParticleRasterizer(args.width, args.height, mode) for mode in ParticleRasterizer.BLEND_MODES}
+        rasterizers['batched'] = ParticleRasterizer(args.width, args.height, 'replace')
+        rasterizers['batched'].MIN_BATCH_DENSITY = 0
+        opaque_diff = np.abs(rasterizers['replace'].render(particles).astype(np.int16) - reference_opaque(particles)).mean()
+        additive_diff = np.abs(rasterizers['additive'].render(particles).astype(np.int16) - reference_additive(particles)).mean()
+
+        opaque_ref = timed(lambda: reference_opaque(particles), args.repeats)
+        additive_ref = timed(lambda: reference_additive(particles), args.repeats)
+        times = {mode: timed(lambda: r.render(particles), args.repeats) for mode, r in rasterizers.items()}
+
+        print(f"{count:>9} {opaque_ref:>11.1f} {times['replace']:>7.1f} [{opaque_diff:>5.2f}] {times['batched']:>8.1f} "
+              f"{additive_ref:>13.1f} {times['additive']:>7.1f} [{additive_diff:>5.2f}] {times['alpha']:>8.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Resumable render checkpoints.
+A render is encoded as independently finalized segment files. A manifest records
+the finished frame ranges and the renderer state needed to continue, so an
+interrupted render resumes from its last complete segment.
+"""
+
+import numpy as np
+from typing import Callable, Dict, List, Optional, Any, Tuple
+import hashlib
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+# Bump when the manifest layout changes; older checkpoints are discarded
+CHECKPOINT_VERSION = 1
+
+def _fingerprint_default(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return {'dtype': str(value.dtype), 'shape': value.shape,
+                'sha256': hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()}
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+def render_fingerprint(*inputs: Any) -> str:
+    """Stable hash of a render's inputs; arrays are hashed by content."""
+    encoded = json.dumps(inputs, sort_keys=True, default=_fingerprint_default)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+class RenderCheckpoint:
+    """Segment files and manifest of one resumable render.
+
+    Frames ``[0, total_frames)`` are split into segments of ``segment_frames``.
+    A segment is encoded to a partial file and only recorded in the manifest
+    once it has been closed and renamed into place, so every file the manifest
+    lists is complete. A manifest written for different inputs (fingerprint)
+    or segmentation is discarded along with its segments.
+    """
+
+    def __init__(self, directory: Path, fingerprint: str, total_frames: int, segment_frames: int):
+        self.directory = Path(directory)
+        self.fingerprint = fingerprint
+        self.total_frames = total_frames
+        self.segment_frames = max(1, segment_frames)
+        self.ranges: List[Tuple[int, int]] = [
+            (start, min(start + self.segment_frames, total_frames))
+            for start in range(0, total_frames, self.segment_frames)
+        ]
+        self.completed: Dict[int, Dict[str, Any]] = {}
+        # Called with the segment index after each commit, e.g. to publish the segment
+        self.on_commit: Optional[Callable[[int], None]] = None
+        # Called once the segments have been joined into the final output
+        self.on_finish: Optional[Callable[[], None]] = None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.directory / MANIFEST_NAME
+
+    def _load(self):
+        try:
+            manifest = json.loads(self.manifest_path.read_text())
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            logger.warning(f"Discarding unreadable render checkpoint in {self.directory}: {e}")
+            self._clear()
+            return
+        expected = (CHECKPOINT_VERSION, self.fingerprint, self.total_frames, self.segment_frames)
+        found = (manifest.get('version'), manifest.get('fingerprint'),
+                 manifest.get('total_frames'), manifest.get('segment_frames'))
+        if found != expected:
+            logger.info(f"Discarding render checkpoint in {self.directory}: render inputs changed")
+            self._clear()
+            return
+        for entry in manifest.get('segments', []):
+            if self.segment_path(entry['index']).exists():
+                self.completed[entry['index']] = entry
+        if self.completed:
+            logger.info(f"Resuming render from checkpoint: {len(self.completed)}/{len(self.ranges)} segments done")
+
+    def _clear(self):
+        for path in self.directory.iterdir():
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+
+    def _write_manifest(self):
+        manifest = {
+            'version': CHECKPOINT_VERSION,
+            'fingerprint': self.fingerprint,
+            'total_frames': self.total_frames,
+            'segment_frames': self.segment_frames,
+            'segments': [self.completed[index] for index in sorted(self.completed)]
+        }
+        tmp_path = self.manifest_path.with_suffix('.json.tmp')
+        tmp_path.write_text(json.dumps(manifest))
+        os.replace(tmp_path, self.manifest_path)
+
+    def segment_path(self, index: int) -> Path:
+        return self.directory / f"segment_{index:05d}.mp4"
+
+    def partial_path(self, index: int) -> Path:
+        """Where a segment is encoded before it is committed."""
+        return self.directory / f"segment_{index:05d}.partial.mp4"
+
+    def _state_path(self, index: int) -> Path:
+        return self.directory / f"state_{index:05d}.npz"
+
+    def pending(self) -> List[int]:
+        """Indices of segments that still have to be rendered."""
+        return [index for index in range(len(self.ranges)) if index not in self.completed]
+
+    def frames_done(self) -> int:
+        return sum(end - start for index, (start, end) in enumerate(self.ranges) if index in self.completed)
+
+    def resume_index(self) -> int:
+        """First segment a sequential render has to redo: the end of the completed prefix."""
+        index = 0
+        while index in self.completed:
+            index += 1
+        return index
+
+    def commit(self, index: int, partial_path: Path, state: Optional[Dict[str, Any]] = None):
+        """Finalize a rendered segment and record it, with the renderer state after its last frame.
+
+        Arrays in ``state`` are stored in a .npz file next to the segment,
+        everything else in the manifest. Only the newest state is kept.
+        """
+        os.replace(partial_path, self.segment_path(index))
+        start, end = self.ranges[index]
+        entry: Dict[str, Any] = {'index': index, 'start_frame': start, 'end_frame': end}
+        if state is not None:
+            arrays = {key: value for key, value in state.items() if isinstance(value, np.ndarray)}
+            tmp_path = self._state_path(index).with_suffix('.npz.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self._state_path(index))
+            entry['state'] = {key: value for key, value in state.items() if key not in arrays}
+        # Only the newest state is kept; the manifest stops listing older ones
+        # before their files are deleted
+        superseded = []
+        if state is not None:
+            for previous, previous_entry in self.completed.items():
+                if previous != index and 'state' in previous_entry:
+                    del previous_entry['state']
+                    superseded.append(previous)
+        self.completed[index] = entry
+        self._write_manifest()
+        for previous in superseded:
+            self._state_path(previous).unlink(missing_ok=True)
+        if self.on_commit is not None:
+            self.on_commit(index)
+
+    def state(self, index: int) -> Optional[Dict[str, Any]]:
+        """Renderer state recorded after segment ``index``, if any."""
+        entry = self.completed.get(index)
+        if entry is None or 'state' not in entry or not self._state_path(index).exists():
+            return None
+        with np.load(self._state_path(index)) as arrays:
+            return {**entry['state'], **{key: arrays[key] for key in arrays.files}}
+
+    def segment_paths(self) -> List[Path]:
+        return [self.segment_path(index) for index in range(len(self.ranges))]
+
+    def remove(self):
+        """Delete the checkpoint once the final output exists."""
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,329 @@
+"""
+Clustering engine for audio segment feature matrices.
+Fits a fresh model per request and computes cluster statistics in vectorized passes.
+"""
+
+import numpy as np
+from scipy import sparse
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score, davies_bouldin_score, pairwise_distances_argmin
+from typing import Dict, List, Tuple, Optional, Any, Union
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+def _sample_indices(n_samples: int, sample_size: int, random_state: int) -> Optional[np.ndarray]:
+    """Deterministic row sample shared by every k candidate, or None for all rows."""
+    if sample_size >= n_samples:
+        return None
+    return np.sort(np.random.RandomState(random_state).choice(n_samples, sample_size, replace=False))
+
+def _fit_candidate(shm_name: str, shape: Tuple[int, int], dtype: str, n_clusters: int,
+                   engine_params: Dict[str, Any]) -> Dict[str, Any]:
+    """Fit and score one k candidate against a feature matrix in shared memory.
+
+    Runs in a worker process; the matrix is attached read-only, never copied.
+    Only scores and centers travel back, not the n-row labels.
+    """
+    from threadpoolctl import threadpool_limits
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        features = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        features.flags.writeable = False
+        engine = ClusteringEngine(**engine_params)
+        # One BLAS/OpenMP thread per worker; parallelism comes from the pool
+        with threadpool_limits(limits=1):
+            model = engine.fit(features, n_clusters)
+            labels = model.labels_.astype(np.int32)
+            centers = model.cluster_centers_
+            stats = engine.cluster_statistics(features, labels, centers)
+            scores = engine.quality_scores(features, labels)
+        del features
+        return {
+            'k': n_clusters,
+            'inertia': stats['inertia'],
+            'centers': centers,
+            'algorithm': type(model).__name__,
+            **scores
+        }
+    finally:
+        shm.close()
+
+class ClusteringEngine:
+    """Per-request k-means clustering that scales to very large feature matrices."""
+
+    def __init__(self,
+                 minibatch_threshold: int = settings.CLUSTER_MINIBATCH_THRESHOLD,
+                 batch_size: int = settings.CLUSTER_BATCH_SIZE,
+                 silhouette_sample_size: int = settings.CLUSTER_SILHOUETTE_SAMPLE_SIZE,
+                 random_state: int = 42):
+        self.minibatch_threshold = minibatch_threshold
+        self.batch_size = batch_size
+        self.silhouette_sample_size = silhouette_sample_size
+        self.random_state = random_state
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def scale_features(self, features_matrix: np.ndarray, scaler: Any = None) -> np.ndarray:
+        """Standardize features with a fitted scaler, or per request if none is fitted."""
+        features = np.asarray(features_matrix, dtype=np.float64)
+        if scaler is not None and hasattr(scaler, 'mean_'):
+            return scaler.transform(features)
+        mean = features.mean(axis=0)
+        std = features.std(axis=0)
+        std[std == 0] = 1.0
+        return (features - mean) / std
+
+    def fit(self, features: np.ndarray, n_clusters: int):
+        """Fit exact KMeans on small inputs and MiniBatchKMeans on large ones."""
+        n_samples = features.shape[0]
+        if n_clusters < 1 or n_clusters > n_samples:
+            raise ValueError(f"n_clusters must be between 1 and the number of segments ({n_samples})")
+
+        if n_samples <= self.minibatch_threshold:
+            model = KMeans(n_clusters=n_clusters, n_init=10, random_state=self.random_state)
+        else:
+            model = MiniBatchKMeans(
+                n_clusters=n_clusters,
+                batch_size=self.batch_size,
+                n_init=3,
+                random_state=self.random_state
+            )
+        model.fit(features)
+        return model
+
+    @staticmethod
+    def cluster_statistics(features: np.ndarray, labels: np.ndarray,
+                           centers: np.ndarray) -> Dict[str, np.ndarray]:
+        """Per-cluster sizes, means, variances and inertia in single scatter-add passes."""
+        n_samples = features.shape[0]
+        n_clusters = centers.shape[0]
+
+        # Sparse one-hot assignment matrix: one product sums every cluster at once
+        assignment = sparse.csr_matrix(
+            (np.ones(n_samples), (labels, np.arange(n_samples))),
+            shape=(n_clusters, n_samples)
+        )
+        sizes = np.bincount(labels, minlength=n_clusters)
+        sums = np.asarray(assignment @ features)
+        sq_sums = np.asarray(assignment @ (features * features))
+
+        safe_sizes = np.maximum(sizes, 1)[:, None]
+        means = sums / safe_sizes
+        variances = np.maximum(sq_sums / safe_sizes - means ** 2, 0.0).mean(axis=1)
+        variances[sizes == 0] = 0.0
+
+        # sum ||x - c||^2 = sum ||x||^2 - 2 c.sum(x) + n ||c||^2 per cluster
+        inertia = float(np.sum(
+            sq_sums.sum(axis=1) - 2 * np.einsum('ij,ij->i', sums, centers)
+            + sizes * np.einsum('ij,ij->i', centers, centers)
+        ))
+
+        return {
+            'sizes': sizes,
+            'means': means,
+            'variances': variances,
+            'inertia': max(inertia, 0.0)
+        }
+
+    @staticmethod
+    def segment_indices(labels: np.ndarray, sizes: np.ndarray) -> List[np.ndarray]:
+        """Group segment indices by cluster with one stable sort."""
+        order = np.argsort(labels, kind='stable')
+        return np.split(order, np.cumsum(sizes)[:-1])
+
+    def silhouette(self, features: np.ndarray, labels: np.ndarray,
+                   sample_size: Optional[int] = None) -> Dict[str, Any]:
+        """Silhouette score on a random sample so it stays affordable at scale."""
+        n_samples = features.shape[0]
+        n_labels = len(np.unique(labels))
+        if n_labels < 2 or n_labels >= n_samples:
+            return {
+                'available': False,
+                'message': "Silhouette score requires 2 <= n_clusters < n_segments"
+            }
+
+        sample_size = sample_size or self.silhouette_sample_size
+        sample_size = min(sample_size, n_samples)
+        score = silhouette_score(
+            features, labels,
+            sample_size=sample_size if sample_size < n_samples else None,
+            random_state=self.random_state
+        )
+        return {
+            'available': True,
+            'score': float(score),
+            'sample_size': int(sample_size)
+        }
+
+    def quality_scores(self, features: np.ndarray, labels: np.ndarray) -> Dict[str, Optional[float]]:
+        """Silhouette and Davies-Bouldin scores on a fixed random sample."""
+        n_labels = len(np.unique(labels))
+        if n_labels < 2 or n_labels >= features.shape[0]:
+            return {'silhouette': None, 'davies_bouldin': None}
+        sample = _sample_indices(features.shape[0], self.silhouette_sample_size, self.random_state)
+        if sample is not None:
+            features, labels = features[sample], labels[sample]
+            if len(np.unique(labels)) < 2:
+                return {'silhouette': None, 'davies_bouldin': None}
+        return {
+            'silhouette': float(silhouette_score(features, labels)),
+            'davies_bouldin': float(davies_bouldin_score(features, labels))
+        }
+
+    @staticmethod
+    def elbow_point(ks: List[int], inertias: List[float]) -> int:
+        """k with the largest distance below the chord joining the inertia curve's endpoints."""
+        if len(ks) < 3:
+            return ks[0]
+        x = np.asarray(ks, dtype=np.float64)
+        y = np.asarray(inertias, dtype=np.float64)
+        x = (x - x[0]) / (x[-1] - x[0])
+        y_range = y[0] - y[-1]
+        y = (y[0] - y) / y_range if y_range > 0 else np.zeros_like(y)
+        return int(ks[int(np.argmax(y - x))])
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Lazily start the worker pool used for k sweeps."""
+        with self._executor_lock:
+            if self._executor is None:
+                max_workers = settings.CLUSTER_MAX_WORKERS or os.cpu_count() or 1
+                # spawn: the server process holds threads and torch state that must not be forked
+                self._executor = ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def shutdown(self):
+        """Stop the k-sweep worker pool."""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def sweep(self, features: np.ndarray, k_values: List[int]) -> List[Dict[str, Any]]:
+        """Fit every k candidate in parallel over a shared-memory copy of the features."""
+        features = np.ascontiguousarray(features, dtype=np.float64)
+        engine_params = {
+            'minibatch_threshold': self.minibatch_threshold,
+            'batch_size': self.batch_size,
+            'silhouette_sample_size': self.silhouette_sample_size,
+            'random_state': self.random_state
+        }
+        shm = shared_memory.SharedMemory(create=True, size=max(features.nbytes, 1))
+        try:
+            shared = np.ndarray(features.shape, dtype=features.dtype, buffer=shm.buf)
+            shared[:] = features
+            executor = self._get_executor()
+            futures = [
+                executor.submit(_fit_candidate, shm.name, features.shape, features.dtype.str, k, engine_params)
+                for k in k_values
+            ]
+            candidates = [future.result() for future in futures]
+            del shared
+        finally:
+            shm.close()
+            shm.unlink()
+        return sorted(candidates, key=lambda c: c['k'])
+
+    def select_k(self, candidates: List[Dict[str, Any]], criterion: str = 'silhouette') -> int:
+        """Choose the best k from scored candidates."""
+        ks = [c['k'] for c in candidates]
+        if criterion == 'elbow':
+            return self.elbow_point(ks, [c['inertia'] for c in candidates])
+        scored = [c for c in candidates if c[criterion] is not None]
+        if not scored:
+            return self.elbow_point(ks, [c['inertia'] for c in candidates])
+        if criterion == 'davies_bouldin':
+            return min(scored, key=lambda c: c['davies_bouldin'])['k']
+        return max(scored, key=lambda c: c['silhouette'])['k']
+
+    def cluster(self, features_matrix: np.ndarray, n_clusters: Union[int, str], scaler: Any = None,
+                compute_silhouette: bool = True, include_indices: bool = True,
+                k_range: Tuple[int, int] = (2, 12), criterion: str = 'silhouette') -> Dict[str, Any]:
+        """Scale, fit and summarize a feature matrix.
+
+        With ``n_clusters='auto'`` every k in ``k_range`` (inclusive) is fitted in
+        parallel and the best one according to ``criterion`` is returned together
+        with the full score curve.
+        """
+        if len(features_matrix.shape) != 2:
+            raise ValueError("Features matrix should be 2D")
+        if criterion not in ('silhouette', 'davies_bouldin', 'elbow'):
+            raise ValueError(f"Unknown k selection criterion: {criterion}")
+
+        features = self.scale_features(features_matrix, scaler)
+        n_samples = features.shape[0]
+        k_selection = None
+
+        if n_clusters == 'auto':
+            k_min = max(2, k_range[0])
+            k_max = min(k_range[1], n_samples - 1)
+            if k_min > k_max:
+                raise ValueError(f"Cannot select k in [{k_range[0]}, {k_range[1]}] for {n_samples} segments")
+            candidates = self.sweep(features, list(range(k_min, k_max + 1)))
+            n_clusters = self.select_k(candidates, criterion)
+            best = next(c for c in candidates if c['k'] == n_clusters)
+            # k-means labels are the nearest centers, so only the winner's are computed
+            labels = pairwise_distances_argmin(features, best['centers']).astype(np.int64)
+            centers = best['centers']
+            algorithm = best['algorithm']
+            k_selection = {
+                'criterion': criterion,
+                'selected_k': int(n_clusters),
+                'elbow_k': self.elbow_point([c['k'] for c in candidates], [c['inertia'] for c in candidates]),
+                'curve': [
+                    {
+                        'k': int(c['k']),
+                        'inertia': float(c['inertia']),
+                        'silhouette': c['silhouette'],
+                        'davies_bouldin': c['davies_bouldin']
+                    }
+                    for c in candidates
+                ]
+            }
+        else:
+            model = self.fit(features, n_clusters)
+            labels = model.labels_.astype(np.int64)
+            centers = model.cluster_centers_
+            algorithm = type(model).__name__
+
+        stats = self.cluster_statistics(features, labels, centers)
+        sizes = stats['sizes']
+        indices = self.segment_indices(labels, sizes) if include_indices else None
+
+        cluster_analysis = []
+        for i in range(n_clusters):
+            analysis = {
+                'cluster_id': int(i),
+                'size': int(sizes[i]),
+                'percentage': float(sizes[i] / n_samples * 100),
+                'center': centers[i].tolist(),
+                'variance': float(stats['variances'][i])
+            }
+            if indices is not None:
+                analysis['segment_indices'] = indices[i].tolist()
+            cluster_analysis.append(analysis)
+
+        if compute_silhouette:
+            silhouette_info = self.silhouette(features, labels)
+        else:
+            silhouette_info = {'available': False, 'message': "Silhouette analysis not requested"}
+
+        return {
+            'cluster_labels': labels.tolist(),
+            'n_clusters': n_clusters,
+            'cluster_analysis': cluster_analysis,
+            'inertia': stats['inertia'],
+            'algorithm': algorithm,
+            'silhouette_info': silhouette_info,
+            **({'k_selection': k_selection} if k_selection else {})
+        }
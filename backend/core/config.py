@@ -16,6 +16,7 @@ class Settings:
     except ValueError as e:
         raise ValueError("Invalid PORT environment variable. Please set it to a valid integer.") from e
     DEBUG: bool = os.getenv("DEBUG", "true").lower() in ["true", "1", "yes"]
+    WORKERS: int = int(os.getenv("WORKERS", "1"))  # uvicorn worker processes (ignored with DEBUG reload)
     
     # CORS settings
     ALLOWED_ORIGINS: List[str] = [
@@ -41,6 +42,7 @@ class Settings:
     AUDIO_DIR: Path = TEMP_DIR / "audio"
     VIDEO_DIR: Path = TEMP_DIR / "video"
     ML_CACHE_DIR: Path = TEMP_DIR / "ml"
+    RENDER_JOBS_DIR: Path = TEMP_DIR / "jobs"
     
     # Audio processing settings
     SAMPLE_RATE: int = 44100
@@ -48,12 +50,56 @@ class Settings:
     FFT_SIZE: int = 2048
     HOP_LENGTH: int = 512
     
+    # Video rendering settings
+    VIDEO_RENDER_WORKERS: int = int(os.getenv("VIDEO_RENDER_WORKERS", "1"))  # Processes for chunked reactive renders
+    VIDEO_MIN_CHUNK_FRAMES: int = 60  # Smallest frame range worth a separate process
+    VIDEO_ENCODER_BACKEND: str = os.getenv("VIDEO_ENCODER_BACKEND", "ffmpeg")  # "ffmpeg" (pipe) or "opencv"
+    VIDEO_ENCODER_QUALITY: str = os.getenv("VIDEO_ENCODER_QUALITY", "balanced")  # draft, fast, balanced, quality
+    VIDEO_DRAFT_SCALE: float = float(os.getenv("VIDEO_DRAFT_SCALE", "0.3333"))  # Draft preview size relative to the full render
+    VIDEO_DRAFT_FPS: float = float(os.getenv("VIDEO_DRAFT_FPS", "15"))  # Approximate draft frame rate (a whole fraction of the full rate)
+    VIDEO_SINK_QUEUE_FRAMES: int = int(os.getenv("VIDEO_SINK_QUEUE_FRAMES", "8"))  # Frames buffered between render and encode threads
+    VIDEO_EFFECTS_WORKERS: int = int(os.getenv("VIDEO_EFFECTS_WORKERS", str(os.cpu_count() or 1)))  # Concurrent ffmpeg processes for split effects jobs
+    VIDEO_EFFECTS_PARALLEL_MIN_SECONDS: float = float(os.getenv("VIDEO_EFFECTS_PARALLEL_MIN_SECONDS", "300"))  # Inputs this long are split at keyframes
+    RENDER_JOB_WORKERS: int = int(os.getenv("RENDER_JOB_WORKERS", "2"))  # Renders executed concurrently by the job queue
+    RENDER_JOB_RETENTION_HOURS: float = float(os.getenv("RENDER_JOB_RETENTION_HOURS", "24"))  # Finished jobs are forgotten after this
+    RENDER_JOB_POLL_SECONDS: float = float(os.getenv("RENDER_JOB_POLL_SECONDS", "1"))  # How often server worker processes sync render job state
+    RENDER_CHECKPOINT_SECONDS: float = float(os.getenv("RENDER_CHECKPOINT_SECONDS", "10"))  # Segment length of resumable job renders
+    STREAM_SEGMENT_SECONDS: float = float(os.getenv("STREAM_SEGMENT_SECONDS", "2"))  # HLS segment length of streamed job renders
+    THUMBNAILS_ENABLED: bool = os.getenv("THUMBNAILS_ENABLED", "true").lower() in ["true", "1", "yes"]  # Sprite sheets for scrubbing previews
+    THUMBNAIL_INTERVAL_SECONDS: float = float(os.getenv("THUMBNAIL_INTERVAL_SECONDS", "2"))  # Video time between thumbnails
+    THUMBNAIL_WIDTH: int = 160  # Tile width in pixels; height follows the aspect ratio
+    THUMBNAIL_COLUMNS: int = 10
+    THUMBNAIL_ROWS: int = 10
+    THUMBNAIL_JPEG_QUALITY: int = 80
+    RENDER_CACHE_ENABLED: bool = os.getenv("RENDER_CACHE_ENABLED", "true").lower() in ["true", "1", "yes"]  # Reuse outputs of identical renders in VIDEO_DIR
+    FFMPEG_BINARY: str = os.getenv("FFMPEG_BINARY", "ffmpeg")
+    FFPROBE_BINARY: str = os.getenv("FFPROBE_BINARY", "ffprobe")
+    
     # ML model settings
     MODEL_CACHE_SIZE: int = 3  # Number of models to keep in memory
     ENABLE_GPU: bool = os.getenv("ENABLE_GPU", "true").lower() in ["true", "1", "yes"]
+    # Memory-map model weights read-only so every worker process shares one copy
+    ML_SHARED_WEIGHTS: bool = os.getenv("ML_SHARED_WEIGHTS", "false").lower() in ["true", "1", "yes"]
+    # Hot-swap model files replaced in ML_CACHE_DIR (replace files atomically, e.g. with mv)
+    ML_WATCH_MODELS: bool = os.getenv("ML_WATCH_MODELS", "false").lower() in ["true", "1", "yes"]
+    ML_WATCH_INTERVAL: float = float(os.getenv("ML_WATCH_INTERVAL", "5"))
+    ML_WINDOW_SECONDS: float = 3.0  # Window length for genre/mood timelines
+    ML_HOP_SECONDS: float = 1.5  # Hop between timeline windows
+    ML_RESULT_CACHE_SIZE: int = int(os.getenv("ML_RESULT_CACHE_SIZE", "256"))  # Memoized inference results (0 disables)
+    ML_RESULT_CACHE_TTL: float = float(os.getenv("ML_RESULT_CACHE_TTL", "600"))  # Seconds before a memoized result expires
+    ML_RESULT_CACHE_DECIMALS: int = 4  # Input rounding used when hashing cache keys
+    CLUSTER_MINIBATCH_THRESHOLD: int = 20000  # Segments above which MiniBatchKMeans is used
+    CLUSTER_BATCH_SIZE: int = 4096  # MiniBatchKMeans batch size
+    CLUSTER_SILHOUETTE_SAMPLE_SIZE: int = 5000  # Rows sampled for silhouette scoring
+    CLUSTER_MAX_WORKERS: int = int(os.getenv("CLUSTER_MAX_WORKERS", "0"))  # k-sweep processes (0 = CPU count)
+    
+    # Admin credentials for management endpoints (admin routes are disabled when unset)
+    ADMIN_USERNAME: str = os.getenv("ADMIN_USERNAME", "")
+    ADMIN_PASSWORD: str = os.getenv("ADMIN_PASSWORD", "")
     
     # WebSocket settings
     WS_HEARTBEAT_INTERVAL: int = 30
     WS_MAX_CONNECTIONS: int = 100
+    WS_PROGRESS_MAX_RATE: float = float(os.getenv("WS_PROGRESS_MAX_RATE", "4"))  # Render progress events per second per job
 
 settings = Settings()
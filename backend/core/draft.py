@@ -0,0 +1,48 @@
+"""
+Draft preview renders.
+A draft renders the same config at a fraction of the resolution and frame rate
+with the fastest encoder preset. Pixel-sized parameters are scaled and the draft
+shows every n-th frame of the full render, so it looks like the final export.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Optional, Any
+from .config import settings
+
+# Encoder options a draft replaces with the 'draft' quality preset
+DRAFT_ENCODER_OVERRIDES = ('quality', 'preset', 'crf')
+
+@dataclass
+class RenderGeometry:
+    """Output size and timing of a render, relative to its full-quality config."""
+    width: int
+    height: int
+    fps: float  # Output frame rate
+    scale: float = 1.0  # Output pixels per full-resolution pixel
+    frame_step: int = 1  # Full-rate frames per output frame
+    draft: bool = False
+
+    def output_frames(self, full_frames: int) -> int:
+        """Output frames of a render that has ``full_frames`` frames at full rate."""
+        return (full_frames + self.frame_step - 1) // self.frame_step
+
+    def encoder_options(self, options: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if not self.draft:
+            return options
+        options = {k: v for k, v in (options or {}).items() if k not in DRAFT_ENCODER_OVERRIDES}
+        return {**options, 'quality': 'draft'}
+
+def render_geometry(width: int, height: int, fps: float, draft: bool = False) -> RenderGeometry:
+    """Geometry of a full render, or of its draft preview.
+
+    Draft dimensions are VIDEO_DRAFT_SCALE of the full size (rounded down to even
+    numbers for yuv420p) and the frame rate is divided by a whole number, so
+    draft frames fall exactly on full-rate frames.
+    """
+    if not draft:
+        return RenderGeometry(width, height, fps)
+    draft_width = max(2, int(width * settings.VIDEO_DRAFT_SCALE) // 2 * 2)
+    draft_height = max(2, int(height * settings.VIDEO_DRAFT_SCALE) // 2 * 2)
+    frame_step = max(1, int(round(fps / settings.VIDEO_DRAFT_FPS)))
+    return RenderGeometry(draft_width, draft_height, fps / frame_step,
+                          draft_width / width, frame_step, True)
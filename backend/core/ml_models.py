@@ -6,18 +6,28 @@ Handles model loading, inference, and caching.
 import numpy as np
 import torch
 import torch.nn as nn
-import tensorflow as tf
 from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
 import joblib
-from typing import Dict, List, Tuple, Optional, Any, Union
+from typing import Callable, Dict, List, Tuple, Optional, Any, Union
 import logging
 from pathlib import Path
 import asyncio
 from collections import OrderedDict
+from contextlib import contextmanager
+import copy
+import hashlib
+import os
+import threading
 import time
+try:
+    import fcntl
+except ImportError:  # Windows: no inter-process lock, workers may race on first start
+    fcntl = None
 from .config import settings
+from .clustering import ClusteringEngine
+from . import timeline
 
 logger = logging.getLogger(__name__)
 
@@ -40,14 +50,159 @@ class AudioClassifier(nn.Module):
     def forward(self, x):
         return self.network(x)
 
+class InferenceCache:
+    """TTL/LRU cache for deterministic inference results.
+
+    Keys combine a namespace (the model or analysis name), its version and a
+    hash of the rounded inputs, so a model reload makes old entries unreachable
+    and :meth:`invalidate` drops them eagerly.
+    """
+
+    def __init__(self, max_size: int = settings.ML_RESULT_CACHE_SIZE,
+                 ttl: float = settings.ML_RESULT_CACHE_TTL,
+                 decimals: int = settings.ML_RESULT_CACHE_DECIMALS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.decimals = decimals
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _update_digest(self, digest, value):
+        """Feed a value into the digest in a canonical, type-tagged form."""
+        if isinstance(value, dict):
+            digest.update(b'd')
+            for key in sorted(value, key=str):
+                digest.update(str(key).encode())
+                self._update_digest(digest, value[key])
+        elif isinstance(value, (list, tuple, np.ndarray)):
+            try:
+                array = np.asarray(value)
+            except ValueError:  # Ragged nested lists
+                array = np.empty(0, dtype=object)
+            if array.dtype.kind in 'biuf':
+                array = np.round(array.astype(np.float64), self.decimals)
+                digest.update(b'a' + str(array.shape).encode())
+                digest.update(np.ascontiguousarray(array).tobytes())
+            else:
+                digest.update(b'l')
+                for item in value:
+                    self._update_digest(digest, item)
+        elif isinstance(value, float):
+            digest.update(b'f' + repr(round(value, self.decimals)).encode())
+        else:
+            digest.update(b's' + repr(value).encode())
+
+    def make_key(self, namespace: str, version: int, *inputs) -> Tuple[str, int, str]:
+        """Build a cache key from a namespace, model version and input values."""
+        digest = hashlib.blake2b(digest_size=16)
+        for value in inputs:
+            self._update_digest(digest, value)
+        return namespace, version, digest.hexdigest()
+
+    def get(self, key) -> Optional[Any]:
+        """Return a copy of the cached result, or None on a miss."""
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(value)
+
+    def put(self, key, value: Any):
+        """Store a result, evicting the least recently used entries if needed."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, namespace: Optional[str] = None):
+        """Drop all entries, or only those belonging to one namespace."""
+        with self._lock:
+            if namespace is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == namespace]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit-rate statistics for status reporting."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': float(self.hits / lookups) if lookups else 0.0
+            }
+
 class MLModelManager:
     """Manages machine learning models for audio and video processing."""
-    
+
+    # Mood scores are linear in [1, brightness, energy, rhythmic_complexity, tempo_factor];
+    # one row per entry of mood_labels so scores for many windows are a single matmul.
+    _MOOD_WEIGHTS = np.array([
+        [0.0, 0.0, 0.4, 0.0, 0.6],     # energetic
+        [1.0, 0.0, -0.6, 0.0, -0.4],   # calm
+        [0.0, 0.5, 0.2, 0.0, 0.3],     # happy
+        [1.0, -0.5, 0.0, 0.0, -0.5],   # sad
+        [0.0, 0.0, 0.4, 0.3, 0.3],     # aggressive
+        [1.0, 0.0, -0.5, -0.5, 0.0],   # relaxed
+        [0.0, 0.0, 0.3, 0.3, 0.4],     # excited
+        [1.0, -0.4, -0.2, 0.0, -0.4],  # melancholic
+    ])
+    # Bump when the rule-based mood/visual logic changes so memoized results are not reused
+    _ANALYSIS_VERSION = 1
+    # Hot-swappable model artifacts in settings.ML_CACHE_DIR
+    MODEL_FILES = {
+        'audio_classifier': 'audio_classifier.pth',
+        'audio_clustering': 'audio_clustering.pkl',
+        'feature_scaler': 'feature_scaler.pkl'
+    }
+    # Written next to a model file to ask every server process to reload it
+    RELOAD_MARKER_SUFFIX = '.reload'
+
     def __init__(self):
         self.models = OrderedDict()
         self.model_cache_size = settings.MODEL_CACHE_SIZE
         self.device = self._get_device()
+        self.shared_weights = settings.ML_SHARED_WEIGHTS
         self.models = OrderedDict()
+        self.model_versions: Dict[str, int] = {}
+        self.inference_cache = InferenceCache()
+        self.clustering_engine = ClusteringEngine()
+        self.reload_status: Dict[str, Dict[str, Any]] = {}
+        self._model_loaders = {
+            'audio_classifier': self._load_or_create_audio_classifier,
+            'audio_clustering': self._load_or_create_clustering_model,
+            'feature_scaler': self._load_or_create_feature_scaler
+        }
+        self._model_signatures: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._reload_locks: Dict[str, asyncio.Lock] = {}
+        self._watch_task: Optional[asyncio.Task] = None
+        self._watch_files = False
+        self._reload_tokens: Dict[str, Optional[str]] = {}
         self._ready = False
         
         # Model metadata
@@ -86,25 +241,58 @@ class MLModelManager:
             model = None
             self._ready = False
     
+    @contextmanager
+    def _materialize_lock(self, path: Path):
+        """Inter-process lock so concurrent workers create a model file only once."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        lock_path = path.with_name(path.name + '.lock')
+        with open(lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _materialize_once(self, path: Path, save: Callable[[Path], None]) -> bool:
+        """Write a model file atomically unless another worker already did."""
+        with self._materialize_lock(path):
+            if path.exists():
+                return False
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            try:
+                save(tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+            return True
+
+    def _load_torch_state(self, model_path: Path) -> Dict[str, torch.Tensor]:
+        """Load a state dict, memory-mapped read-only when shared weights are enabled."""
+        if self.shared_weights:
+            return torch.load(model_path, map_location='cpu', mmap=True, weights_only=True)
+        return torch.load(model_path, map_location=self.device)
+
+    def _load_joblib(self, model_path: Path):
+        """Load a joblib artifact, memory-mapping its arrays when shared weights are enabled."""
+        return joblib.load(model_path, mmap_mode='r' if self.shared_weights else None)
+
     def _load_or_create_audio_classifier(self, model_path: Path):
         """Load or create audio genre/mood classifier."""
         try:
-            if model_path.exists():
-                # Load existing model
-                model = AudioClassifier()
-                model.load_state_dict(torch.load(model_path, map_location=self.device))
-                model.to(self.device)
-                model.eval()
-                logger.info("Loaded existing audio classifier")
-            else:
-                # Create new model with random weights
-                model = AudioClassifier()
-                model.to(self.device)
-                model.eval()
-                # Save for future use
-                model_path.parent.mkdir(parents=True, exist_ok=True)
-                torch.save(model.state_dict(), model_path)
-                logger.info("Created new audio classifier")
+            # Create new model with random weights; saved for future use
+            created = self._materialize_once(
+                model_path, lambda path: torch.save(AudioClassifier().state_dict(), path)
+            )
+            model = AudioClassifier()
+            state_dict = self._load_torch_state(model_path)
+            # assign=True keeps the mmapped tensors instead of copying them into fresh parameters
+            model.load_state_dict(state_dict, assign=self.shared_weights and self.device.type == 'cpu')
+            model.to(self.device)
+            model.eval()
+            logger.info("Created new audio classifier" if created else "Loaded existing audio classifier")
             return model
         except Exception as e:
             logger.error(f"Error loading audio classifier: {e}")
@@ -113,17 +301,11 @@ class MLModelManager:
     def _load_or_create_clustering_model(self, model_path: Path):
         """Load or create clustering model for audio segmentation."""
         try:
-            if model_path.exists():
-                # Load existing model
-                model = joblib.load(model_path)
-                logger.info("Loaded existing clustering model")
-            else:
-                # Create new model
-                model = KMeans(n_clusters=8, random_state=42)
-                # Save for future use
-                model_path.parent.mkdir(parents=True, exist_ok=True)
-                joblib.dump(model, model_path)
-                logger.info("Created new clustering model")
+            created = self._materialize_once(
+                model_path, lambda path: joblib.dump(KMeans(n_clusters=8, random_state=42), path)
+            )
+            model = self._load_joblib(model_path)
+            logger.info("Created new clustering model" if created else "Loaded existing clustering model")
             return model
         except Exception as e:
             logger.error(f"Error loading clustering model: {e}")
@@ -132,17 +314,11 @@ class MLModelManager:
     def _load_or_create_feature_scaler(self, scaler_path: Path):
         """Load or create feature scaler."""
         try:
-            if scaler_path.exists():
-                # Load existing scaler
-                scaler = joblib.load(scaler_path)
-                logger.info("Loaded existing feature scaler")
-            else:
-                # Create new scaler
-                scaler = StandardScaler()
-                # Save for future use
-                scaler_path.parent.mkdir(parents=True, exist_ok=True)
-                joblib.dump(scaler, scaler_path)
-                logger.info("Created new feature scaler")
+            created = self._materialize_once(
+                scaler_path, lambda path: joblib.dump(StandardScaler(), path)
+            )
+            scaler = self._load_joblib(scaler_path)
+            logger.info("Created new feature scaler" if created else "Loaded existing feature scaler")
             return scaler
         except Exception as e:
             logger.error(f"Error loading feature scaler: {e}")
@@ -155,6 +331,7 @@ class MLModelManager:
         try:
             model = await asyncio.to_thread(self._load_or_create_audio_classifier, model_path)
             self.models['audio_classifier'] = model
+            self._bump_model_version('audio_classifier')
             self._evict_cache_if_needed()
         except Exception as e:
             logger.error(f"Error loading audio classifier: {e}")
@@ -167,6 +344,7 @@ class MLModelManager:
         try:
             model = await asyncio.to_thread(self._load_or_create_clustering_model, model_path)
             self.models['audio_clustering'] = model
+            self._bump_model_version('audio_clustering')
             self._evict_cache_if_needed()
         except Exception as e:
             logger.error(f"Error loading clustering model: {e}")
@@ -179,17 +357,218 @@ class MLModelManager:
         try:
             scaler = await asyncio.to_thread(self._load_or_create_feature_scaler, scaler_path)
             self.models['feature_scaler'] = scaler
+            self._bump_model_version('feature_scaler')
             self._evict_cache_if_needed()
         except Exception as e:
             logger.error(f"Error loading feature scaler: {e}")
             raise
     
+    def _warm_up_model(self, model):
+        """Run one dummy inference so the first real request does not pay for lazy init."""
+        if isinstance(model, nn.Module):
+            first_layer = next(m for m in model.modules() if isinstance(m, nn.Linear))
+            with torch.no_grad():
+                model(torch.zeros(1, first_layer.in_features, device=self.device))
+        elif hasattr(model, 'n_features_in_'):
+            sample = np.zeros((1, model.n_features_in_))
+            if hasattr(model, 'predict'):
+                model.predict(sample)
+            elif hasattr(model, 'transform'):
+                model.transform(sample)
+
+    def _load_and_warm_up(self, model_name: str, model_path: Path):
+        """Load a replacement model from disk and warm it up (runs in a worker thread)."""
+        if not model_path.exists():
+            raise FileNotFoundError(f"Model file not found: {model_path}")
+        model = self._model_loaders[model_name](model_path)
+        self._warm_up_model(model)
+        return model
+
+    async def reload_model(self, model_name: str) -> Dict[str, Any]:
+        """Load a new version of a model in the background and swap it in atomically.
+
+        Requests already running keep the reference they hold to the old model; the
+        old version is released once they finish. On failure the old model stays.
+        """
+        if model_name not in self.MODEL_FILES:
+            raise ValueError(f"Unknown model: {model_name}")
+
+        lock = self._reload_locks.setdefault(model_name, asyncio.Lock())
+        async with lock:
+            model_path = settings.ML_CACHE_DIR / self.MODEL_FILES[model_name]
+            signature = self._file_signature(model_path)
+            self.reload_status[model_name] = {'state': 'loading', 'started_at': time.time()}
+            try:
+                model = await asyncio.to_thread(self._load_and_warm_up, model_name, model_path)
+            except Exception as e:
+                self.reload_status[model_name] = {'state': 'failed', 'error': str(e), 'finished_at': time.time()}
+                logger.error(f"Error reloading model {model_name}, keeping current version: {e}")
+                raise
+
+            # Single reference swap on the event loop thread
+            self.models[model_name] = model
+            self.models.move_to_end(model_name)
+            self._bump_model_version(model_name)
+            self._evict_cache_if_needed()
+            self._model_signatures[model_name] = signature
+
+            status = {
+                'state': 'ready',
+                'version': self.model_versions[model_name],
+                'finished_at': time.time()
+            }
+            self.reload_status[model_name] = status
+            logger.info(f"Hot-swapped model {model_name} (version {status['version']})")
+            return status
+
+    @staticmethod
+    def _file_signature(path: Path) -> Optional[Tuple[int, int]]:
+        """Modification time and size of a model file, or None if it is missing."""
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _reload_marker(self, model_name: str) -> Path:
+        return settings.ML_CACHE_DIR / (self.MODEL_FILES[model_name] + self.RELOAD_MARKER_SUFFIX)
+
+    def _read_reload_token(self, model_name: str) -> Optional[str]:
+        try:
+            return self._reload_marker(model_name).read_text()
+        except FileNotFoundError:
+            return None
+
+    def announce_reload(self, model_names: List[str]):
+        """Ask every other server process to reload models.
+
+        Each model gets a fresh token in its reload marker; the model watcher of
+        every process (see watch_model_files) reloads the model when the token
+        changes. The calling process still reloads on its own.
+        """
+        settings.ML_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        for model_name in model_names:
+            token = f"{os.getpid()}-{time.time_ns()}"
+            marker = self._reload_marker(model_name)
+            tmp_path = marker.with_name(f"{marker.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(token)
+            os.replace(tmp_path, marker)
+            self._reload_tokens[model_name] = token
+
+    async def watch_model_files(self, interval: float):
+        """Poll reload markers and model files and hot-swap any model that changed.
+
+        A model is reloaded as soon as its reload marker changes. Changed model
+        files are only watched with ``watch_files`` (see start_model_watcher), and
+        a change is only acted on once the file has been stable for one full
+        interval, so partially copied files are never loaded.
+        """
+        pending: Dict[str, Tuple[int, int]] = {}
+        while True:
+            await asyncio.sleep(interval)
+            for model_name in self.MODEL_FILES:
+                token = self._read_reload_token(model_name)
+                if token is not None and token != self._reload_tokens.get(model_name):
+                    self._reload_tokens[model_name] = token
+                    try:
+                        await self.reload_model(model_name)
+                    except Exception:
+                        pass  # Logged and recorded in reload_status
+            if not self._watch_files:
+                continue
+            for model_name, filename in self.MODEL_FILES.items():
+                signature = self._file_signature(settings.ML_CACHE_DIR / filename)
+                if signature is None or signature == self._model_signatures.get(model_name):
+                    pending.pop(model_name, None)
+                    continue
+                if pending.get(model_name) != signature:
+                    pending[model_name] = signature
+                    continue
+                pending.pop(model_name)
+                try:
+                    await self.reload_model(model_name)
+                except Exception:
+                    # Do not retry the same broken file on every poll
+                    self._model_signatures[model_name] = signature
+
+    def start_model_watcher(self, interval: float = settings.ML_WATCH_INTERVAL, watch_files: bool = True):
+        """Start watching settings.ML_CACHE_DIR for reload requests and, with
+        ``watch_files``, for replaced model files."""
+        if self._watch_task is not None:
+            return
+        self._watch_files = watch_files
+        for model_name, filename in self.MODEL_FILES.items():
+            self._model_signatures.setdefault(model_name, self._file_signature(settings.ML_CACHE_DIR / filename))
+            # Reload requests made before this process started are already reflected in the loaded files
+            self._reload_tokens.setdefault(model_name, self._read_reload_token(model_name))
+        self._watch_task = asyncio.create_task(self.watch_model_files(interval))
+        logger.info(f"Watching {'model files and ' if watch_files else ''}reload requests every {interval}s")
+
+    async def stop_model_watcher(self):
+        """Stop the model file watcher."""
+        if self._watch_task is None:
+            return
+        self._watch_task.cancel()
+        try:
+            await self._watch_task
+        except asyncio.CancelledError:
+            pass
+        self._watch_task = None
+
+    def _bump_model_version(self, model_name: str):
+        """Record a (re)load of a model and drop results computed with the old version."""
+        self.model_versions[model_name] = self.model_versions.get(model_name, 0) + 1
+        self.inference_cache.invalidate(model_name)
+
     def _run_model_inference(self, model, features_tensor):
         """Run model inference in a separate thread."""
         with torch.no_grad():
             predictions = model(features_tensor)
         return predictions.cpu().numpy()[0]
 
+    def _run_batch_inference(self, model, features_tensor):
+        """Run a single forward pass over a batch of feature rows."""
+        with torch.no_grad():
+            predictions = model(features_tensor)
+        return predictions.cpu().numpy()
+
+    @staticmethod
+    def _window_bounds(n_frames: int, window_frames: int, hop_frames: int) -> Tuple[np.ndarray, int]:
+        """Compute window start frames and the effective window length."""
+        window_frames = max(1, min(window_frames, n_frames))
+        hop_frames = max(1, hop_frames)
+        n_windows = 1 + (n_frames - window_frames) // hop_frames
+        starts = np.arange(n_windows) * hop_frames
+        return starts, window_frames
+
+    @staticmethod
+    def _windowed_stats(features: np.ndarray, starts: np.ndarray, window_frames: int,
+                        with_std: bool = False) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Per-window mean (and optionally std) of a (n_features, n_frames) matrix.
+
+        Uses cumulative sums so every window is evaluated in one vectorized pass.
+        """
+        features = np.atleast_2d(np.asarray(features, dtype=np.float64))
+        padded = np.pad(features, ((0, 0), (1, 0)))
+        csum = np.cumsum(padded, axis=1)
+        means = (csum[:, starts + window_frames] - csum[:, starts]) / window_frames
+        if not with_std:
+            return means.T, None
+        csum_sq = np.cumsum(padded ** 2, axis=1)
+        mean_sq = (csum_sq[:, starts + window_frames] - csum_sq[:, starts]) / window_frames
+        stds = np.sqrt(np.maximum(mean_sq - means ** 2, 0.0))
+        return means.T, stds.T
+
+    def _window_frames(self, window_seconds: float, hop_seconds: float,
+                       frame_rate: Optional[float]) -> Tuple[float, int, int]:
+        """Convert window/hop durations in seconds to feature frames."""
+        if window_seconds <= 0 or hop_seconds <= 0:
+            raise ValueError("window_seconds and hop_seconds must be positive")
+        frame_rate = frame_rate or settings.SAMPLE_RATE / settings.HOP_LENGTH
+        window_frames = max(1, int(round(window_seconds * frame_rate)))
+        hop_frames = max(1, int(round(hop_seconds * frame_rate)))
+        return frame_rate, window_frames, hop_frames
+
     async def classify_audio_genre(self, mfcc_features: np.ndarray) -> Dict[str, Any]:
         """Classify audio genre using MFCC features."""
         try:
@@ -199,12 +578,20 @@ class MLModelManager:
             model = self.models['audio_classifier']
             
             # Prepare features
+            mfcc_features = np.asarray(mfcc_features, dtype=np.float32)
             if len(mfcc_features.shape) > 1:
                 # Average across time if needed
                 features = np.mean(mfcc_features, axis=1)
             else:
                 features = mfcc_features
             
+            cache_key = self.inference_cache.make_key(
+                'audio_classifier', self.model_versions.get('audio_classifier', 0), features
+            )
+            cached = self.inference_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            
             # Convert to tensor
             features_tensor = torch.FloatTensor(features).unsqueeze(0).to(self.device)
             
@@ -226,12 +613,51 @@ class MLModelManager:
                 'confidence': float(probabilities[top_indices[0]])
             }
             
+            self.inference_cache.put(cache_key, results)
             logger.info(f"Audio genre classified: {results['top_genre']} ({results['confidence']:.2f})")
-            return model
+            return results
         except Exception as e:
             logger.error(f"Error classifying audio genre: {e}")
             raise
-    
+
+    async def classify_audio_genre_timeline(self, mfcc_features: np.ndarray,
+                                            window_seconds: float = settings.ML_WINDOW_SECONDS,
+                                            hop_seconds: float = settings.ML_HOP_SECONDS,
+                                            frame_rate: Optional[float] = None) -> Dict[str, Any]:
+        """Classify genre over overlapping windows of an MFCC matrix.
+
+        All windows are stacked into one batch and scored with a single forward pass.
+        """
+        try:
+            if 'audio_classifier' not in self.models:
+                raise ValueError("Audio classifier not loaded")
+
+            model = self.models['audio_classifier']
+            mfcc = np.atleast_2d(np.asarray(mfcc_features, dtype=np.float32))
+            frame_rate, window_frames, hop_frames = self._window_frames(window_seconds, hop_seconds, frame_rate)
+            starts, window_frames = self._window_bounds(mfcc.shape[1], window_frames, hop_frames)
+
+            window_means, _ = self._windowed_stats(mfcc, starts, window_frames)
+            features_tensor = torch.from_numpy(window_means.astype(np.float32)).to(self.device)
+            probabilities = await asyncio.to_thread(self._run_batch_inference, model, features_tensor)
+
+            results = self._timeline_results(
+                self.genre_labels, probabilities, starts, window_frames, hop_frames, frame_rate
+            )
+            logger.info(f"Audio genre timeline classified over {len(starts)} windows")
+            return results
+        except Exception as e:
+            logger.error(f"Error classifying audio genre timeline: {e}")
+            raise
+
+    def _calculate_mood_score_matrix(self, brightness, energy, rhythmic_complexity, tempo_factor) -> np.ndarray:
+        """Calculate mood scores for arrays of window features, shape (n_windows, n_moods)."""
+        brightness = np.atleast_1d(np.asarray(brightness, dtype=np.float64))
+        components = np.stack(np.broadcast_arrays(
+            np.ones_like(brightness), brightness, energy, rhythmic_complexity, tempo_factor
+        ), axis=1)
+        return components @ self._MOOD_WEIGHTS.T
+
     def _calculate_mood_scores(self, spectral_centroid, spectral_rolloff, zero_crossing_rate, tempo):
         """Calculate mood scores based on audio features."""
         brightness = np.mean(spectral_centroid) / 4000.0  # Normalize
@@ -239,18 +665,46 @@ class MLModelManager:
         rhythmic_complexity = np.std(zero_crossing_rate)
         tempo_factor = min(tempo / 120.0, 2.0)  # Normalize around 120 BPM
         # Simple mood classification based on features
-        mood_scores = {
-            'energetic': (energy * 0.4 + tempo_factor * 0.6),
-            'calm': (1 - energy) * 0.6 + (1 - tempo_factor) * 0.4,
-            'happy': brightness * 0.5 + tempo_factor * 0.3 + energy * 0.2,
-            'sad': (1 - brightness) * 0.5 + (1 - tempo_factor) * 0.5,
-            'aggressive': energy * 0.4 + rhythmic_complexity * 0.3 + tempo_factor * 0.3,
-            'relaxed': (1 - energy) * 0.5 + (1 - rhythmic_complexity) * 0.5,
-            'excited': energy * 0.3 + tempo_factor * 0.4 + rhythmic_complexity * 0.3,
-            'melancholic': (1 - brightness) * 0.4 + (1 - tempo_factor) * 0.4 + (1 - energy) * 0.2
-        }
+        scores = self._calculate_mood_score_matrix(brightness, energy, rhythmic_complexity, tempo_factor)[0]
+        mood_scores = {mood: float(score) for mood, score in zip(self.mood_labels, scores)}
         return mood_scores, brightness, energy, rhythmic_complexity, tempo_factor
 
+    def _calculate_mood_timeline(self, spectral_centroid, spectral_rolloff, zero_crossing_rate,
+                                 tempo, starts, window_frames):
+        """Calculate normalized mood scores and window features for every window."""
+        brightness, _ = self._windowed_stats(spectral_centroid, starts, window_frames)
+        energy, _ = self._windowed_stats(spectral_rolloff, starts, window_frames)
+        _, rhythmic_complexity = self._windowed_stats(zero_crossing_rate, starts, window_frames, with_std=True)
+        brightness = brightness[:, 0] / 4000.0
+        energy = energy[:, 0] / 8000.0
+        rhythmic_complexity = rhythmic_complexity[:, 0]
+        tempo_factor = min(tempo / 120.0, 2.0)
+
+        scores = self._calculate_mood_score_matrix(brightness, energy, rhythmic_complexity, tempo_factor)
+        totals = scores.sum(axis=1, keepdims=True)
+        scores = np.divide(scores, totals, out=np.full_like(scores, 1.0 / scores.shape[1]), where=totals != 0)
+        window_features = {
+            'brightness': brightness,
+            'energy': energy,
+            'rhythmic_complexity': rhythmic_complexity
+        }
+        return scores, window_features
+
+    def _timeline_results(self, labels: List[str], probabilities: np.ndarray, starts: np.ndarray,
+                          window_frames: int, hop_frames: int, frame_rate: float) -> Dict[str, Any]:
+        """Pack per-window probabilities into a compact, time-aligned result."""
+        probabilities = np.asarray(probabilities, dtype=np.float32)
+        top_indices = np.argmax(probabilities, axis=1)
+        return {
+            'labels': labels,
+            'times': np.round((starts + window_frames / 2) / frame_rate, 3).tolist(),
+            'window_seconds': float(window_frames / frame_rate),
+            'hop_seconds': float(hop_frames / frame_rate),
+            'probabilities': np.round(probabilities, 4).tolist(),
+            'top_indices': top_indices.tolist(),
+            'top_labels': [labels[idx] for idx in top_indices]
+        }
+
     async def analyze_audio_mood(self, audio_features: Dict[str, Any]) -> Dict[str, Any]:
         """Analyze audio mood based on multiple features."""
         try:
@@ -259,6 +713,13 @@ class MLModelManager:
             spectral_rolloff = np.array(audio_features.get('spectral_rolloff', []))
             zero_crossing_rate = np.array(audio_features.get('zero_crossing_rate', []))
             tempo = audio_features.get('tempo', 120)
+            cache_key = self.inference_cache.make_key(
+                'mood_analysis', self._ANALYSIS_VERSION,
+                spectral_centroid, spectral_rolloff, zero_crossing_rate, tempo
+            )
+            cached = self.inference_cache.get(cache_key)
+            if cached is not None:
+                return cached
             # Calculate mood indicators
             mood_scores, brightness, energy, rhythmic_complexity, tempo_factor = await asyncio.to_thread(
                 self._calculate_mood_scores, spectral_centroid, spectral_rolloff, zero_crossing_rate, tempo)
@@ -282,66 +743,72 @@ class MLModelManager:
                     'tempo_factor': float(tempo_factor)
                 }
             }
+            self.inference_cache.put(cache_key, results)
             logger.info(f"Audio mood analyzed: {results['top_mood']} ({results['confidence']:.2f})")
             return results
         except Exception as e:
             logger.error(f"Error analyzing audio mood: {e}")
             raise
+
+    async def analyze_audio_mood_timeline(self, audio_features: Dict[str, Any],
+                                          window_seconds: float = settings.ML_WINDOW_SECONDS,
+                                          hop_seconds: float = settings.ML_HOP_SECONDS,
+                                          frame_rate: Optional[float] = None) -> Dict[str, Any]:
+        """Analyze audio mood over overlapping windows of the frame-level features."""
+        try:
+            spectral_centroid = np.asarray(audio_features.get('spectral_centroid', []), dtype=np.float64)
+            spectral_rolloff = np.asarray(audio_features.get('spectral_rolloff', []), dtype=np.float64)
+            zero_crossing_rate = np.asarray(audio_features.get('zero_crossing_rate', []), dtype=np.float64)
+            tempo = audio_features.get('tempo', 120)
+
+            n_frames = min(len(spectral_centroid), len(spectral_rolloff), len(zero_crossing_rate))
+            if n_frames == 0:
+                raise ValueError("Mood timeline requires spectral_centroid, spectral_rolloff and zero_crossing_rate")
+
+            frame_rate, window_frames, hop_frames = self._window_frames(window_seconds, hop_seconds, frame_rate)
+            starts, window_frames = self._window_bounds(n_frames, window_frames, hop_frames)
+
+            scores, window_features = await asyncio.to_thread(
+                self._calculate_mood_timeline,
+                spectral_centroid[:n_frames], spectral_rolloff[:n_frames], zero_crossing_rate[:n_frames],
+                tempo, starts, window_frames
+            )
+
+            results = self._timeline_results(
+                self.mood_labels, scores, starts, window_frames, hop_frames, frame_rate
+            )
+            results['features'] = {
+                name: np.round(values.astype(np.float32), 4).tolist()
+                for name, values in window_features.items()
+            }
+            results['features']['tempo_factor'] = float(min(tempo / 120.0, 2.0))
+            logger.info(f"Audio mood timeline analyzed over {len(starts)} windows")
+            return results
+        except Exception as e:
+            logger.error(f"Error analyzing audio mood timeline: {e}")
+            raise
     
     async def cluster_audio_segments(self, features_matrix: np.ndarray, 
-                                   n_clusters: int = 8) -> Dict[str, Any]:
-        """Cluster audio segments based on features."""
+                                   n_clusters: Union[int, str] = 8,
+                                   compute_silhouette: bool = True,
+                                   include_indices: bool = True,
+                                   k_range: Tuple[int, int] = (2, 12),
+                                   criterion: str = 'silhouette') -> Dict[str, Any]:
+        """Cluster audio segments based on features.
+
+        A fresh model is fitted for every request; the stored feature scaler is used
+        only once it has been fitted. Pass ``n_clusters='auto'`` to sweep ``k_range``
+        in parallel and keep the best-scoring k.
+        """
         try:
-            if 'audio_clustering' not in self.models:
-                raise ValueError("Clustering model not loaded")
-            
-            # Prepare features
-            if len(features_matrix.shape) != 2:
-                raise ValueError("Features matrix should be 2D")
-            
-            # Scale features
-            scaler = self.models.get('feature_scaler', StandardScaler())
-            if hasattr(scaler, 'transform'):
-                scaled_features = scaler.transform(features_matrix)
-            else:
-                scaled_features = features_matrix
-            
-            # Apply clustering
-            clustering_model = self.models['audio_clustering']
-            cluster_labels = clustering_model.predict(scaled_features)
+            features_matrix = np.asarray(features_matrix, dtype=np.float64)
+            scaler = self.models.get('feature_scaler')
+            results = await asyncio.to_thread(
+                self.clustering_engine.cluster, features_matrix, n_clusters, scaler,
+                compute_silhouette, include_indices, k_range, criterion
+            )
             
-            # Calculate cluster statistics
-            cluster_centers = clustering_model.cluster_centers_
-            cluster_sizes = np.bincount(cluster_labels)
-            
-            # Analyze clusters
-            cluster_analysis = []
-            for i in range(n_clusters):
-                cluster_mask = cluster_labels == i
-                cluster_features = scaled_features[cluster_mask]
-                
-                analysis = {
-                    'cluster_id': int(i),
-                    'size': int(cluster_sizes[i]),
-                    'percentage': float(cluster_sizes[i] / len(cluster_labels) * 100),
-                    'center': cluster_centers[i].tolist(),
-                    'variance': float(np.mean(np.var(cluster_features, axis=0))),
-                    'segment_indices': np.where(cluster_mask)[0].tolist()
-                }
-                cluster_analysis.append(analysis)
-            
-            results = {
-                'cluster_labels': cluster_labels.tolist(),
-                'n_clusters': n_clusters,
-                'cluster_analysis': cluster_analysis,
-                'inertia': float(clustering_model.inertia_),
-                'silhouette_info': {
-                    'available': False,  # Would require sklearn.metrics.silhouette_score
-                    'message': "Install sklearn for silhouette analysis"
-                }
-            }
-            
-            logger.info(f"Audio clustered into {n_clusters} segments")
+            logger.info(f"Audio clustered into {results['n_clusters']} segments ({results['algorithm']})")
             return results
             
         except Exception as e:
@@ -403,9 +870,73 @@ class MLModelManager:
             }
         }
 
+    def _generate_visual_curves_logic(self, audio_features: Dict[str, Any], tempo: float,
+                                      fps: float, n_frames: int) -> Dict[str, np.ndarray]:
+        """Per-frame versions of the movement, particle, glow, camera and beat parameters.
+
+        Mirrors _generate_visual_parameters_logic with frame-level energy and
+        brightness in place of the track averages, modulated by the beat envelope.
+        """
+        feature_rate = audio_features.get('feature_rate')
+        energy = timeline.resample_to_frames(
+            audio_features.get('spectral_rolloff', []), n_frames, fps, feature_rate
+        ) / 8000.0
+        brightness = timeline.resample_to_frames(
+            audio_features.get('spectral_centroid', []), n_frames, fps, feature_rate
+        ) / 4000.0
+        beats = timeline.beat_envelope(audio_features.get('beats', []), n_frames, fps)
+
+        # Less smoothing for energetic tracks, matching smooth_transitions = 1 - energy * 0.5
+        alpha = float(np.clip(0.5 * np.mean(energy), 0.05, 1.0)) if n_frames else 1.0
+        energy = timeline.smooth(energy, alpha)
+        brightness = timeline.smooth(brightness, alpha)
+
+        beat_responsiveness = np.clip(energy * 2.0, 0.1, 1.0)
+        base_speed = np.clip(tempo / 120.0, 0.1, 2.0)
+        curves = {
+            'movement_speed': np.clip(base_speed * (1.0 + 0.5 * beats * beat_responsiveness), 0.1, 2.0),
+            'particle_count': 50.0 + energy * 200.0,
+            'glow': np.clip(brightness * (1.0 + 0.5 * beats), 0.0, 1.0),
+            'camera_shake': energy * 0.3 * (0.5 + 0.5 * beats),
+            'beat_responsiveness': beat_responsiveness,
+            'beat_envelope': beats
+        }
+        return {name: np.asarray(curve, dtype=np.float32) for name, curve in curves.items()}
+
+    async def generate_visual_parameter_curves(self, audio_features: Dict[str, Any], fps: float,
+                                               duration: Optional[float] = None) -> Dict[str, Any]:
+        """Dense fps-aligned visual parameter curves as float32 arrays (one value per frame)."""
+        try:
+            if fps <= 0:
+                raise ValueError("fps must be positive")
+            tempo = audio_features.get('tempo', 120)
+            if duration is None:
+                duration = audio_features.get('duration')
+            if duration is None:
+                feature_rate = audio_features.get('feature_rate') or timeline.default_feature_rate()
+                duration = len(audio_features.get('spectral_centroid', [])) / feature_rate
+            n_frames = int(duration * fps)
+
+            curves = await asyncio.to_thread(self._generate_visual_curves_logic, audio_features, tempo, fps, n_frames)
+            logger.info(f"Generated {len(curves)} visual parameter curves over {n_frames} frames")
+            return {
+                'fps': fps,
+                'n_frames': n_frames,
+                'curves': curves
+            }
+        except Exception as e:
+            logger.error(f"Error generating visual parameter curves: {e}")
+            raise
+
     async def generate_visual_parameters(self, audio_features: Dict[str, Any],
-                                       mood_analysis: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate visual parameters based on audio analysis."""
+                                       mood_analysis: Dict[str, Any],
+                                       fps: Optional[float] = None) -> Dict[str, Any]:
+        """Generate visual parameters based on audio analysis.
+
+        When ``fps`` is given, per-frame curves (see generate_visual_parameter_curves)
+        are attached as ``'curves'`` (name -> float32 array), with their frame rate
+        and length under ``'curve_fps'`` and ``'curve_frames'``.
+        """
         try:
             # Extract key features
             tempo = audio_features.get('tempo', 120)
@@ -413,9 +944,21 @@ class MLModelManager:
             brightness = mood_analysis['features']['brightness']
             top_mood = mood_analysis['top_mood']
             
-            results = await asyncio.to_thread(self._generate_visual_parameters_logic, tempo, energy, brightness, top_mood, mood_analysis)
+            cache_key = self.inference_cache.make_key(
+                'visual_parameters', self._ANALYSIS_VERSION,
+                tempo, energy, brightness, top_mood, mood_analysis['features']['rhythmic_complexity']
+            )
+            results = self.inference_cache.get(cache_key)
+            if results is None:
+                results = await asyncio.to_thread(self._generate_visual_parameters_logic, tempo, energy, brightness, top_mood, mood_analysis)
+                self.inference_cache.put(cache_key, results)
+                logger.info(f"Generated visual parameters for mood: {top_mood}")
             
-            logger.info(f"Generated visual parameters for mood: {top_mood}")
+            if fps:
+                # A new dict, so the cached static parameters stay free of curves
+                curves = await self.generate_visual_parameter_curves(audio_features, fps)
+                results = {**results, 'curves': curves['curves'], 'curve_fps': curves['fps'],
+                           'curve_frames': curves['n_frames']}
             return results
             
         except Exception as e:
@@ -430,14 +973,15 @@ class MLModelManager:
 
     def _get_model_details(self) -> Dict[str, Any]:
         """Get details of all loaded models."""
-        model = self.models[model_name]
-        if hasattr(model, 'parameters'):
-            # PyTorch model
-            param_count = sum(p.numel() for p in model.parameters())
-            details[f'{model_name}_params'] = param_count
-        else:
-            # Sklearn model
-            details[f'{model_name}_type'] = type(model).__name__
+        details = {}
+        for model_name, model in list(self.models.items()):
+            if hasattr(model, 'parameters'):
+                # PyTorch model
+                param_count = sum(p.numel() for p in model.parameters())
+                details[f'{model_name}_params'] = param_count
+            else:
+                # Sklearn model
+                details[f'{model_name}_type'] = type(model).__name__
         return details
 
     async def get_status(self) -> Dict[str, Any]:
@@ -445,9 +989,14 @@ class MLModelManager:
         status = {
             'ready': self._ready,
             'device': str(self.device),
+            'shared_weights': self.shared_weights,
             'models_loaded': list(self.models.keys()),
             'cache_size': len(self.models),
-            'max_cache_size': self.model_cache_size
+            'max_cache_size': self.model_cache_size,
+            'model_versions': dict(self.model_versions),
+            'inference_cache': self.inference_cache.stats(),
+            'reloads': copy.deepcopy(self.reload_status),
+            'watching_model_files': self._watch_task is not None and self._watch_files
         }
         
         model_details = await asyncio.to_thread(self._get_model_details)
@@ -457,11 +1006,14 @@ class MLModelManager:
     
     async def cleanup(self):
         """Cleanup models and free memory."""
+        await self.stop_model_watcher()
         await asyncio.to_thread(self._perform_cleanup)
 
     def _perform_cleanup(self):
         """Perform cleanup of models and memory."""
+        self.clustering_engine.shutdown()
         self.models.clear()
+        self.inference_cache.invalidate()
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
         logger.info("ML models cleanup completed")
@@ -0,0 +1,328 @@
+"""
+Vectorized particle system.
+Particle state is stored as contiguous NumPy arrays (struct of arrays) and every
+simulation step is a handful of whole-array operations.
+"""
+
+import numpy as np
+import cv2
+from typing import Dict, Optional, Any
+
+class ParticleSystem:
+    """Struct-of-arrays particle simulation driven by per-frame beat intensity."""
+
+    def __init__(self, num_particles: int, width: int, height: int,
+                 rng: Optional[np.random.Generator] = None):
+        self.num_particles = num_particles
+        self.width = width
+        self.height = height
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        n = num_particles
+        self.positions = np.empty((n, 2), dtype=np.float32)
+        self.positions[:, 0] = self.rng.uniform(0, width, n)
+        self.positions[:, 1] = self.rng.uniform(0, height, n)
+        self.velocities = self.rng.uniform(-2, 2, (n, 2)).astype(np.float32)
+        self.sizes = self.rng.uniform(2, 8, n).astype(np.float32)
+        self.colors = self.rng.integers(100, 255, (n, 3), dtype=np.uint8)
+        self.life = np.ones(n, dtype=np.float32)
+
+    def update(self, beat_intensity: float):
+        """Advance the simulation by one frame."""
+        self.positions += self.velocities
+
+        # Beat response
+        if beat_intensity > 0:
+            self.velocities *= np.float32(1 + beat_intensity * 0.5)
+            self.sizes *= np.float32(1 + beat_intensity * 0.3)
+
+        # Boundary conditions: damped bounce on whichever axis left the frame
+        out_of_bounds = (self.positions < 0) | (self.positions > np.array([self.width, self.height], dtype=np.float32))
+        self.velocities[out_of_bounds] *= np.float32(-0.8)
+
+        # Update life and respawn faded particles
+        self.life *= np.float32(0.998)
+        respawn = np.flatnonzero(self.life < 0.1)
+        if respawn.size:
+            self.life[respawn] = 1.0
+            self.positions[respawn, 0] = self.rng.uniform(0, self.width, respawn.size)
+            self.positions[respawn, 1] = self.rng.uniform(0, self.height, respawn.size)
+
+    def visible(self) -> np.ndarray:
+        """Indices of particles inside the frame with a non-zero drawn size."""
+        x, y = self.positions[:, 0], self.positions[:, 1]
+        drawn_size = self.sizes * self.life
+        return np.flatnonzero((x >= 0) & (x < self.width) & (y >= 0) & (y < self.height) & (drawn_size >= 1))
+
+    def state_dict(self) -> Dict[str, Any]:
+        """Snapshot of the simulation state (arrays are copied)."""
+        return {
+            'width': self.width,
+            'height': self.height,
+            'positions': self.positions.copy(),
+            'velocities': self.velocities.copy(),
+            'sizes': self.sizes.copy(),
+            'colors': self.colors.copy(),
+            'life': self.life.copy(),
+            'rng_state': self.rng.bit_generator.state
+        }
+
+    @classmethod
+    def from_state_dict(cls, state: Dict[str, Any]) -> 'ParticleSystem':
+        """Restore a simulation saved with :meth:`state_dict`."""
+        system = cls.__new__(cls)
+        system.width = state['width']
+        system.height = state['height']
+        system.positions = np.array(state['positions'], dtype=np.float32)
+        system.velocities = np.array(state['velocities'], dtype=np.float32)
+        system.sizes = np.array(state['sizes'], dtype=np.float32)
+        system.colors = np.array(state['colors'], dtype=np.uint8)
+        system.life = np.array(state['life'], dtype=np.float32)
+        system.num_particles = len(system.life)
+        system.rng = np.random.default_rng()
+        system.rng.bit_generator.state = state['rng_state']
+        return system
+
+class ParticleRasterizer:
+    """Draws a frame of particles into reused buffers.
+
+    Blend modes:
+        ``replace``  - opaque discs in cv2.circle's shape, later particles on top (the original look)
+        ``additive`` - colors add up and saturate at 255
+        ``alpha``    - order-independent alpha blending with per-particle opacity = life
+
+    The blending modes are rendered in one batched pass: they group
+    particles by integer radius and splat each group with a precomputed disc
+    kernel via ``np.add.at`` into float accumulation planes. The planes are
+    padded by ``max_radius`` on every side, so kernels need no per-pixel bounds
+    checks.
+
+    Opaque discs are batched too. The particle shown at a pixel is the last
+    one covering it, i.e. the highest particle number: a range maximum over
+    each disc row. Every row of cv2.circle's disc is covered by the two
+    overlapping power-of-two blocks that fit it, as in a sparse table, so a
+    disc is one small kernel of block offsets scattered with
+    ``np.maximum.at``. The blocks are then pushed down a level at a time to
+    single pixels, whose particle numbers index a color palette; the result
+    matches the per-particle cv2.circle loop exactly. That pass costs a few
+    full-frame sweeps, so sparse frames (below ``MIN_BATCH_DENSITY``) keep the
+    loop (see ``benchmarks/particles.py``).
+
+    A rasterizer smaller than the simulated area (a draft preview) scales
+    positions and radii to its own size. Frames are RGB, or BGR with
+    ``channel_order='bgr'``; blending writes through preallocated scratch
+    planes, so rendering allocates nothing frame-sized.
+    """
+
+    BLEND_MODES = ('replace', 'additive', 'alpha')
+    # Upper bound on splatted pixels per batch, to bound temporary memory
+    MAX_BATCH_PIXELS = 4_000_000
+    # Opaque discs are drawn one by one below this many particles per frame pixel
+    MIN_BATCH_DENSITY = 0.01
+
+    def __init__(self, width: int, height: int, blend_mode: str = 'replace', max_radius: int = 32,
+                 channel_order: str = 'rgb'):
+        if blend_mode not in self.BLEND_MODES:
+            raise ValueError(f"Unknown blend mode: {blend_mode}")
+        if channel_order not in ('rgb', 'bgr'):
+            raise ValueError(f"Unknown channel order: {channel_order}")
+        self.width = width
+        self.height = height
+        self.blend_mode = blend_mode
+        self.max_radius = max_radius
+        self.pad = max_radius
+        self.stride = width + 2 * self.pad
+        self._canvas_size = self.stride * (height + 2 * self.pad)
+        self._kernels: Dict[int, np.ndarray] = {}
+        self._span_kernels: Dict[int, np.ndarray] = {}
+        self.bgr = channel_order == 'bgr'
+        self.frame = np.zeros((height, width, 3), dtype=np.uint8)
+
+        if blend_mode == 'replace':
+            # Per block level: number (from 1) of the last particle covering the block starting at each pixel
+            levels = (2 * max_radius + 1).bit_length()
+            self._blocks = np.zeros((levels, self._canvas_size), dtype=np.int32)
+
+        if blend_mode != 'replace':
+            self._planes = [np.zeros(self._canvas_size, dtype=np.float32) for _ in range(3)]
+            # Frame channel each (RGB) plane resolves into
+            self._channels = (2, 1, 0) if self.bgr else (0, 1, 2)
+            self._scratch = np.empty((height, width), dtype=np.float32)
+        if blend_mode == 'alpha':
+            self._weight = np.zeros(self._canvas_size, dtype=np.float32)
+            self._log_transmittance = np.zeros(self._canvas_size, dtype=np.float32)
+            self._scale = np.empty((height, width), dtype=np.float32)
+
+    def _crop(self, plane: np.ndarray) -> np.ndarray:
+        """View of the visible region of a flat padded plane."""
+        canvas = plane.reshape(self.height + 2 * self.pad, self.stride)
+        return canvas[self.pad:self.pad + self.height, self.pad:self.pad + self.width]
+
+    def _kernel(self, radius: int) -> np.ndarray:
+        """Flat plane offsets of a filled disc of the given radius."""
+        kernel = self._kernels.get(radius)
+        if kernel is None:
+            dy, dx = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+            inside = dx * dx + dy * dy <= radius * radius + radius  # Close to cv2's midpoint circle
+            kernel = (dy[inside] * self.stride + dx[inside]).astype(np.int32)
+            self._kernels[radius] = kernel
+        return kernel
+
+    def _splat(self, base: np.ndarray, radius: int, colors: np.ndarray, alphas: np.ndarray):
+        """Accumulate all discs of one radius."""
+        kernel = self._kernel(radius)
+        batch = max(1, self.MAX_BATCH_PIXELS // kernel.size)
+        for start in range(0, base.size, batch):
+            stop = start + batch
+            pixel_idx = (base[start:stop, None] + kernel).ravel()
+            if self.blend_mode == 'additive':
+                for plane, channel in zip(self._planes, colors[start:stop].T):
+                    np.add.at(plane, pixel_idx, np.repeat(channel, kernel.size))
+            else:
+                alpha = np.repeat(alphas[start:stop], kernel.size)
+                for plane, channel in zip(self._planes, colors[start:stop].T):
+                    np.add.at(plane, pixel_idx, np.repeat(channel, kernel.size) * alpha)
+                np.add.at(self._weight, pixel_idx, alpha)
+                np.add.at(self._log_transmittance, pixel_idx, np.log1p(-np.minimum(alpha, 0.999)))
+
+    def _draw_circles(self, xs: np.ndarray, ys: np.ndarray, radii: np.ndarray, colors: np.ndarray):
+        """cv2.circle per particle, for sparse opaque frames and discs too large for the planes."""
+        if self.bgr:
+            colors = colors[:, ::-1]
+        for x, y, radius, color in zip(xs.tolist(), ys.tolist(), radii.tolist(), colors.tolist()):
+            cv2.circle(self.frame, (x, y), radius, color, -1)
+
+    def _span_kernel(self, radius: int) -> np.ndarray:
+        """Flat block offsets covering each row of cv2.circle's filled disc of the given radius.
+
+        Every row is covered by the two (overlapping) blocks of the largest
+        power-of-two length that fits in it; level l blocks start
+        ``l * canvas_size`` further into the flat block buffer.
+        """
+        kernel = self._span_kernels.get(radius)
+        if kernel is None:
+            size = 2 * radius + 1
+            disc = np.zeros((size, size), dtype=np.uint8)
+            cv2.circle(disc, (radius, radius), radius, 1, -1)
+            offsets = []
+            for dy, row in enumerate(disc, -radius):
+                filled = np.flatnonzero(row)
+                if filled.size:
+                    level = filled.size.bit_length() - 1
+                    start = level * self._canvas_size + dy * self.stride + int(filled[0]) - radius
+                    offsets += [start, start + filled.size - (1 << level)]
+            kernel = np.array(offsets, dtype=np.int32)
+            self._span_kernels[radius] = kernel
+        return kernel
+
+    def _draw_opaque(self, xs: np.ndarray, ys: np.ndarray, radii: np.ndarray, colors: np.ndarray):
+        """Filled discs in cv2.circle's shape, each particle covering the ones before it."""
+        large = radii > self.max_radius
+        if xs.size - np.count_nonzero(large) < self.MIN_BATCH_DENSITY * self.width * self.height:
+            self.frame.fill(0)
+            self._draw_circles(xs, ys, radii, colors)
+            return
+
+        numbers = np.arange(1, xs.size + 1, dtype=np.int32)
+        top = (2 * min(int(radii.max()), self.max_radius) + 1).bit_length() - 1
+        blocks = self._blocks[:top + 1]
+        blocks.fill(0)
+
+        if large.any():
+            # Drawn first and in order, so later discs overwrite earlier ones and the scatter keeps the maximum
+            plane = blocks[0].reshape(-1, self.stride)
+            for x, y, radius, number in zip(xs[large].tolist(), ys[large].tolist(), radii[large].tolist(),
+                                            numbers[large].tolist()):
+                cv2.circle(plane, (x + self.pad, y + self.pad), radius, number, -1)
+            small = ~large
+            xs, ys, radii, numbers = xs[small], ys[small], radii[small], numbers[small]
+
+        base = (ys + self.pad) * self.stride + (xs + self.pad)
+        order = np.lexsort((base, radii))
+        bounds = np.flatnonzero(np.diff(radii[order])) + 1
+        flat_blocks = blocks.reshape(-1)
+        for group in np.split(order, bounds):
+            if group.size:
+                kernel = self._span_kernel(int(radii[group[0]]))
+                batch = max(1, self.MAX_BATCH_PIXELS // kernel.size)
+                for start in range(0, group.size, batch):
+                    chunk = group[start:start + batch]
+                    np.maximum.at(flat_blocks, (base[chunk, None] + kernel).ravel(),
+                                  np.repeat(numbers[chunk], kernel.size))
+
+        # A block at level l is the two blocks of level l - 1 it consists of
+        for level in range(top, 0, -1):
+            half = 1 << (level - 1)
+            np.maximum(blocks[level - 1], blocks[level], out=blocks[level - 1])
+            np.maximum(blocks[level - 1, half:], blocks[level, :-half], out=blocks[level - 1, half:])
+
+        if self.bgr:
+            colors = colors[:, ::-1]
+        palette = np.concatenate([np.zeros((1, 3), dtype=np.uint8), colors])
+        np.take(palette, self._crop(blocks[0]), axis=0, out=self.frame)
+
+    def render(self, particles: 'ParticleSystem') -> np.ndarray:
+        """Render particles into the reused frame buffer and return it.
+
+        The returned array is overwritten by the next call; copy it if it must outlive that.
+        """
+        visible = particles.visible()
+        life = particles.life[visible]
+        if self.width == particles.width and self.height == particles.height:
+            xs = particles.positions[visible, 0].astype(np.int32)
+            ys = particles.positions[visible, 1].astype(np.int32)
+            radii = (particles.sizes[visible] * life).astype(np.int32)
+        else:
+            scale_x = np.float32(self.width / particles.width)
+            xs = (particles.positions[visible, 0] * scale_x).astype(np.int32)
+            ys = (particles.positions[visible, 1] * np.float32(self.height / particles.height)).astype(np.int32)
+            radii = (particles.sizes[visible] * life * scale_x).astype(np.int32)
+
+        if self.blend_mode == 'replace':
+            self._draw_opaque(xs, ys, radii, (particles.colors[visible] * life[:, None]).astype(np.uint8))
+            return self.frame
+
+        for plane in self._planes:
+            plane.fill(0)
+        if self.blend_mode == 'alpha':
+            self._weight.fill(0)
+            self._log_transmittance.fill(0)
+            colors = particles.colors[visible].astype(np.float32)
+        else:
+            colors = particles.colors[visible] * life[:, None].astype(np.float32)
+
+        # Oversized discs (rare) are drawn opaque on top afterwards
+        large = radii > self.max_radius
+        if large.any():
+            oversized = (xs[large], ys[large], radii[large], (particles.colors[visible][large] * life[large, None]).astype(np.uint8))
+            small = ~large
+            xs, ys, radii, colors, life = xs[small], ys[small], radii[small], colors[small], life[small]
+
+        base = (ys + self.pad) * self.stride + (xs + self.pad)
+        # Group by radius; within a group, walk the planes top to bottom for cache locality
+        order = np.lexsort((base, radii))
+        bounds = np.flatnonzero(np.diff(radii[order])) + 1
+        for group in np.split(order, bounds):
+            if group.size:
+                self._splat(base[group], int(radii[group[0]]), colors[group], life[group])
+
+        scratch = self._scratch
+        if self.blend_mode == 'additive':
+            for channel, plane in zip(self._channels, self._planes):
+                np.minimum(self._crop(plane), 255, out=scratch)
+                np.copyto(self.frame[..., channel], scratch, casting='unsafe')
+        else:
+            # Uncovered pixels have zero log transmittance, so their coverage is already 0
+            scale = self._scale
+            np.exp(self._crop(self._log_transmittance), out=scratch)
+            np.subtract(1.0, scratch, out=scratch)
+            np.maximum(self._crop(self._weight), 1e-6, out=scale)
+            np.divide(scratch, scale, out=scale)
+            for channel, plane in zip(self._channels, self._planes):
+                np.multiply(self._crop(plane), scale, out=scratch)
+                np.clip(scratch, 0, 255, out=scratch)
+                np.copyto(self.frame[..., channel], scratch, casting='unsafe')
+
+        if large.any():
+            self._draw_circles(*oversized)
+        return self.frame
@@ -0,0 +1,511 @@
+"""
+Asynchronous render job queue.
+Renders are submitted as jobs, persisted on disk and executed by a bounded pool
+of worker threads in priority order, so the event loop never runs a frame loop.
+With several server processes, one of them owns the queue and the others share
+its jobs through the jobs directory.
+"""
+
+import asyncio
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional, Any, Callable
+import heapq
+import itertools
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from uuid import uuid4
+try:
+    import fcntl
+except ImportError:  # Windows: no inter-process lock, run a single server worker
+    fcntl = None
+from .config import settings
+from .thumbnails import INDEX_NAME, thumbnail_dir
+
+logger = logging.getLogger(__name__)
+
+JOB_KINDS = ('reactive', 'particles', 'mood', 'spectrogram')
+FINISHED_STATES = ('completed', 'failed', 'cancelled')
+# Params key of each kind's render config; spectrogram options are top-level params
+CONFIG_KEYS = {'reactive': 'video_config', 'mood': 'video_config', 'particles': 'particle_config'}
+# Held exclusively by the server process that owns the queue
+LOCK_NAME = ".queue.lock"
+# Marker a non-owning process writes to ask the owner to cancel a job
+CANCEL_SUFFIX = ".cancel"
+
+class RenderCancelled(Exception):
+    """Raised inside a render when its job has been cancelled."""
+
+@dataclass
+class RenderJob:
+    """A render request and its lifecycle state, persisted as JSON."""
+    id: str
+    kind: str
+    params: Dict[str, Any]
+    priority: int = 0
+    status: str = 'queued'
+    frames_done: int = 0
+    frames_total: int = 0
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    attempts: int = 0
+    cancel_requested: bool = False
+    client_id: Optional[str] = None  # WebSocket client that receives progress events
+
+    @property
+    def progress(self) -> float:
+        if self.status == 'completed':
+            return 1.0
+        return self.frames_done / self.frames_total if self.frames_total else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def summary(self) -> Dict[str, Any]:
+        """Public view of the job, without the (potentially large) render params."""
+        data = self.to_dict()
+        data.pop('params')
+        data['progress'] = round(self.progress, 4)
+        data['render_fps'] = None
+        data['eta_seconds'] = None
+        if self.status == 'running' and self.started_at and self.frames_done:
+            elapsed = max(time.time() - self.started_at, 1e-6)
+            data['render_fps'] = round(self.frames_done / elapsed, 2)
+            data['eta_seconds'] = round((self.frames_total - self.frames_done) * elapsed / self.frames_done, 1)
+        return data
+
+class RenderJobQueue:
+    """Priority queue of render jobs drained by ``max_workers`` worker threads.
+
+    Higher ``priority`` runs first; equal priorities run in submission order.
+    Every state change is written to ``jobs_dir`` so queued jobs survive a
+    restart, and jobs that were running when the process died are requeued.
+
+    With several server worker processes (``WORKERS``), the process holding an
+    exclusive lock on ``jobs_dir`` is the ``owner``: only it loads, runs and
+    prunes jobs. The others read job state from disk every
+    RENDER_JOB_POLL_SECONDS, write the jobs they accept there for the owner to
+    pick up, forward cancels as marker files, and take over the queue when the
+    owner exits.
+    """
+
+    def __init__(self, video_generator, ml_manager=None, jobs_dir: Optional[Path] = None,
+                 max_workers: Optional[int] = None):
+        self.video_generator = video_generator
+        self.ml_manager = ml_manager
+        self.jobs_dir = Path(jobs_dir or settings.RENDER_JOBS_DIR)
+        self.max_workers = max(1, max_workers or settings.RENDER_JOB_WORKERS)
+        self.jobs: Dict[str, RenderJob] = {}
+        self._heap: List = []
+        self._sequence = itertools.count()
+        self._available: Optional[asyncio.Condition] = None
+        self._done_events: Dict[str, asyncio.Event] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._workers: List[asyncio.Task] = []
+        self._stopping = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self.owner = False
+        self._lock_file = None
+        self._poll_task: Optional[asyncio.Task] = None
+        self._persisted_at: Dict[str, float] = {}
+
+    # Persistence
+
+    def _job_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+
+    def job_files_dir(self, job_id: str) -> Path:
+        """Directory for a job's uploaded inputs."""
+        return self.jobs_dir / job_id
+
+    def checkpoint_dir(self, job_id: str) -> Path:
+        """Segments and manifest of a job's resumable render."""
+        return self.job_files_dir(job_id) / "checkpoint"
+
+    def stream_dir(self, job_id: str) -> Path:
+        """HLS playlist and segments of a job rendered with ``stream`` set."""
+        return self.job_files_dir(job_id) / "stream"
+
+    def _persist(self, job: RenderJob):
+        """Atomically write a job's state."""
+        path = self._job_path(job.id)
+        tmp_path = path.with_suffix('.json.tmp')
+        tmp_path.write_text(json.dumps(job.to_dict()))
+        os.replace(tmp_path, path)
+        self._persisted_at[job.id] = time.monotonic()
+
+    def _read_job(self, path: Path) -> Optional[RenderJob]:
+        try:
+            return RenderJob(**json.loads(path.read_text()))
+        except FileNotFoundError:
+            return None
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Skipping unreadable render job {path.name}: {e}")
+            return None
+
+    def _load(self):
+        """Restore persisted jobs; interrupted jobs go back on the queue."""
+        self.jobs = {}
+        self._heap = []
+        for path in sorted(self.jobs_dir.glob('*.json')):
+            job = self._read_job(path)
+            if job is None:
+                continue
+            if job.status == 'running':
+                job.status = 'queued'
+                logger.info(f"Requeueing render job {job.id} interrupted by a restart")
+            if job.status == 'queued' and job.cancel_requested:
+                job.status = 'cancelled'
+                job.finished_at = job.finished_at or time.time()
+            self.jobs[job.id] = job
+            if job.status == 'queued':
+                self._push(job)
+            self._persist(job)
+        self._prune()
+
+    def _prune(self):
+        """Forget finished jobs older than RENDER_JOB_RETENTION_HOURS."""
+        cutoff = time.time() - settings.RENDER_JOB_RETENTION_HOURS * 3600
+        for job in list(self.jobs.values()):
+            if job.status in FINISHED_STATES and (job.finished_at or 0) < cutoff:
+                self._job_path(job.id).unlink(missing_ok=True)
+                shutil.rmtree(self.job_files_dir(job.id), ignore_errors=True)
+                del self.jobs[job.id]
+                self._persisted_at.pop(job.id, None)
+
+    # Sharing the queue between server processes
+
+    def _acquire_lock(self) -> bool:
+        """Try to become the process that owns the queue."""
+        if fcntl is None:
+            return True
+        lock_file = open(self.jobs_dir / LOCK_NAME, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _release_lock(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    async def _pick_up_requests(self):
+        """Owner: queue jobs and apply cancels that other server processes wrote to disk."""
+        submitted = [self._read_job(path) for path in self.jobs_dir.glob('*.json') if path.stem not in self.jobs]
+        submitted = [job for job in submitted if job is not None and job.status == 'queued']
+        # Equal priorities keep their submission order
+        for job in sorted(submitted, key=lambda job: job.created_at):
+            self.jobs[job.id] = job
+            async with self._available:
+                self._push(job)
+                self._available.notify()
+            logger.info(f"Queued {job.kind} render job {job.id} submitted by another server process")
+            self._notify(job)
+        for path in self.jobs_dir.glob(f'*{CANCEL_SUFFIX}'):
+            path.unlink(missing_ok=True)
+            self.cancel(path.stem)
+
+    def _sync_from_disk(self, notify: bool = True):
+        """Non-owner: refresh the job table from the owner's files."""
+        found = set()
+        for path in self.jobs_dir.glob('*.json'):
+            job = self._read_job(path)
+            if job is None:
+                continue
+            found.add(job.id)
+            previous = self.jobs.get(job.id)
+            self.jobs[job.id] = job
+            if notify and (previous is None or previous.to_dict() != job.to_dict()):
+                self._notify(job)
+            if job.status in FINISHED_STATES:
+                event = self._done_events.pop(job.id, None)
+                if event is not None:
+                    event.set()
+        for job_id in set(self.jobs) - found:
+            del self.jobs[job_id]
+
+    async def _poll(self):
+        """Keep in step with the other server processes sharing ``jobs_dir``."""
+        while True:
+            await asyncio.sleep(settings.RENDER_JOB_POLL_SECONDS)
+            try:
+                if self.owner:
+                    await self._pick_up_requests()
+                elif self._acquire_lock():
+                    logger.info("Taking over the render job queue from an exited server process")
+                    self._start_owner()
+                else:
+                    self._sync_from_disk()
+            except Exception:
+                logger.exception("Render job queue sync failed")
+
+    # Lifecycle
+
+    async def start(self):
+        """Load persisted jobs and start the workers, or follow the process that owns the queue."""
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self._stopping = False
+        self._loop = asyncio.get_running_loop()
+        self._available = asyncio.Condition()
+        if self._acquire_lock():
+            self._start_owner()
+        else:
+            self._sync_from_disk(notify=False)
+            logger.info("Render job queue is owned by another server process; following its jobs on disk")
+        self._poll_task = asyncio.create_task(self._poll())
+
+    def _start_owner(self):
+        self.owner = True
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='render-job')
+        self._load()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+        logger.info(f"Render job queue started with {self.max_workers} workers, {len(self._heap)} queued jobs")
+
+    async def stop(self):
+        """Stop the workers. Running jobs are interrupted and stay queued on disk for the next start."""
+        self._stopping = True
+        tasks = self._workers + ([self._poll_task] if self._poll_task is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._poll_task = None
+        if self._executor is not None:
+            # Off the event loop: a render only notices the stop at its next progress update
+            await asyncio.to_thread(self._executor.shutdown, True)
+            self._executor = None
+        self.owner = False
+        self._release_lock()
+
+    # Events
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """Call ``listener(job.summary())`` on the event loop whenever a job changes."""
+        self._listeners.append(listener)
+
+    def _notify(self, job: RenderJob):
+        summary = job.summary()
+        for listener in self._listeners:
+            try:
+                listener(summary)
+            except Exception:
+                logger.exception(f"Render job listener failed for job {job.id}")
+
+    # Queue operations
+
+    def _push(self, job: RenderJob):
+        heapq.heappush(self._heap, (-job.priority, next(self._sequence), job.id))
+
+    async def submit(self, kind: str, params: Dict[str, Any], priority: int = 0,
+                     job_id: Optional[str] = None, client_id: Optional[str] = None) -> RenderJob:
+        """Queue a render and return its job immediately."""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown render job kind: {kind}")
+        job = RenderJob(id=job_id or uuid4().hex, kind=kind, params=params, priority=priority,
+                        client_id=client_id)
+        self.jobs[job.id] = job
+        self._persist(job)
+        if self.owner:
+            async with self._available:
+                self._push(job)
+                self._available.notify()
+        # Otherwise the owning process picks the job up from disk
+        logger.info(f"Queued {kind} render job {job.id} (priority {priority})")
+        self._notify(job)
+        return job
+
+    async def promote(self, job_id: str, priority: Optional[int] = None) -> RenderJob:
+        """Queue the full-quality render of a draft job's config as a new job."""
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        params = copy.deepcopy(job.params)
+        config = params if job.kind == 'spectrogram' else params[CONFIG_KEYS[job.kind]]
+        if not config.get('draft'):
+            raise ValueError(f"Render job {job_id} is not a draft")
+        config['draft'] = False
+
+        new_id = uuid4().hex
+        if job.kind == 'spectrogram':
+            # Inputs are deleted with their job, so the full render gets its own copy
+            source = Path(params['audio_path'])
+            target_dir = self.job_files_dir(new_id)
+            target_dir.mkdir(parents=True, exist_ok=True)
+            params['audio_path'] = str(shutil.copy2(source, target_dir / source.name))
+        return await self.submit(job.kind, params, job.priority if priority is None else priority,
+                                 job_id=new_id, client_id=job.client_id)
+
+    def get(self, job_id: str) -> Optional[RenderJob]:
+        if not self.owner:
+            # The owner may have moved on since the last sync
+            job = self._read_job(self._job_path(job_id))
+            if job is None:
+                self.jobs.pop(job_id, None)
+                return None
+            self.jobs[job_id] = job
+        return self.jobs.get(job_id)
+
+    def list(self, status: Optional[str] = None) -> List[RenderJob]:
+        """Jobs, newest first; outside the owner this is the state of the last sync."""
+        jobs = [job for job in self.jobs.values() if status is None or job.status == status]
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)
+
+    def cancel(self, job_id: str) -> Optional[RenderJob]:
+        """Cancel a queued job, or ask a running one to stop at its next progress update."""
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return job
+        job.cancel_requested = True
+        if not self.owner:
+            (self.jobs_dir / f"{job_id}{CANCEL_SUFFIX}").touch()
+        elif job.status == 'queued':
+            # Stays in the heap; workers skip it when popped
+            self._finish(job, 'cancelled')
+        else:
+            self._persist(job)
+        return job
+
+    async def wait(self, job_id: str) -> RenderJob:
+        """Wait until a job has finished. Raises KeyError for unknown (or pruned) jobs."""
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(f"Render job {job_id} not found")
+        if job.status in FINISHED_STATES:
+            return job
+        event = self._done_events.setdefault(job_id, asyncio.Event())
+        await event.wait()
+        # Outside the owner, the finished state is a fresh object read from disk
+        return self.jobs.get(job_id, job)
+
+    def _finish(self, job: RenderJob, status: str, error: Optional[str] = None):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        if status != 'completed':
+            # Completed renders remove their own checkpoint after joining the segments
+            shutil.rmtree(self.checkpoint_dir(job.id), ignore_errors=True)
+        self._persist(job)
+        self._notify(job)
+        event = self._done_events.pop(job.id, None)
+        if event is not None:
+            event.set()
+
+    # Execution
+
+    async def _next_job(self) -> RenderJob:
+        async with self._available:
+            while True:
+                while self._heap:
+                    _, _, job_id = heapq.heappop(self._heap)
+                    job = self.jobs.get(job_id)
+                    if job is not None and job.status == 'queued':
+                        return job
+                await self._available.wait()
+
+    async def _worker(self):
+        while True:
+            job = await self._next_job()
+            job.status = 'running'
+            job.started_at = time.time()
+            job.attempts += 1
+            self._persist(job)
+            self._notify(job)
+            try:
+                job.result = await self._run(job)
+                self._finish(job, 'completed')
+                logger.info(f"Render job {job.id} completed")
+            except RenderCancelled:
+                self._finish(job, 'cancelled')
+                logger.info(f"Render job {job.id} cancelled")
+            except asyncio.CancelledError:
+                # Server shutdown: leave the job queued on disk
+                job.status = 'queued'
+                self._persist(job)
+                raise
+            except Exception as e:
+                logger.exception(f"Render job {job.id} failed")
+                self._finish(job, 'failed', str(e))
+            self._prune()
+
+    def _progress_callback(self, job: RenderJob) -> Callable[[int, int], None]:
+        def progress(done: int, total: int):
+            job.frames_done = done
+            job.frames_total = total
+            if job.cancel_requested or self._stopping:
+                raise RenderCancelled(f"Render job {job.id} cancelled")
+            # Called on a worker thread; listeners run on the event loop
+            self._loop.call_soon_threadsafe(self._progress_changed, job)
+        return progress
+
+    def _progress_changed(self, job: RenderJob):
+        self._notify(job)
+        # Other server processes read progress from disk, at most once per poll interval
+        if job.status == 'running' and \
+                time.monotonic() - self._persisted_at.get(job.id, 0.0) >= settings.RENDER_JOB_POLL_SECONDS:
+            self._persist(job)
+
+    async def _run(self, job: RenderJob) -> Dict[str, Any]:
+        """Prepare a job on the event loop, then render it on a worker thread."""
+        params = dict(job.params)
+        result: Dict[str, Any] = {}
+        if job.kind == 'mood':
+            if self.ml_manager is None:
+                raise RuntimeError("Mood renders need an MLModelManager")
+            video_config = params['video_config']
+            visual_params = await self.ml_manager.generate_visual_parameters(
+                params['audio_features'], params['mood_analysis'], video_config.get('fps', 30)
+            )
+            params['video_config'] = {**video_config, 'visual_parameters': visual_params, 'mood_based': True}
+            # Curves are float32 arrays; the result keeps the static parameters and the curve fps and length
+            result['visual_parameters'] = {k: v for k, v in visual_params.items() if k != 'curves'}
+
+        loop = asyncio.get_running_loop()
+        video_path = await loop.run_in_executor(
+            self._executor, self._render_sync, job.kind, params, self._progress_callback(job),
+            self.checkpoint_dir(job.id), self.stream_dir(job.id) if params.get('stream') else None
+        )
+        result['video_path'] = video_path
+        if (thumbnail_dir(video_path) / INDEX_NAME).exists():
+            result['thumbnails'] = str(thumbnail_dir(video_path))
+        return result
+
+    def _render_sync(self, kind: str, params: Dict[str, Any], progress: Callable[[int, int], None],
+                     checkpoint_dir: Optional[Path] = None, stream_dir: Optional[Path] = None) -> str:
+        """Run one render to completion on the calling worker thread.
+
+        Renders are checkpointed in ``checkpoint_dir``, so a job requeued after a
+        crash resumes from its last complete segment. With a ``stream_dir`` the
+        segments are also published there as an HLS playlist while rendering.
+        """
+        generator = self.video_generator
+        if kind in ('reactive', 'mood'):
+            coroutine = generator.create_audio_reactive_video(
+                params['audio_features'], params['video_config'], progress_callback=progress,
+                checkpoint_dir=checkpoint_dir, stream_dir=stream_dir
+            )
+        elif kind == 'particles':
+            coroutine = generator.create_particle_system_video(
+                params['audio_features'], params['particle_config'], progress_callback=progress,
+                checkpoint_dir=checkpoint_dir, stream_dir=stream_dir
+            )
+        else:
+            coroutine = generator.create_spectrogram_video(
+                params['audio_path'], params.get('spectrogram_type', 'mel'), params.get('fps', 20),
+                progress_callback=progress, draft=params.get('draft', False),
+                checkpoint_dir=checkpoint_dir, stream_dir=stream_dir
+            )
+        # Each worker thread drives the render coroutine on its own event loop
+        return asyncio.run(coroutine)
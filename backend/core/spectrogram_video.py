@@ -0,0 +1,155 @@
+"""
+Scrolling spectrogram video renderer.
+The spectrogram is computed and colour-mapped once; each video frame is a crop
+of that image pasted onto a cached axes overlay.
+"""
+
+import numpy as np
+import cv2
+import librosa
+from typing import Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+SPECTROGRAM_TYPES = ('mel', 'chroma', 'stft')
+CHROMA_LABELS = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+# Dynamic range shown for dB spectrograms
+TOP_DB = 80.0
+
+# Plot margins in pixels: left, top, right, bottom
+MARGINS = (90, 50, 30, 50)
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+TEXT_COLOR = (220, 220, 220)
+BACKGROUND_COLOR = (18, 18, 24)
+
+def colormap_lut(name: str = 'viridis') -> np.ndarray:
+    """256-entry RGB lookup table for one of OpenCV's built-in colormaps."""
+    code = getattr(cv2, f"COLORMAP_{name.upper()}", None)
+    if code is None:
+        raise ValueError(f"Unknown colormap: {name}")
+    ramp = np.arange(256, dtype=np.uint8).reshape(256, 1)
+    return np.ascontiguousarray(cv2.applyColorMap(ramp, code)[:, 0, ::-1])
+
+def _format_hz(hz: float) -> str:
+    return f"{hz / 1000:.1f}k" if hz >= 1000 else f"{hz:.0f}"
+
+def compute_spectrogram(audio: np.ndarray, sample_rate: int, spectrogram_type: str = 'mel',
+                        hop_length: int = 512) -> Tuple[np.ndarray, List[Tuple[float, str]]]:
+    """Spectrogram scaled to [0, 1] (bins x frames, lowest bin first) plus y-axis ticks.
+
+    Ticks are ``(position, label)`` pairs with position in [0, 1] from the bottom.
+    """
+    if spectrogram_type == 'mel':
+        mel = librosa.feature.melspectrogram(y=audio, sr=sample_rate, hop_length=hop_length)
+        values = librosa.power_to_db(mel, ref=np.max, top_db=TOP_DB)
+        values = (values + TOP_DB) / TOP_DB
+        frequencies = librosa.mel_frequencies(n_mels=values.shape[0], fmax=sample_rate / 2)
+        ticks = [(i / (values.shape[0] - 1), _format_hz(frequencies[i]))
+                 for i in np.linspace(0, values.shape[0] - 1, 6).astype(int)]
+    elif spectrogram_type == 'chroma':
+        values = librosa.feature.chroma_stft(y=audio, sr=sample_rate, hop_length=hop_length)
+        ticks = [((i + 0.5) / 12, label) for i, label in enumerate(CHROMA_LABELS)]
+    elif spectrogram_type == 'stft':
+        stft = np.abs(librosa.stft(audio, hop_length=hop_length))
+        values = librosa.amplitude_to_db(stft, ref=np.max, top_db=TOP_DB)
+        values = (values + TOP_DB) / TOP_DB
+        nyquist = sample_rate / 2
+        ticks = [(f, _format_hz(f * nyquist)) for f in np.linspace(0, 1, 6)]
+    else:
+        raise ValueError(f"Unknown spectrogram type: {spectrogram_type}")
+    return np.clip(values, 0.0, 1.0).astype(np.float32), ticks
+
+class ScrollingSpectrogram:
+    """Renders a spectrogram that scrolls right to left, the newest audio at the right edge.
+
+    The whole track is resampled to plot pixels and colour-mapped up front, so a
+    frame costs one slice copy of the plot area plus a timestamp. Margins and
+    text are multiplied by ``scale``, which draft previews set below 1. Frames
+    are RGB, or BGR with ``channel_order='bgr'``.
+    """
+
+    def __init__(self, values: np.ndarray, frame_rate: float, width: int, height: int,
+                 title: str = '', y_ticks: Optional[List[Tuple[float, str]]] = None,
+                 window_seconds: float = 10.0, colormap: str = 'viridis',
+                 nearest: bool = False, scale: float = 1.0, channel_order: str = 'rgb'):
+        if channel_order not in ('rgb', 'bgr'):
+            raise ValueError(f"Unknown channel order: {channel_order}")
+        self.width = width
+        self.height = height
+        self.window_seconds = window_seconds
+        self.scale = scale
+        left, top, right, bottom = self.margins = [int(round(m * scale)) for m in MARGINS]
+        self.plot_x, self.plot_y = left, top
+        self.plot_w = max(1, width - left - right)
+        self.plot_h = max(1, height - top - bottom)
+        self.pixels_per_second = self.plot_w / window_seconds
+        self.background = BACKGROUND_COLOR[::-1] if channel_order == 'bgr' else BACKGROUND_COLOR
+
+        # Colour-map the whole track once: lowest bin at the bottom of the plot
+        duration = values.shape[1] / frame_rate
+        n_columns = max(1, int(np.ceil(duration * self.pixels_per_second)))
+        indices = np.round(values[::-1] * 255).astype(np.uint8)
+        interpolation = cv2.INTER_NEAREST if nearest else cv2.INTER_AREA if values.shape[0] > self.plot_h else cv2.INTER_LINEAR
+        indices = cv2.resize(indices, (n_columns, self.plot_h), interpolation=interpolation)
+        # Leading blank window so early frames reveal the image from the right edge
+        blank = np.zeros((self.plot_h, self.plot_w), dtype=np.uint8)
+        lut = colormap_lut(colormap)
+        if channel_order == 'bgr':
+            lut = np.ascontiguousarray(lut[:, ::-1])
+        self.image = lut[np.hstack([blank, indices])]
+        self.image[:, :self.plot_w] = self.background
+
+        self.frame = self._draw_overlay(title, y_ticks or [])
+
+    def _px(self, pixels: float) -> int:
+        """A full-size pixel distance at this renderer's scale."""
+        return int(round(pixels * self.scale))
+
+    def _thickness(self, pixels: int) -> int:
+        return max(1, self._px(pixels))
+
+    def _draw_overlay(self, title: str, y_ticks: List[Tuple[float, str]]) -> np.ndarray:
+        """Background, title, axes and tick labels, drawn once."""
+        px, scale = self._px, self.scale
+        frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        frame[:] = self.background
+        x0, y0 = self.plot_x, self.plot_y
+        x1, y1 = x0 + self.plot_w, y0 + self.plot_h
+
+        cv2.putText(frame, title, (x0, y0 - px(18)), FONT, 0.7 * scale, TEXT_COLOR, self._thickness(2), cv2.LINE_AA)
+        cv2.rectangle(frame, (x0 - 1, y0 - 1), (x1, y1), TEXT_COLOR, 1)
+
+        for position, label in y_ticks:
+            y = int(round(y1 - 1 - position * (self.plot_h - 1)))
+            cv2.line(frame, (x0 - px(6), y), (x0 - 1, y), TEXT_COLOR, 1)
+            (text_w, text_h), _ = cv2.getTextSize(label, FONT, 0.45 * scale, 1)
+            cv2.putText(frame, label, (x0 - px(10) - text_w, y + text_h // 2), FONT, 0.45 * scale, TEXT_COLOR, 1, cv2.LINE_AA)
+
+        # Time ticks are relative to "now" at the right edge, so they never move
+        step = max(1, int(round(self.window_seconds / 5)))
+        for seconds in range(0, int(self.window_seconds) + 1, step):
+            x = int(round(x1 - 1 - seconds * self.pixels_per_second))
+            if x < x0:
+                break
+            cv2.line(frame, (x, y1), (x, y1 + px(6)), TEXT_COLOR, 1)
+            label = 'now' if seconds == 0 else f"-{seconds}s"
+            (text_w, _), _ = cv2.getTextSize(label, FONT, 0.45 * scale, 1)
+            cv2.putText(frame, label, (x - text_w // 2, y1 + px(24)), FONT, 0.45 * scale, TEXT_COLOR, 1, cv2.LINE_AA)
+        return frame
+
+    def render(self, time_seconds: float) -> np.ndarray:
+        """Frame at ``time_seconds``; the returned buffer is reused by the next call."""
+        end = self.plot_w + int(round(time_seconds * self.pixels_per_second))
+        end = min(max(end, self.plot_w), self.image.shape[1])
+        self.frame[self.plot_y:self.plot_y + self.plot_h, self.plot_x:self.plot_x + self.plot_w] = \
+            self.image[:, end - self.plot_w:end]
+
+        # Timestamp in the top-right corner
+        right = self.width - self.margins[2]
+        label_x = right - self._px(110)
+        self.frame[self._px(8):self.plot_y - self._px(8), label_x:right] = self.background
+        cv2.putText(self.frame, f"{time_seconds:6.1f} s", (label_x, self.plot_y - self._px(18)), FONT, 0.6 * self.scale,
+                    TEXT_COLOR, 1, cv2.LINE_AA)
+        return self.frame
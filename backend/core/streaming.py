@@ -0,0 +1,94 @@
+"""
+Progressive HLS output.
+Segments of a render are remuxed to MPEG-TS as soon as they are finalized and
+listed in a growing EVENT playlist, so players can start before the render ends.
+"""
+
+from typing import Dict, Tuple
+import logging
+import math
+import os
+import subprocess
+from pathlib import Path
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_NAME = "index.m3u8"
+
+def _run_ffmpeg(command, output_path: Path, what: str):
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        output_path.unlink(missing_ok=True)
+        raise RuntimeError(f"ffmpeg {what} failed: {result.stderr.decode(errors='replace').strip()[-2000:]}")
+
+def remux_to_hls(video_path: Path, directory: Path, segment_seconds: float = None) -> Path:
+    """Stream-copy a finished video into a complete (VOD) HLS playlist."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    playlist_path = directory / PLAYLIST_NAME
+    _run_ffmpeg([
+        settings.FFMPEG_BINARY, '-y', '-loglevel', 'error', '-i', str(video_path),
+        '-map', '0:v:0', '-c', 'copy', '-f', 'hls', '-hls_playlist_type', 'vod',
+        '-hls_time', f'{segment_seconds or settings.STREAM_SEGMENT_SECONDS:g}',
+        '-hls_segment_filename', str(directory / 'segment_%05d.ts'), str(playlist_path)
+    ], playlist_path, 'HLS remux')
+    return playlist_path
+
+class SegmentPlaylist:
+    """Rolling HLS playlist fed with finalized render segments.
+
+    Segments may be added in any order; the playlist only ever lists the
+    contiguous run from the first segment, so it never has holes. Adding a
+    segment that is already published is a no-op, which lets a resumed render
+    republish its checkpoint.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segments: Dict[int, Tuple[str, float]] = {}
+        self.finished = False
+
+    @property
+    def playlist_path(self) -> Path:
+        return self.directory / PLAYLIST_NAME
+
+    def add(self, index: int, video_path: Path, start_seconds: float, duration: float):
+        """Remux a finalized segment to MPEG-TS on the render timeline and publish it."""
+        name = f"segment_{index:05d}.ts"
+        ts_path = self.directory / name
+        if not ts_path.exists():
+            tmp_path = self.directory / f"{name}.tmp"
+            _run_ffmpeg([
+                settings.FFMPEG_BINARY, '-y', '-loglevel', 'error', '-i', str(video_path),
+                '-map', '0:v:0', '-c', 'copy', '-output_ts_offset', f'{start_seconds:.6f}',
+                '-muxdelay', '0', '-muxpreload', '0', '-f', 'mpegts', str(tmp_path)
+            ], tmp_path, f'HLS segment {index}')
+            os.replace(tmp_path, ts_path)
+        self.segments[index] = (name, duration)
+        self._write()
+
+    def finish(self):
+        """Mark the playlist complete."""
+        self.finished = True
+        self._write()
+
+    def _write(self):
+        published = []
+        while len(published) in self.segments:
+            published.append(self.segments[len(published)])
+        if not published:
+            return
+        target = max(1, math.ceil(max(duration for _, duration in published)))
+        lines = [
+            '#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-PLAYLIST-TYPE:EVENT',
+            f'#EXT-X-TARGETDURATION:{target}', '#EXT-X-MEDIA-SEQUENCE:0'
+        ]
+        for name, duration in published:
+            lines += [f'#EXTINF:{duration:.3f},', name]
+        if self.finished and len(published) == len(self.segments):
+            lines.append('#EXT-X-ENDLIST')
+        tmp_path = self.playlist_path.with_suffix('.m3u8.tmp')
+        tmp_path.write_text('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.playlist_path)
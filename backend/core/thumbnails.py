@@ -0,0 +1,123 @@
+"""
+Thumbnail sprite sheets.
+Renderers hand every frame they produce to a ThumbnailSprite, which keeps a
+downscaled copy of one frame per interval. When the render finishes the tiles
+are packed into JPEG sprite sheets with a JSON and WebVTT index for scrubbing.
+"""
+
+import numpy as np
+import cv2
+from typing import Dict, List, Optional, Any
+import copy
+import json
+import os
+import shutil
+from pathlib import Path
+from .config import settings
+
+INDEX_NAME = "thumbnails.json"
+VTT_NAME = "thumbnails.vtt"
+
+def thumbnail_dir(video_path: Path) -> Path:
+    """Directory holding the sprite sheets of a rendered video."""
+    video_path = Path(video_path)
+    return video_path.with_name(f"{video_path.stem}_thumbnails")
+
+def _vtt_time(seconds: float) -> str:
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+
+class ThumbnailSprite:
+    """Collects one downscaled BGR frame every ``interval_seconds`` of output.
+
+    Tiles are keyed by frame index, so frame ranges rendered elsewhere (worker
+    processes, earlier checkpoint segments) can be collected separately and merged.
+    """
+
+    def __init__(self, width: int, height: int, fps: float,
+                 interval_seconds: Optional[float] = None, tile_width: Optional[int] = None,
+                 columns: Optional[int] = None, rows: Optional[int] = None):
+        self.fps = fps
+        self.every = max(1, int(round((interval_seconds or settings.THUMBNAIL_INTERVAL_SECONDS) * fps)))
+        self.tile_width = min(tile_width or settings.THUMBNAIL_WIDTH, width)
+        self.tile_height = max(1, int(round(height * self.tile_width / width)))
+        self.columns = columns or settings.THUMBNAIL_COLUMNS
+        self.rows = rows or settings.THUMBNAIL_ROWS
+        self.tiles: Dict[int, np.ndarray] = {}
+
+    def spawn(self) -> 'ThumbnailSprite':
+        """Empty sprite with the same settings, e.g. for a worker process."""
+        sprite = copy.copy(self)
+        sprite.tiles = {}
+        return sprite
+
+    def capture(self, frame_idx: int, frame: np.ndarray):
+        """Keep a tile of the BGR ``frame`` if ``frame_idx`` falls on the interval."""
+        if frame_idx % self.every == 0:
+            self.tiles[frame_idx] = cv2.resize(frame, (self.tile_width, self.tile_height),
+                                               interpolation=cv2.INTER_AREA)
+
+    def capture_video(self, video_path: Path, first_frame: int):
+        """Collect the tiles of an already encoded frame range (used when resuming a render)."""
+        capture = cv2.VideoCapture(str(video_path))
+        try:
+            frame_idx = first_frame
+            while capture.grab():
+                if frame_idx % self.every == 0:
+                    ok, frame = capture.retrieve()
+                    if ok:
+                        self.capture(frame_idx, frame)
+                frame_idx += 1
+        finally:
+            capture.release()
+
+    def save(self, directory: Path, total_frames: int) -> Optional[Path]:
+        """Write sprite sheets plus JSON and WebVTT indexes; returns the JSON index path."""
+        if not self.tiles:
+            return None
+        directory = Path(directory)
+        tmp_dir = directory.with_name(f"{directory.name}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        per_sheet = self.columns * self.rows
+        frames = sorted(self.tiles)
+        duration = total_frames / self.fps
+        sheets: List[str] = []
+        entries: List[Dict[str, Any]] = []
+        cues = ["WEBVTT", ""]
+        for sheet_idx, start in enumerate(range(0, len(frames), per_sheet)):
+            sheet_frames = frames[start:start + per_sheet]
+            rows = (len(sheet_frames) + self.columns - 1) // self.columns
+            columns = min(len(sheet_frames), self.columns)
+            sheet = np.zeros((rows * self.tile_height, columns * self.tile_width, 3), dtype=np.uint8)
+            name = f"sprite_{sheet_idx:03d}.jpg"
+            for position, frame_idx in enumerate(sheet_frames):
+                x = (position % self.columns) * self.tile_width
+                y = (position // self.columns) * self.tile_height
+                sheet[y:y + self.tile_height, x:x + self.tile_width] = self.tiles[frame_idx]
+                start_time = frame_idx / self.fps
+                end_time = min(duration, (frame_idx + self.every) / self.fps)
+                entries.append({'time': round(start_time, 3), 'sheet': sheet_idx, 'x': x, 'y': y})
+                cues += [f"{_vtt_time(start_time)} --> {_vtt_time(end_time)}",
+                         f"{name}#xywh={x},{y},{self.tile_width},{self.tile_height}", ""]
+            cv2.imwrite(str(tmp_dir / name), sheet, [cv2.IMWRITE_JPEG_QUALITY, settings.THUMBNAIL_JPEG_QUALITY])
+            sheets.append(name)
+
+        index = {
+            'interval': self.every / self.fps,
+            'tile_width': self.tile_width,
+            'tile_height': self.tile_height,
+            'columns': self.columns,
+            'rows': self.rows,
+            'sheets': sheets,
+            'tiles': entries
+        }
+        (tmp_dir / INDEX_NAME).write_text(json.dumps(index))
+        (tmp_dir / VTT_NAME).write_text("\n".join(cues))
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_dir, directory)
+        return directory / INDEX_NAME
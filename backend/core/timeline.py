@@ -0,0 +1,151 @@
+"""
+Frame-aligned feature timelines.
+Resamples frame-level audio features onto a video frame grid with vectorized NumPy.
+"""
+
+import numpy as np
+from scipy.signal import lfilter
+from typing import Dict, List, Optional, Any, Sequence
+import base64
+from .config import settings
+
+# Beats affect frames within this many seconds, fading linearly to zero
+BEAT_WINDOW = 0.1
+
+def default_feature_rate() -> float:
+    """Feature frames per second produced by AudioProcessor."""
+    return settings.SAMPLE_RATE / settings.HOP_LENGTH
+
+def frame_times(n_frames: int, fps: float) -> np.ndarray:
+    """Timestamp of every video frame."""
+    return np.arange(n_frames, dtype=np.float64) / fps
+
+def resample_to_frames(values: Sequence[float], n_frames: int, fps: float,
+                       feature_rate: Optional[float] = None,
+                       fill_value: float = 0.0) -> np.ndarray:
+    """Linearly interpolate a frame-level feature onto the video frame grid."""
+    values = np.asarray(values, dtype=np.float64).ravel()
+    if values.size == 0:
+        return np.full(n_frames, fill_value, dtype=np.float32)
+    feature_rate = feature_rate or default_feature_rate()
+    feature_times = np.arange(values.size) / feature_rate
+    return np.interp(frame_times(n_frames, fps), feature_times, values).astype(np.float32)
+
+def beat_envelope(beats: Sequence[float], n_frames: int, fps: float,
+                  window: float = BEAT_WINDOW) -> np.ndarray:
+    """Per-frame beat intensity, 1 on a beat and fading to 0 ``window`` seconds away.
+
+    The nearest beat for every frame is found with one ``searchsorted`` call.
+    """
+    beats = np.sort(np.asarray(beats, dtype=np.float64).ravel())
+    if beats.size == 0 or n_frames == 0:
+        return np.zeros(n_frames, dtype=np.float32)
+    times = frame_times(n_frames, fps)
+    idx = np.searchsorted(beats, times)
+    prev_dist = np.abs(times - beats[np.clip(idx - 1, 0, beats.size - 1)])
+    next_dist = np.abs(beats[np.clip(idx, 0, beats.size - 1)] - times)
+    nearest = np.minimum(prev_dist, next_dist)
+    return np.clip(1.0 - nearest / window, 0.0, 1.0).astype(np.float32)
+
+def normalize(values: np.ndarray, scale: Optional[float] = None) -> np.ndarray:
+    """Scale values into [0, 1] by ``scale`` or by their maximum."""
+    values = np.asarray(values, dtype=np.float32)
+    if scale is None:
+        scale = float(values.max()) if values.size else 0.0
+    if scale <= 0:
+        return np.zeros_like(values)
+    return np.clip(values / scale, 0.0, 1.0)
+
+def smooth(values: np.ndarray, alpha: float) -> np.ndarray:
+    """Exponential moving average (``alpha`` = weight of the newest sample)."""
+    values = np.asarray(values, dtype=np.float64)
+    alpha = float(np.clip(alpha, 1e-3, 1.0))
+    if values.size == 0 or alpha >= 1.0:
+        return values.astype(np.float32)
+    smoothed, _ = lfilter([alpha], [1.0, alpha - 1.0], values, zi=[(1.0 - alpha) * values[0]])
+    return smoothed.astype(np.float32)
+
+def encode_curves(curves: Dict[str, np.ndarray], encoding: str = 'base64') -> Dict[str, Any]:
+    """Serialize float32 curves as base64 little-endian buffers or plain lists."""
+    if encoding == 'list':
+        return {name: np.round(curve, 4).tolist() for name, curve in curves.items()}
+    if encoding == 'base64':
+        return {
+            name: base64.b64encode(np.ascontiguousarray(curve, dtype='<f4').tobytes()).decode()
+            for name, curve in curves.items()
+        }
+    raise ValueError(f"Unknown curve encoding: {encoding}")
+
+def decode_curve(curve: Any) -> np.ndarray:
+    """Inverse of :func:`encode_curves` for a single curve."""
+    if isinstance(curve, str):
+        return np.frombuffer(base64.b64decode(curve), dtype='<f4')
+    return np.asarray(curve, dtype=np.float32)
+
+class FeatureTimeline:
+    """Audio features precomputed once per render as fps-aligned arrays.
+
+    Renderers read frame ``i`` of any feature by index, so per-frame feature
+    cost is O(1) regardless of track length or beat count.
+    """
+
+    def __init__(self, n_frames: int, fps: float, arrays: Dict[str, np.ndarray]):
+        self.n_frames = n_frames
+        self.fps = fps
+        self.arrays = arrays
+
+    @classmethod
+    def build(cls, audio_features: Dict[str, Any], fps: float, n_frames: int,
+              config: Optional[Dict[str, Any]] = None) -> 'FeatureTimeline':
+        """Convert beats, onsets and frame-level spectra to per-frame arrays."""
+        config = config or {}
+        feature_rate = config.get('feature_fps') or audio_features.get('feature_rate') or default_feature_rate()
+
+        spectral_centroid = np.asarray(audio_features.get('spectral_centroid', []), dtype=np.float64)
+        if spectral_centroid.size:
+            spectral_max = config.get('spectral_max') or float(spectral_centroid.max()) or 4000.0
+            spectral_intensity = resample_to_frames(spectral_centroid, n_frames, fps, feature_rate) / spectral_max
+            # Past the end of the analysed audio fall back to a neutral intensity
+            feature_end = spectral_centroid.size / feature_rate
+            spectral_intensity[frame_times(n_frames, fps) >= feature_end] = 0.5
+        else:
+            spectral_intensity = np.full(n_frames, 0.5, dtype=np.float32)
+
+        arrays = {
+            'beat_intensity': beat_envelope(audio_features.get('beats', []), n_frames, fps),
+            'spectral_intensity': np.clip(spectral_intensity, 0.0, 1.0).astype(np.float32),
+            'onset_pulse': onset_pulses(audio_features.get('onsets', []), n_frames, fps)
+        }
+
+        # Per-frame visual parameter curves from MLModelManager, when provided
+        curves = (config.get('visual_parameters') or {}).get('curves', {})
+        for name, curve in curves.items():
+            curve = decode_curve(curve)
+            arrays[name] = np.pad(curve[:n_frames], (0, max(0, n_frames - curve.size)), mode='edge') \
+                if curve.size else np.zeros(n_frames, dtype=np.float32)
+
+        return cls(n_frames, fps, arrays)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.arrays
+
+    def value(self, name: str, frame_idx: int, default: float = 0.0) -> float:
+        """Value of a feature at one frame."""
+        array = self.arrays.get(name)
+        if array is None or frame_idx >= array.size:
+            return default
+        return float(array[frame_idx])
+
+def onset_pulses(onsets: Sequence[float], n_frames: int, fps: float, decay: float = 0.05) -> np.ndarray:
+    """Per-frame pulse that jumps to 1 at each onset and decays exponentially."""
+    onsets = np.sort(np.asarray(onsets, dtype=np.float64).ravel())
+    if onsets.size == 0 or n_frames == 0:
+        return np.zeros(n_frames, dtype=np.float32)
+    times = frame_times(n_frames, fps)
+    last = np.searchsorted(onsets, times, side='right') - 1
+    since = times - onsets[np.clip(last, 0, None)]
+    pulse = np.where(last >= 0, np.exp(-since / decay), 0.0)
+    return pulse.astype(np.float32)
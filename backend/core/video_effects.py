@@ -0,0 +1,213 @@
+"""
+ffmpeg effects compiler.
+Translates an effects list (fade_in, fade_out, resize, speed) into one ffmpeg
+filtergraph so a whole chain runs in a single decode -> filter -> encode pass.
+Long inputs can be split at keyframes and filtered segment by segment in parallel.
+"""
+
+import cv2
+from typing import Dict, List, Optional, Any
+from dataclasses import dataclass, field
+import logging
+from pathlib import Path
+import subprocess
+import csv
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from .config import settings
+from .video_encoder import probe_media, resolve_encoder_options
+
+logger = logging.getLogger(__name__)
+
+# Effect types the compiler can express as ffmpeg filters
+SUPPORTED_EFFECTS = {'fade_in', 'fade_out', 'resize', 'speed'}
+
+@dataclass
+class EffectGraph:
+    """Compiled filter chains for one input."""
+    video_filters: List[str] = field(default_factory=list)
+    audio_filters: List[str] = field(default_factory=list)
+    duration: float = 0.0  # Output duration after speed changes
+    fps: float = 30.0  # Output frame rate, as written by the moviepy path
+
+def media_duration(path: str) -> float:
+    """Duration of a media file in seconds, via ffprobe or OpenCV."""
+    info = probe_media(path)
+    if info and info['duration'] > 0:
+        return info['duration']
+    capture = cv2.VideoCapture(str(path))
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        frame_count = capture.get(cv2.CAP_PROP_FRAME_COUNT)
+    finally:
+        capture.release()
+    if not fps or frame_count <= 0:
+        raise ValueError(f"Could not determine duration of {path}")
+    return frame_count / fps
+
+def atempo_chain(factor: float) -> List[str]:
+    """atempo filters for a speed factor; older ffmpeg limits each one to [0.5, 2]."""
+    filters = []
+    while factor > 2.0:
+        filters.append('atempo=2.0')
+        factor /= 2.0
+    while factor < 0.5:
+        filters.append('atempo=0.5')
+        factor /= 0.5
+    filters.append(f'atempo={factor:.6g}')
+    return filters
+
+def compile_effects(effects: List[Dict[str, Any]], duration: float) -> Optional[EffectGraph]:
+    """Compile effects, applied in order, into filter chains.
+
+    Returns None when the list contains an effect without a filter
+    equivalent, so the caller can fall back to the moviepy path.
+    """
+    graph = EffectGraph(duration=duration)
+    for effect in effects:
+        effect_type = effect.get('type')
+        if effect_type not in SUPPORTED_EFFECTS:
+            return None
+
+        if effect_type == 'fade_in':
+            fade = min(float(effect.get('duration') or 1.0), graph.duration)
+            graph.video_filters.append(f'fade=t=in:st=0:d={fade:.6g}')
+
+        elif effect_type == 'fade_out':
+            fade = min(float(effect.get('duration') or 1.0), graph.duration)
+            graph.video_filters.append(f'fade=t=out:st={graph.duration - fade:.6g}:d={fade:.6g}')
+
+        elif effect_type == 'resize':
+            scale = float(effect.get('scale') or 1.0)
+            if scale <= 0:
+                raise ValueError(f"Resize scale must be positive, got {scale}")
+            # Even dimensions keep yuv420p encoders happy
+            graph.video_filters.append(f'scale=trunc(iw*{scale:.6g}/2)*2:trunc(ih*{scale:.6g}/2)*2')
+
+        elif effect_type == 'speed':
+            factor = float(effect.get('factor') or 1.0)
+            if factor <= 0:
+                raise ValueError(f"Speed factor must be positive, got {factor}")
+            graph.video_filters.append(f'setpts=PTS/{factor:.6g}')
+            graph.audio_filters.extend(atempo_chain(factor))
+            graph.duration /= factor
+
+    return graph
+
+def _video_codec_args(options: Dict[str, Any]) -> List[str]:
+    args = ['-c:v', options['codec'], '-pix_fmt', options['output_pix_fmt'], '-threads', str(options['threads'])]
+    if options['codec'] in ('libx264', 'libx265'):
+        args += ['-preset', options['preset'], '-crf', str(options['crf'])]
+    return args
+
+def _run_ffmpeg(command: List[str], output_path: str, what: str):
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        Path(output_path).unlink(missing_ok=True)
+        raise RuntimeError(f"ffmpeg {what} failed: {result.stderr.decode(errors='replace').strip()[-2000:]}")
+
+def effects_command(input_path: str, output_path: str, graph: EffectGraph,
+                    encoder_options: Optional[Dict[str, Any]] = None) -> List[str]:
+    """ffmpeg command running a compiled graph in one pass."""
+    options = resolve_encoder_options(encoder_options)
+    command = [
+        settings.FFMPEG_BINARY, '-y', '-loglevel', 'error', '-i', str(input_path),
+        '-map', '0:v:0', '-map', '0:a:0?'
+    ]
+    command += ['-vf', ','.join(graph.video_filters + [f'fps={graph.fps:g}'])]
+    if graph.audio_filters:
+        command += ['-af', ','.join(graph.audio_filters)]
+    command += _video_codec_args(options) + ['-c:a', 'aac']
+    if str(output_path).endswith('.mp4'):
+        command += ['-movflags', '+faststart']
+    command.append(str(output_path))
+    return command
+
+def run_effects(input_path: str, output_path: str, graph: EffectGraph,
+                encoder_options: Optional[Dict[str, Any]] = None) -> str:
+    """Apply a compiled graph with a single ffmpeg invocation."""
+    _run_ffmpeg(effects_command(input_path, output_path, graph, encoder_options), output_path, 'effects pass')
+    return str(output_path)
+
+def split_at_keyframes(input_path: str, output_dir: Path, segment_seconds: float) -> List[Dict[str, Any]]:
+    """Stream-copy the video track into GOP-aligned segments.
+
+    The segment muxer only cuts on keyframes, so each segment starts at the
+    first keyframe after a multiple of ``segment_seconds``. Returns the
+    segments in order with their start and end times in the input.
+    """
+    list_path = output_dir / "segments.csv"
+    _run_ffmpeg([
+        settings.FFMPEG_BINARY, '-y', '-loglevel', 'error', '-i', str(input_path),
+        '-map', '0:v:0', '-c', 'copy', '-f', 'segment', '-segment_time', f'{segment_seconds:.3f}',
+        '-reset_timestamps', '1', '-segment_list', str(list_path), '-segment_list_type', 'csv',
+        str(output_dir / 'source_%05d.mp4')
+    ], str(list_path), 'keyframe split')
+    with open(list_path, newline='') as f:
+        return [
+            {'path': output_dir / name, 'start': float(start), 'end': float(end)}
+            for name, start, end in csv.reader(f)
+        ]
+
+def segment_filters(graph: EffectGraph, start: float) -> str:
+    """Video chain for one segment.
+
+    The segment's timestamps are first shifted back to input time, so fades
+    and speed changes see exactly what the single-pass graph sees. Output
+    frames are snapped to the global frame grid before timestamps are reset
+    for concatenation.
+    """
+    filters = [f'setpts=PTS+{start:.6f}/TB'] + graph.video_filters
+    filters += [f'fps={graph.fps:g}', 'setpts=PTS-STARTPTS']
+    return ','.join(filters)
+
+def run_effects_parallel(input_path: str, output_path: str, graph: EffectGraph,
+                         encoder_options: Optional[Dict[str, Any]] = None,
+                         workers: Optional[int] = None) -> str:
+    """Apply a compiled graph to keyframe-aligned segments concurrently.
+
+    Segments are filtered and encoded by up to ``workers`` ffmpeg processes,
+    joined with the concat demuxer without re-encoding, and muxed with the
+    audio track, which is filtered in one pass since audio is cheap.
+    """
+    workers = max(1, workers or settings.VIDEO_EFFECTS_WORKERS)
+    options = resolve_encoder_options(encoder_options)
+    # Share the cores between the concurrent encoders
+    options['threads'] = options['threads'] or max(1, (os.cpu_count() or 1) // workers)
+
+    with tempfile.TemporaryDirectory(dir=Path(output_path).parent) as tmp:
+        tmp_dir = Path(tmp)
+        duration = media_duration(input_path)
+        # A few segments per worker balances uneven GOPs
+        segments = split_at_keyframes(input_path, tmp_dir, max(1.0, duration / (workers * 3)))
+
+        def process(index: int) -> Path:
+            segment = segments[index]
+            processed = tmp_dir / f"processed_{index:05d}.mp4"
+            _run_ffmpeg([
+                settings.FFMPEG_BINARY, '-y', '-loglevel', 'error', '-i', str(segment['path']),
+                '-vf', segment_filters(graph, segment['start']), '-r', f'{graph.fps:g}'
+            ] + _video_codec_args(options) + [str(processed)], str(processed), f'effects pass on segment {index}')
+            return processed
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            processed = list(pool.map(process, range(len(segments))))
+
+        list_path = tmp_dir / "processed.txt"
+        list_path.write_text("".join(f"file '{path.as_posix()}'\n" for path in processed))
+        command = [
+            settings.FFMPEG_BINARY, '-y', '-loglevel', 'error',
+            '-f', 'concat', '-safe', '0', '-i', str(list_path), '-i', str(input_path),
+            '-map', '0:v:0', '-map', '1:a:0?', '-c:v', 'copy'
+        ]
+        if graph.audio_filters:
+            command += ['-af', ','.join(graph.audio_filters)]
+        command += ['-c:a', 'aac', '-shortest']
+        if str(output_path).endswith('.mp4'):
+            command += ['-movflags', '+faststart']
+        command.append(str(output_path))
+        _run_ffmpeg(command, output_path, 'segment concat')
+
+    logger.info(f"Applied effects to {len(segments)} segments with {workers} workers")
+    return str(output_path)
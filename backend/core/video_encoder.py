@@ -0,0 +1,386 @@
+"""
+Video encoder backends.
+Streams raw frames into an ffmpeg subprocess, with OpenCV's VideoWriter as a fallback,
+and remuxes finished renders with ffmpeg stream copy.
+"""
+
+import numpy as np
+import cv2
+from typing import Dict, List, Optional, Any, Tuple
+import logging
+from pathlib import Path
+import shutil
+import subprocess
+import tempfile
+import threading
+import queue
+import json
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Speed/quality presets for libx264-style encoders
+ENCODER_PRESETS: Dict[str, Dict[str, Any]] = {
+    'draft': {'preset': 'ultrafast', 'crf': 30},
+    'fast': {'preset': 'veryfast', 'crf': 26},
+    'balanced': {'preset': 'medium', 'crf': 23},
+    'quality': {'preset': 'slow', 'crf': 18}
+}
+
+# Raw input layouts accepted by the encoders: ffmpeg pix_fmt -> channel count.
+# yuv420p is planar: one (height * 3 / 2, width) array holding the Y, U and V planes
+INPUT_PIXEL_FORMATS = {'rgb24': 3, 'bgr24': 3, 'gray': 1, 'yuv420p': 1}
+
+# cv2 conversion of a BGR frame into each input layout (None: plain copy)
+BGR_CONVERSIONS = {
+    'bgr24': None,
+    'rgb24': cv2.COLOR_BGR2RGB,
+    'gray': cv2.COLOR_BGR2GRAY,
+    'yuv420p': cv2.COLOR_BGR2YUV_I420
+}
+
+def frame_shape(input_pix_fmt: str, width: int, height: int) -> Tuple[int, ...]:
+    """Array shape of one raw frame in ``input_pix_fmt``."""
+    if input_pix_fmt == 'yuv420p':
+        if width % 2 or height % 2:
+            raise ValueError(f"yuv420p input needs even dimensions, got {width}x{height}")
+        return (height * 3 // 2, width)
+    channels = INPUT_PIXEL_FORMATS[input_pix_fmt]
+    return (height, width, channels) if channels > 1 else (height, width)
+
+def resolve_encoder_options(options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Merge explicit encoder options over the named quality preset and defaults."""
+    options = {k: v for k, v in (options or {}).items() if v is not None}
+    quality = options.get('quality', settings.VIDEO_ENCODER_QUALITY)
+    if quality not in ENCODER_PRESETS:
+        raise ValueError(f"Unknown encoder quality preset: {quality}")
+    resolved = {
+        'backend': settings.VIDEO_ENCODER_BACKEND,
+        'codec': 'libx264',
+        'threads': 0,
+        'input_pix_fmt': 'rgb24',
+        'output_pix_fmt': 'yuv420p',
+        **ENCODER_PRESETS[quality],
+        'quality': quality
+    }
+    resolved.update(options)
+    if resolved['input_pix_fmt'] not in INPUT_PIXEL_FORMATS:
+        raise ValueError(f"Unsupported input pixel format: {resolved['input_pix_fmt']}")
+    return resolved
+
+def ffmpeg_available() -> bool:
+    """Whether the configured ffmpeg binary can be found."""
+    return shutil.which(settings.FFMPEG_BINARY) is not None
+
+def native_input_format(width: int, height: int, options: Optional[Dict[str, Any]] = None) -> str:
+    """Cheapest input layout for frames the renderers draw in BGR.
+
+    ffmpeg encoding to yuv420p takes planar I420 directly: half the bytes of
+    RGB through the pipe and no colour conversion inside ffmpeg. OpenCV's
+    VideoWriter takes BGR as is.
+    """
+    resolved = resolve_encoder_options(options)
+    if (resolved['backend'] == 'ffmpeg' and ffmpeg_available() and resolved['output_pix_fmt'] == 'yuv420p'
+            and width % 2 == 0 and height % 2 == 0):
+        return 'yuv420p'
+    return 'bgr24'
+
+def native_encoder_options(width: int, height: int, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """``options`` with the input layout set for frames written with ``FrameSink.write_bgr``."""
+    return {**(options or {}), 'input_pix_fmt': native_input_format(width, height, options)}
+
+# Audio codecs that can be stream-copied into an MP4 container
+MP4_AUDIO_CODECS = {'aac', 'mp3', 'alac', 'opus', 'ac3', 'eac3'}
+
+def probe_media(path: str) -> Optional[Dict[str, Any]]:
+    """Duration and stream codecs of a media file via ffprobe, or None if ffprobe is unavailable."""
+    if shutil.which(settings.FFPROBE_BINARY) is None:
+        return None
+    result = subprocess.run(
+        [settings.FFPROBE_BINARY, '-v', 'error', '-print_format', 'json',
+         '-show_format', '-show_streams', str(path)],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe failed for {path}: {result.stderr.strip()[-2000:]}")
+    info = json.loads(result.stdout or '{}')
+    streams = info.get('streams', [])
+    video = next((st for st in streams if st.get('codec_type') == 'video'), None)
+    audio = next((st for st in streams if st.get('codec_type') == 'audio'), None)
+    return {
+        'duration': float(info.get('format', {}).get('duration') or 0.0),
+        'video_codec': video.get('codec_name') if video else None,
+        'audio_codec': audio.get('codec_name') if audio else None
+    }
+
+def mux_audio(video_path: str, audio_path: str, output_path: str,
+              audio_bitrate: str = '192k') -> str:
+    """Attach an audio track to a video without re-encoding the video.
+
+    The video stream is copied, looped at packet level when it is shorter than
+    the audio and cut at the audio's end otherwise. The audio is copied when
+    the container accepts its codec and transcoded to AAC when it does not.
+    """
+    audio_info = probe_media(audio_path)
+    copy_audio = bool(audio_info) and audio_info['audio_codec'] in MP4_AUDIO_CODECS
+
+    command = [
+        settings.FFMPEG_BINARY, '-y', '-loglevel', 'error',
+        '-stream_loop', '-1', '-i', str(video_path),
+        '-i', str(audio_path),
+        '-map', '0:v:0', '-map', '1:a:0',
+        '-c:v', 'copy'
+    ]
+    command += ['-c:a', 'copy'] if copy_audio else ['-c:a', 'aac', '-b:a', audio_bitrate]
+    if audio_info and audio_info['duration'] > 0:
+        command += ['-t', f"{audio_info['duration']:.3f}"]
+    else:
+        # Without ffprobe, stop at the end of the (finite) audio input
+        command += ['-shortest', '-fflags', '+shortest', '-max_interleave_delta', '100M']
+    if str(output_path).endswith('.mp4'):
+        command += ['-movflags', '+faststart']
+    command.append(str(output_path))
+
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        Path(output_path).unlink(missing_ok=True)
+        raise RuntimeError(f"ffmpeg mux failed: {result.stderr.decode(errors='replace').strip()[-2000:]}")
+    return str(output_path)
+
+class FFmpegPipeEncoder:
+    """Encode frames by streaming raw pixels into ffmpeg over stdin.
+
+    Writes block while ffmpeg's pipe buffer is full, so a renderer can never run
+    ahead of the encoder by more than one pipe buffer.
+    """
+
+    def __init__(self, output_path: str, width: int, height: int, fps: float,
+                 codec: str = 'libx264', preset: str = 'medium', crf: int = 23,
+                 threads: int = 0, input_pix_fmt: str = 'rgb24',
+                 output_pix_fmt: str = 'yuv420p', **_):
+        self.output_path = str(output_path)
+        self.width = width
+        self.height = height
+        self.input_pix_fmt = input_pix_fmt
+        self.frame_shape = frame_shape(input_pix_fmt, width, height)
+        self.frames_written = 0
+
+        command = [
+            settings.FFMPEG_BINARY, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', input_pix_fmt,
+            '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+            '-an', '-c:v', codec, '-pix_fmt', output_pix_fmt,
+            '-threads', str(threads)
+        ]
+        if codec in ('libx264', 'libx265'):
+            command += ['-preset', preset, '-crf', str(crf)]
+        if self.output_path.endswith('.mp4'):
+            command += ['-movflags', '+faststart']
+        command.append(self.output_path)
+
+        # stderr goes to a file so a chatty ffmpeg can never block on a full pipe
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=self._stderr)
+
+    def write(self, frame: np.ndarray):
+        """Send one frame; blocks while ffmpeg is behind (backpressure)."""
+        if frame.shape != self.frame_shape[:frame.ndim] or frame.dtype != np.uint8:
+            raise ValueError(f"Expected uint8 frame of shape {self.frame_shape}, got {frame.dtype} {frame.shape}")
+        try:
+            self._process.stdin.write(memoryview(np.ascontiguousarray(frame)).cast('B'))
+        except (BrokenPipeError, OSError) as e:
+            raise RuntimeError(f"ffmpeg encoder exited early: {self._error_output()}") from e
+        self.frames_written += 1
+
+    def _error_output(self) -> str:
+        self._stderr.seek(0)
+        return self._stderr.read().decode(errors='replace').strip()[-2000:]
+
+    def close(self):
+        """Flush remaining frames and wait for ffmpeg to finalize the file."""
+        if self._process.stdin and not self._process.stdin.closed:
+            try:
+                self._process.stdin.close()
+            except BrokenPipeError:
+                pass
+        returncode = self._process.wait()
+        error_output = self._error_output()
+        self._stderr.close()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with code {returncode}: {error_output}")
+
+    def abort(self):
+        """Stop encoding and discard the partial output."""
+        self._process.kill()
+        self._process.wait()
+        self._stderr.close()
+        Path(self.output_path).unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+class OpenCVEncoder:
+    """cv2.VideoWriter behind the same interface as FFmpegPipeEncoder."""
+
+    def __init__(self, output_path: str, width: int, height: int, fps: float,
+                 input_pix_fmt: str = 'rgb24', fourcc: str = 'mp4v', **_):
+        self.output_path = str(output_path)
+        self.input_pix_fmt = input_pix_fmt
+        self.frames_written = 0
+        # Conversion target, reused for every frame
+        self._bgr = np.empty((height, width, 3), dtype=np.uint8)
+        self._writer = cv2.VideoWriter(
+            self.output_path, cv2.VideoWriter_fourcc(*fourcc), fps, (width, height)
+        )
+        if not self._writer.isOpened():
+            raise RuntimeError(f"OpenCV could not open a {fourcc} writer for {self.output_path}")
+
+    def write(self, frame: np.ndarray):
+        """Write one frame, converting to the BGR layout OpenCV expects."""
+        if self.input_pix_fmt == 'rgb24':
+            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=self._bgr)
+        elif self.input_pix_fmt == 'gray':
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR, dst=self._bgr)
+        elif self.input_pix_fmt == 'yuv420p':
+            frame = cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_I420, dst=self._bgr)
+        self._writer.write(frame)
+        self.frames_written += 1
+
+    def close(self):
+        self._writer.release()
+
+    def abort(self):
+        self._writer.release()
+        Path(self.output_path).unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def create_encoder(output_path: str, width: int, height: int, fps: float,
+                   options: Optional[Dict[str, Any]] = None):
+    """Open the configured encoder backend, falling back to OpenCV if ffmpeg is unavailable."""
+    options = resolve_encoder_options(options)
+    if options['backend'] == 'ffmpeg':
+        if ffmpeg_available():
+            return FFmpegPipeEncoder(output_path, width, height, fps, **options)
+        logger.warning("ffmpeg not found, falling back to OpenCV encoder")
+    return OpenCVEncoder(output_path, width, height, fps, **options)
+
+class FrameSink:
+    """Encode frames on a background thread as they are rendered.
+
+    ``write`` copies each frame into one of ``queue_size`` preallocated buffers
+    and hands it to the encoder thread, blocking when all buffers are in
+    flight. Memory stays constant for any video length, the caller may reuse
+    its frame buffer immediately, and rendering overlaps with encoding.
+    ``write_bgr`` converts a BGR frame straight into the pooled buffer instead,
+    so renderers can draw in BGR whatever layout the encoder takes.
+    """
+
+    _STOP = object()
+
+    def __init__(self, output_path: str, width: int, height: int, fps: float,
+                 options: Optional[Dict[str, Any]] = None, queue_size: Optional[int] = None):
+        queue_size = max(1, queue_size or settings.VIDEO_SINK_QUEUE_FRAMES)
+        self.output_path = str(output_path)
+        self.frames_written = 0
+        self._encoder = create_encoder(output_path, width, height, fps, options)
+        self.input_pix_fmt = self._encoder.input_pix_fmt
+        shape = frame_shape(self.input_pix_fmt, width, height)
+
+        self._free: queue.Queue = queue.Queue()
+        for _ in range(queue_size):
+            self._free.put(np.empty(shape, dtype=np.uint8))
+        self._pending: queue.Queue = queue.Queue()
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._encode_loop, name="frame-sink", daemon=True)
+        self._thread.start()
+
+    def _encode_loop(self):
+        while True:
+            buffer = self._pending.get()
+            if buffer is self._STOP:
+                return
+            try:
+                if self._error is None:
+                    self._encoder.write(buffer)
+            except BaseException as e:
+                self._error = e
+            finally:
+                # Always recycle the buffer so a blocked writer can observe the error
+                self._free.put(buffer)
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise RuntimeError(f"Frame encoding failed: {self._error}") from self._error
+
+    def _acquire(self) -> np.ndarray:
+        """A free buffer; blocks while the encoder is behind."""
+        self._raise_if_failed()
+        buffer = self._free.get()
+        self._raise_if_failed()
+        return buffer
+
+    def _submit(self, buffer: np.ndarray):
+        self._pending.put(buffer)
+        self.frames_written += 1
+
+    def write(self, frame: np.ndarray):
+        """Queue one frame in the encoder's input layout; blocks while the encoder is behind."""
+        buffer = self._acquire()
+        np.copyto(buffer, frame)
+        self._submit(buffer)
+
+    def write_bgr(self, frame: np.ndarray):
+        """Queue one BGR frame, converted into the encoder's input layout."""
+        buffer = self._acquire()
+        code = BGR_CONVERSIONS[self.input_pix_fmt]
+        if code is None:
+            np.copyto(buffer, frame)
+        else:
+            cv2.cvtColor(frame, code, dst=buffer)
+        self._submit(buffer)
+
+    def close(self):
+        """Drain the queue and finalize the output file."""
+        if self._closed:
+            return
+        self._closed = True
+        self._pending.put(self._STOP)
+        self._thread.join()
+        if self._error is not None:
+            self._encoder.abort()
+            self._raise_if_failed()
+        self._encoder.close()
+
+    def abort(self):
+        """Stop encoding and discard the output."""
+        if self._closed:
+            return
+        self._closed = True
+        self._error = self._error or RuntimeError("aborted")
+        self._pending.put(self._STOP)
+        self._thread.join()
+        self._encoder.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
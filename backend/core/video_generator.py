@@ -8,23 +8,51 @@ import cv2
 from moviepy.editor import VideoFileClip, AudioFileClip, CompositeVideoClip, ColorClip
 from moviepy.video.fx import resize, fadeout, fadein
 from moviepy.audio.fx import audio_fadeout, audio_fadein
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Callable, Dict, List, Tuple, Optional, Any
 import logging
 from pathlib import Path
+import asyncio
+import multiprocessing
+import shutil
+import subprocess
 import tempfile
+import threading
 import os
+from concurrent.futures import ProcessPoolExecutor
+from uuid import uuid4
 from .config import settings
+from .checkpoint import RenderCheckpoint, render_fingerprint
+from .draft import RenderGeometry, render_geometry
+from .particles import ParticleSystem, ParticleRasterizer
+from .streaming import SegmentPlaylist, remux_to_hls
+from .thumbnails import ThumbnailSprite, thumbnail_dir
+from .spectrogram_video import SPECTROGRAM_TYPES, ScrollingSpectrogram, compute_spectrogram
+from .timeline import FeatureTimeline
+from .video_effects import compile_effects, media_duration, run_effects, run_effects_parallel
+from .video_encoder import FrameSink, create_encoder, ffmpeg_available, mux_audio, native_encoder_options
 
 logger = logging.getLogger(__name__)
 
+# progress(frames_done, total_frames)
+ProgressCallback = Callable[[int, int], None]
+PROGRESS_INTERVAL_FRAMES = 30
+
+# Part of every render cache key: bump when a renderer change alters the output for the same inputs
+RENDERER_VERSION = 1
+# Config keys that change how a render is scheduled, not what it looks like
+RENDER_CACHE_IGNORED_KEYS = ('render_workers',)
+
 class VideoGenerator:
     """Advanced video generation and effects processing."""
     
     def __init__(self):
         self._ready = True
         self.temp_dir = settings.VIDEO_DIR
+        self._render_pool: Optional[ProcessPoolExecutor] = None
+        self._render_pool_size = 0
+        self._progress_manager = None
+        # Render jobs may run concurrently on worker threads
+        self._render_pool_lock = threading.Lock()
         
     def is_ready(self) -> bool:
         """Check if the video generator is ready."""
@@ -32,90 +60,367 @@ class VideoGenerator:
     
     async def create_audio_reactive_video(self, 
                                         audio_features: Dict[str, Any],
-                                        video_config: Dict[str, Any]) -> str:
-        """Create an audio-reactive video based on extracted features."""
+                                        video_config: Dict[str, Any],
+                                        progress_callback: Optional[ProgressCallback] = None,
+                                        checkpoint_dir: Optional[Path] = None,
+                                        stream_dir: Optional[Path] = None) -> str:
+        """Create an audio-reactive video based on extracted features.
+
+        With ``render_workers`` > 1 in ``video_config`` (or VIDEO_RENDER_WORKERS),
+        frame ranges are rendered and encoded in separate processes and joined
+        losslessly. ``progress_callback(frames_done, total_frames)`` is called as
+        frames complete. With a ``checkpoint_dir`` the render is written as
+        resumable segments (see :class:`RenderCheckpoint`); with a ``stream_dir``
+        each finished segment is also published to an HLS playlist there.
+        ``draft`` in ``video_config`` renders a low-resolution preview (see :mod:`core.draft`).
+        """
+        render_path = None
         try:
             duration = audio_features.get('duration', 30)
             fps = video_config.get('fps', 30)
             width = video_config.get('width', 1920)
             height = video_config.get('height', 1080)
+            geometry = render_geometry(width, height, fps, video_config.get('draft', False))
             
-            # Extract relevant features
-            beats = audio_features.get('beats', [])
-            spectral_centroid = audio_features.get('spectral_centroid', [])
             tempo = audio_features.get('tempo', 120)
             
-            # Create frames
-            total_frames = int(duration * fps)
-            from uuid import uuid4
-            unique_id = uuid4().hex
-            output_path = self.temp_dir / f"reactive_video_{unique_id}.mp4"
-            height, width = height, width
-            fourcc = cv2.VideoWriter_fourcc(*'avc1')
-            out = cv2.VideoWriter(str(output_path), fourcc, fps, (width, height))
-            
-            for frame_idx in range(total_frames):
-                current_time = frame_idx / fps
-                frame = self._generate_reactive_frame(
-                    current_time, beats, spectral_centroid, tempo, width, height
+            # Create frames; features stay on the full-rate grid and drafts sample every frame_step-th
+            full_frames = int(duration * fps)
+            total_frames = geometry.output_frames(full_frames)
+            render_key = self._render_key('reactive', audio_features, video_config)
+            output_path = self._render_output_path('reactive_video', render_key)
+            if self._is_cached(output_path, total_frames, progress_callback, stream_dir):
+                return str(output_path)
+            render_path = self._partial_path(output_path)
+            
+            # Precompute every per-frame feature once instead of scanning per frame
+            feature_timeline = FeatureTimeline.build(audio_features, fps, full_frames, video_config)
+            frequency_bins = video_config.get('frequency_bins')
+            render_args = (
+                feature_timeline, tempo, geometry.width, geometry.height, frequency_bins,
+                geometry.encoder_options(video_config.get('encoder')), geometry.scale, geometry.frame_step
+            )
+            
+            render_workers = video_config.get('render_workers') or settings.VIDEO_RENDER_WORKERS
+            thumbnails = self._new_thumbnails(geometry)
+            checkpoint = self._open_checkpoint(checkpoint_dir, total_frames, geometry.fps, render_key,
+                                               stream_dir, thumbnails)
+            if checkpoint is not None:
+                await self._render_reactive_checkpointed(
+                    render_path, checkpoint, render_workers, render_args, progress_callback, thumbnails
+                )
+                await self._finish_checkpoint(checkpoint, render_path)
+            elif (render_workers > 1 and total_frames >= render_workers * settings.VIDEO_MIN_CHUNK_FRAMES
+                  and ffmpeg_available()):
+                # Chunks are joined with ffmpeg's concat demuxer
+                await self._render_reactive_parallel(
+                    render_path, total_frames, render_workers, render_args, progress_callback, thumbnails
+                )
+            else:
+                self._render_reactive_range(
+                    str(render_path), 0, total_frames, *render_args, progress=progress_callback,
+                    thumbnails=thumbnails
                 )
-                frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-                out.write(frame_bgr)
+            self._save_thumbnails(thumbnails, output_path, total_frames)
+            os.replace(render_path, output_path)
             
-            out.release()
             logger.info(f"Generated audio-reactive video: {output_path}")
             
-            logger.info(f"Generated audio-reactive video: {output_path}")
             return str(output_path)
             
         except Exception as e:
+            if render_path is not None:
+                render_path.unlink(missing_ok=True)
             logger.error(f"Error creating audio-reactive video: {e}")
             raise
     
-    def _generate_reactive_frame(self, time: float, beats: List[float], 
-                               spectral_centroid: List[float], tempo: float,
-                               width: int, height: int) -> np.ndarray:
-        """Generate a single frame based on audio features."""
-        # Create base frame
-        frame = np.zeros((height, width, 3), dtype=np.uint8)
+    def _render_reactive_range(self, output_path: str, start_frame: int, end_frame: int,
+                               feature_timeline: FeatureTimeline, tempo: float,
+                               width: int, height: int, frequency_bins: Optional[List[float]],
+                               encoder_options: Optional[Dict[str, Any]] = None,
+                               scale: float = 1.0, frame_step: int = 1,
+                               progress: Optional[ProgressCallback] = None,
+                               thumbnails: Optional[ThumbnailSprite] = None):
+        """Render and encode output frames [start_frame, end_frame) of a reactive video.
+
+        Output frame ``i`` shows timeline frame ``i * frame_step``.
+        """
+        total = end_frame - start_frame
+        fps = feature_timeline.fps / frame_step
+        encoder_options = native_encoder_options(width, height, encoder_options)
+        # Every frame is drawn into this one buffer and converted into the sink's pool
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        with FrameSink(output_path, width, height, fps, encoder_options) as sink:
+            for frame_idx in range(start_frame, end_frame):
+                self._generate_reactive_frame(
+                    frame_idx * frame_step, feature_timeline, tempo, width, height, frequency_bins, scale, frame
+                )
+                sink.write_bgr(frame)
+                if thumbnails is not None:
+                    thumbnails.capture(frame_idx, frame)
+                done = frame_idx - start_frame + 1
+                if progress and (done % PROGRESS_INTERVAL_FRAMES == 0 or done == total):
+                    progress(done, total)
+    
+    def _get_render_pool(self, max_workers: int) -> ProcessPoolExecutor:
+        """Lazily start the process pool used for chunked rendering."""
+        with self._render_pool_lock:
+            if self._render_pool is None or self._render_pool_size < max_workers:
+                if self._render_pool is not None:
+                    self._render_pool.shutdown(wait=False)
+                context = multiprocessing.get_context('spawn')
+                self._render_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+                self._render_pool_size = max_workers
+                if self._progress_manager is None:
+                    self._progress_manager = context.Manager()
+            return self._render_pool
+    
+    async def _render_reactive_parallel(self, output_path: Path, total_frames: int, render_workers: int,
+                                        render_args: Tuple, progress_callback: Optional[ProgressCallback],
+                                        thumbnails: Optional[ThumbnailSprite] = None):
+        """Render frame ranges in worker processes and concatenate the chunks."""
+        boundaries = np.linspace(0, total_frames, render_workers + 1).astype(int)
+        ranges = [(int(boundaries[i]), int(boundaries[i + 1])) for i in range(render_workers)]
+        chunk_dir = Path(tempfile.mkdtemp(prefix=f"{output_path.stem}_chunks_", dir=self.temp_dir))
+        chunk_paths = [chunk_dir / f"chunk_{i:04d}.mp4" for i in range(render_workers)]
         
-        # Calculate beat intensity
-        beat_intensity = 0
-        for beat_time in beats:
-            if abs(time - beat_time) < 0.1:  # Beat detection window
-                beat_intensity = max(beat_intensity, 1.0 - abs(time - beat_time) * 10)
+        try:
+            await self._render_ranges_in_pool(
+                ranges, chunk_paths, render_workers, render_args, progress_callback, total_frames,
+                thumbnails=thumbnails
+            )
+            await asyncio.to_thread(self._concat_chunks, chunk_paths, output_path)
+        finally:
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+    
+    async def _render_ranges_in_pool(self, ranges: List[Tuple[int, int]], chunk_paths: List[Path],
+                                     render_workers: int, render_args: Tuple,
+                                     progress_callback: Optional[ProgressCallback], total_frames: int,
+                                     frames_before: int = 0,
+                                     on_chunk_done: Optional[Callable[[int], None]] = None,
+                                     thumbnails: Optional[ThumbnailSprite] = None):
+        """Render each frame range to its chunk path in the process pool.
+
+        ``on_chunk_done(i)`` is called on the event loop as soon as chunk ``i``
+        has been written; the first chunk failure is re-raised once all have finished.
+        Thumbnail tiles captured by the workers are merged into ``thumbnails``.
+        """
+        pool = self._get_render_pool(render_workers)
+        progress_queue = self._progress_manager.Queue()
+        loop = asyncio.get_running_loop()
+        futures = {}
         
-        # Calculate spectral intensity
-        feature_fps = video_config.get('feature_fps', 30)  # Default to 30 if not provided
-        frame_idx = int(time * feature_fps)
-        if frame_idx < len(spectral_centroid):
-            spectral_max = video_config.get('spectral_max', max(spectral_centroid) if spectral_centroid else 4000.0)
-            spectral_intensity = spectral_centroid[frame_idx] / spectral_max  # Normalize
+        try:
+            for i, (start, end) in enumerate(ranges):
+                future = loop.run_in_executor(
+                    pool, _render_reactive_chunk, i, str(chunk_paths[i]), start, end, render_args, progress_queue,
+                    thumbnails.spawn() if thumbnails is not None else None
+                )
+                futures[future] = i
+            
+            # Aggregate per-chunk progress until every chunk has finished
+            chunk_done = [0] * len(ranges)
+            pending = set(futures)
+            while pending:
+                finished, pending = await asyncio.wait(pending, timeout=0.5)
+                while not progress_queue.empty():
+                    chunk_id, done = progress_queue.get_nowait()
+                    chunk_done[chunk_id] = done
+                for future in finished:
+                    if future.cancelled() or future.exception() is not None:
+                        continue
+                    if thumbnails is not None:
+                        thumbnails.tiles.update(future.result())
+                    if on_chunk_done:
+                        on_chunk_done(futures[future])
+                if progress_callback:
+                    progress_callback(frames_before + sum(chunk_done), total_frames)
+            # Re-raise the first chunk failure, if any
+            for future in futures:
+                future.result()
+        except BaseException:
+            # Stop chunks that have not started; the caller removes partial chunk files
+            for future in futures:
+                future.cancel()
+            raise
+    
+    def _render_key(self, kind: str, audio_features: Dict[str, Any], config: Dict[str, Any]) -> str:
+        """Canonical hash of everything that determines a render's output."""
+        config = {key: value for key, value in config.items() if key not in RENDER_CACHE_IGNORED_KEYS}
+        return render_fingerprint(kind, RENDERER_VERSION, audio_features, config)
+    
+    def _render_output_path(self, prefix: str, render_key: str) -> Path:
+        """Output file of a render; named by its key when the render cache is enabled."""
+        name = render_key[:32] if settings.RENDER_CACHE_ENABLED else uuid4().hex
+        return self.temp_dir / f"{prefix}_{name}.mp4"
+    
+    def _partial_path(self, output_path: Path) -> Path:
+        """Unique file a render is written to before it is moved to ``output_path``."""
+        return output_path.with_name(f"{output_path.stem}.{uuid4().hex[:8]}.partial.mp4")
+    
+    def _is_cached(self, output_path: Path, total_frames: int,
+                   progress_callback: Optional[ProgressCallback], stream_dir: Optional[Path] = None) -> bool:
+        """Whether an identical render already produced ``output_path``.
+
+        Renders are only moved to their final path once complete, so an existing file is whole.
+        """
+        if not settings.RENDER_CACHE_ENABLED or not output_path.exists():
+            return False
+        logger.info(f"Render cache hit: {output_path}")
+        if stream_dir is not None:
+            if ffmpeg_available():
+                remux_to_hls(output_path, stream_dir)
+            else:
+                logger.warning("ffmpeg is not available; serving the cached render without streaming")
+        if progress_callback:
+            progress_callback(total_frames, total_frames)
+        return True
+    
+    def _open_checkpoint(self, checkpoint_dir: Optional[Path], total_frames: int, fps: float,
+                         render_key: str, stream_dir: Optional[Path] = None,
+                         thumbnails: Optional[ThumbnailSprite] = None) -> Optional[RenderCheckpoint]:
+        """Checkpoint for a resumable render, or None when rendering in one piece.
+
+        Streamed renders are always segmented, in STREAM_SEGMENT_SECONDS pieces that
+        are published to the HLS playlist in ``stream_dir`` as they are committed.
+        Thumbnails of segments finished before a restart are read back from their files.
+        """
+        if stream_dir is not None and checkpoint_dir is None:
+            checkpoint_dir = Path(stream_dir) / "checkpoint"
+        if checkpoint_dir is None or total_frames <= 0:
+            return None
+        if not ffmpeg_available():
+            logger.warning("ffmpeg is not available; rendering without checkpoints or streaming")
+            return None
+        seconds = settings.STREAM_SEGMENT_SECONDS if stream_dir is not None else settings.RENDER_CHECKPOINT_SECONDS
+        checkpoint = RenderCheckpoint(checkpoint_dir, render_key, total_frames, max(1, int(round(seconds * fps))))
+        if stream_dir is not None:
+            playlist = SegmentPlaylist(stream_dir)
+            
+            def publish(index: int):
+                start, end = checkpoint.ranges[index]
+                playlist.add(index, checkpoint.segment_path(index), start / fps, (end - start) / fps)
+            
+            checkpoint.on_commit = publish
+            checkpoint.on_finish = playlist.finish
+            # A resumed render republishes the segments it already has
+            for index in sorted(checkpoint.completed):
+                publish(index)
+        if thumbnails is not None:
+            for index in sorted(checkpoint.completed):
+                thumbnails.capture_video(checkpoint.segment_path(index), checkpoint.ranges[index][0])
+        return checkpoint
+    
+    def _new_thumbnails(self, geometry: RenderGeometry) -> Optional[ThumbnailSprite]:
+        """Sprite collector for a render, or None when THUMBNAILS_ENABLED is off."""
+        if not settings.THUMBNAILS_ENABLED:
+            return None
+        return ThumbnailSprite(geometry.width, geometry.height, geometry.fps)
+    
+    def _save_thumbnails(self, thumbnails: Optional[ThumbnailSprite], output_path: Path, total_frames: int):
+        """Write the sprite sheets next to the video, before the video itself is published."""
+        if thumbnails is not None:
+            thumbnails.save(thumbnail_dir(output_path), total_frames)
+    
+    async def _finish_checkpoint(self, checkpoint: RenderCheckpoint, output_path: Path):
+        """Join all committed segments into ``output_path`` and drop the checkpoint."""
+        await asyncio.to_thread(self._concat_chunks, checkpoint.segment_paths(), output_path)
+        if checkpoint.on_finish is not None:
+            checkpoint.on_finish()
+        checkpoint.remove()
+    
+    async def _render_reactive_checkpointed(self, output_path: Path, checkpoint: RenderCheckpoint,
+                                            render_workers: int, render_args: Tuple,
+                                            progress_callback: Optional[ProgressCallback],
+                                            thumbnails: Optional[ThumbnailSprite] = None):
+        """Render the checkpoint segments that are still missing."""
+        pending = checkpoint.pending()
+        total_frames = checkpoint.total_frames
+        if render_workers > 1 and len(pending) > 1:
+            # Segments are independent, so the pool renders them in any order
+            partial_paths = [checkpoint.partial_path(index) for index in pending]
+            await self._render_ranges_in_pool(
+                [checkpoint.ranges[index] for index in pending], partial_paths, render_workers,
+                render_args, progress_callback, total_frames, frames_before=checkpoint.frames_done(),
+                on_chunk_done=lambda i: checkpoint.commit(pending[i], partial_paths[i]), thumbnails=thumbnails
+            )
         else:
-            spectral_intensity = 0.5
+            for index in pending:
+                start, end = checkpoint.ranges[index]
+                frames_before = checkpoint.frames_done()
+                progress = None
+                if progress_callback:
+                    progress = lambda done, _total: progress_callback(frames_before + done, total_frames)
+                partial_path = checkpoint.partial_path(index)
+                self._render_reactive_range(str(partial_path), start, end, *render_args, progress=progress,
+                                            thumbnails=thumbnails)
+                checkpoint.commit(index, partial_path)
+    
+    def _concat_chunks(self, chunk_paths: List[Path], output_path: Path):
+        """Join encoded chunks in order without re-encoding."""
+        list_path = chunk_paths[0].parent / "chunks.txt"
+        list_path.write_text("".join(f"file '{path.as_posix()}'\n" for path in chunk_paths))
+        subprocess.run(
+            [settings.FFMPEG_BINARY, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+             '-i', str(list_path), '-c', 'copy', str(output_path)],
+            check=True, capture_output=True
+        )
+    
+    def shutdown(self):
+        """Stop render worker processes."""
+        if self._render_pool is not None:
+            self._render_pool.shutdown(wait=False, cancel_futures=True)
+            self._render_pool = None
+        if self._progress_manager is not None:
+            self._progress_manager.shutdown()
+            self._progress_manager = None
+    
+    def _generate_reactive_frame(self, frame_idx: int, feature_timeline: FeatureTimeline,
+                               tempo: float, width: int, height: int,
+                               frequency_bins: Optional[List[float]] = None,
+                               scale: float = 1.0, frame: Optional[np.ndarray] = None) -> np.ndarray:
+        """Generate a single BGR frame based on audio features.
+
+        Draws into ``frame`` (cleared first) when given, else into a new array.
+        Pixel sizes are multiplied by ``scale``, so a downscaled draft matches the full render.
+        """
+        time = frame_idx / feature_timeline.fps
+        # Create base frame
+        if frame is None:
+            frame = np.zeros((height, width, 3), dtype=np.uint8)
+        else:
+            frame.fill(0)
+        
+        # Per-frame features are precomputed: O(1) lookups
+        beat_intensity = feature_timeline.value('beat_intensity', frame_idx)
+        spectral_intensity = feature_timeline.value('spectral_intensity', frame_idx, 0.5)
         
         # Create visual elements
         center_x, center_y = width // 2, height // 2
         
         # Pulsing circle based on beats
-        circle_radius = int(50 + beat_intensity * 100)
+        circle_radius = int((50 + beat_intensity * 100) * scale)
         circle_color = (
-            int(255 * beat_intensity),
+            int(255 * (1 - spectral_intensity)),
             int(255 * spectral_intensity),
-            int(255 * (1 - spectral_intensity))
+            int(255 * beat_intensity)
         )
         cv2.circle(frame, (center_x, center_y), circle_radius, circle_color, -1)
         
-        # Waveform visualization
-        wave_y = center_y + int(100 * np.sin(time * tempo / 60 * 2 * np.pi))
-        for x in range(0, width, 10):
-            wave_intensity = spectral_intensity * np.sin(x * 0.01 + time * 5)
-            wave_height = int(20 * wave_intensity)
-            cv2.line(frame, (x, wave_y), (x, wave_y + wave_height), (100, 200, 255), 2)
+        # Waveform visualization: one vertical line per wave_step pixels, drawn in a single call
+        wave_y = center_y + int(100 * scale * np.sin(time * tempo / 60 * 2 * np.pi))
+        wave_step = max(1, int(round(10 * scale)))
+        wave_thickness = max(1, int(round(2 * scale)))
+        xs = np.arange(0, width, wave_step)
+        wave_heights = (20 * scale * (spectral_intensity * np.sin(xs / scale * 0.01 + time * 5))).astype(np.int32)
+        lines = np.empty((xs.size, 2, 2), dtype=np.int32)
+        lines[:, :, 0] = xs[:, None]
+        lines[:, 0, 1] = wave_y
+        lines[:, 1, 1] = wave_y + wave_heights
+        cv2.polylines(frame, list(lines), False, (255, 200, 100), wave_thickness)
         
         # Frequency bars visualization using frequency-domain data
-        if 'frequency_bins' in video_config:
-            frequency_bins = video_config['frequency_bins']
+        if frequency_bins:
             num_bars = min(len(frequency_bins), 32)  # Limit to 32 bars
             bar_width = width // num_bars
             for i, bin_value in enumerate(frequency_bins[:num_bars]):
@@ -124,70 +429,124 @@ class VideoGenerator:
                 y = height - bar_height
                 color_intensity = int(255 * (i / num_bars))
                 cv2.rectangle(frame, (x, y), (x + bar_width - 2, height), 
-                            (color_intensity, 255 - color_intensity, 128), -1)
+                            (128, 255 - color_intensity, color_intensity), -1)
         
         return frame
     
     def _save_frames_as_video(self, frames: List[np.ndarray], 
-                            output_path: str, fps: int):
-        """Save frames as MP4 video using OpenCV."""
+                            output_path: str, fps: int,
+                            encoder_options: Optional[Dict[str, Any]] = None):
+        """Save RGB frames as an MP4 video with the configured encoder."""
         if not frames:
             raise ValueError("No frames to save")
         
         height, width = frames[0].shape[:2]
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-        
-        for frame in frames:
-            # Convert RGB to BGR for OpenCV
-            frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-            out.write(frame_bgr)
-        
-        out.release()
+        with create_encoder(output_path, width, height, fps, encoder_options) as out:
+            for frame in frames:
+                out.write(frame)
     
     async def create_spectrogram_video(self, audio_file: str, 
-                                     spectrogram_type: str = 'mel') -> str:
-        """Create a video showing animated spectrogram."""
+                                     spectrogram_type: str = 'mel',
+                                     animation_fps: int = 20,
+                                     encoder_options: Optional[Dict[str, Any]] = None,
+                                     width: int = 1280, height: int = 720,
+                                     window_seconds: float = 10.0,
+                                     progress_callback: Optional[ProgressCallback] = None,
+                                     draft: bool = False,
+                                     checkpoint_dir: Optional[Path] = None,
+                                     stream_dir: Optional[Path] = None) -> str:
+        """Create a video of a spectrogram scrolling in sync with the audio.
+
+        ``draft`` renders a low-resolution preview (see :mod:`core.draft`).
+        ``checkpoint_dir`` and ``stream_dir`` work as for the reactive renderer.
+        """
+        render_path = None
         try:
-            from scipy.signal import spectrogram
             import soundfile as sf
 
-            # Read audio file
-            audio_data, sample_rate = sf.read(audio_file)
-
-            # Compute spectrogram
-            frequencies, times, Sxx = spectrogram(audio_data, fs=sample_rate, nperseg=1024)
+            if spectrogram_type not in SPECTROGRAM_TYPES:
+                raise ValueError(f"Unknown spectrogram type: {spectrogram_type}")
 
-            # Normalize spectrogram for visualization
-            Sxx_log = 10 * np.log10(Sxx + 1e-10)
-
-            # Create spectrogram video
-            output_path = self.temp_dir / f"spectrogram_{spectrogram_type}.mp4"
-            fig, ax = plt.subplots(figsize=(12, 8))
+            # Read audio file
+            audio_data, sample_rate = sf.read(audio_file, dtype='float32')
+            if audio_data.ndim > 1:
+                audio_data = audio_data.mean(axis=1)
+            duration = len(audio_data) / sample_rate
+            geometry = render_geometry(width, height, animation_fps, draft)
 
-            def animate(frame_idx):
-                ax.clear()
-                ax.imshow(Sxx_log[:, :frame_idx], aspect='auto', origin='lower', extent=[0, times[frame_idx], frequencies[0], frequencies[-1]])
-                ax.set_title(f'{spectrogram_type.title()} Spectrogram')
-                ax.set_xlabel('Time (s)')
-                ax.set_ylabel('Frequency (Hz)')
+            # Compute and colour-map the spectrogram once
+            values, y_ticks = compute_spectrogram(audio_data, sample_rate, spectrogram_type, settings.HOP_LENGTH)
+            titles = {'mel': 'Mel Spectrogram', 'chroma': 'Chromagram', 'stft': 'STFT Spectrogram'}
+            renderer = ScrollingSpectrogram(
+                values, sample_rate / settings.HOP_LENGTH, geometry.width, geometry.height,
+                title=titles[spectrogram_type], y_ticks=y_ticks,
+                window_seconds=window_seconds, nearest=spectrogram_type == 'chroma', scale=geometry.scale,
+                channel_order='bgr'
+            )
 
-            total_frames = len(times)
-            animation_fps = video_config.get('animation_fps', 20)
-            interval = 1000 // animation_fps  # Calculate interval in milliseconds
-            ani = animation.FuncAnimation(fig, animate, frames=total_frames, interval=interval)
-            ani.save(str(output_path), writer='ffmpeg', fps=animation_fps)
-            plt.close()
+            output_path = self.temp_dir / f"spectrogram_{spectrogram_type}_{uuid4().hex}.mp4"
+            render_path = self._partial_path(output_path)
+            total_frames = max(1, int(np.ceil(duration * geometry.fps)))
+            
+            audio_stat = os.stat(audio_file)
+            render_key = render_fingerprint(
+                'spectrogram', RENDERER_VERSION, str(audio_file), audio_stat.st_size, audio_stat.st_mtime,
+                spectrogram_type, animation_fps, width, height, window_seconds, draft, encoder_options
+            )
+            thumbnails = self._new_thumbnails(geometry)
+            checkpoint = self._open_checkpoint(checkpoint_dir, total_frames, geometry.fps, render_key,
+                                               stream_dir, thumbnails)
+            if checkpoint is not None:
+                segments = [(index, *checkpoint.ranges[index], checkpoint.partial_path(index))
+                            for index in checkpoint.pending()]
+            else:
+                segments = [(None, 0, total_frames, render_path)]
+            encoder_options = native_encoder_options(geometry.width, geometry.height,
+                                                     geometry.encoder_options(encoder_options))
+            
+            for index, start_frame, end_frame, segment_path in segments:
+                with FrameSink(str(segment_path), geometry.width, geometry.height, geometry.fps,
+                               encoder_options) as sink:
+                    for frame_idx in range(start_frame, end_frame):
+                        frame = renderer.render(frame_idx / geometry.fps)
+                        sink.write_bgr(frame)
+                        if thumbnails is not None:
+                            thumbnails.capture(frame_idx, frame)
+                        done = frame_idx + 1
+                        if progress_callback and (done % PROGRESS_INTERVAL_FRAMES == 0 or done == end_frame):
+                            progress_callback(done, total_frames)
+                if checkpoint is not None:
+                    checkpoint.commit(index, segment_path)
+            
+            if checkpoint is not None:
+                await self._finish_checkpoint(checkpoint, render_path)
+            self._save_thumbnails(thumbnails, output_path, total_frames)
+            os.replace(render_path, output_path)
             
             logger.info(f"Generated spectrogram video: {output_path}")
             return str(output_path)
             
         except Exception as e:
+            if render_path is not None:
+                render_path.unlink(missing_ok=True)
             logger.error(f"Error creating spectrogram video: {e}")
             raise
     
     async def add_audio_to_video(self, video_path: str, audio_path: str) -> str:
         """Combine video with audio track."""
+        from uuid import uuid4
+        output_path = self.temp_dir / f"final_video_{uuid4().hex}.mp4"
+        
+        # Fast path: remux with the video stream copied, no re-encode
+        if ffmpeg_available():
+            try:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, mux_audio, video_path, audio_path, str(output_path))
+                logger.info(f"Combined video and audio: {output_path}")
+                return str(output_path)
+            except RuntimeError as e:
+                logger.warning(f"Stream-copy mux failed, re-encoding instead: {e}")
+        
         try:
             video_clip = VideoFileClip(video_path)
             audio_clip = AudioFileClip(audio_path)
@@ -199,13 +558,11 @@ class VideoGenerator:
             # Combine video and audio
             final_clip = video_clip.set_audio(audio_clip)
             
-            output_path = self.temp_dir / f"final_video_{int(audio_clip.duration)}.mp4"
-            output_fps = video_config.get('output_fps', video_clip.fps if hasattr(video_clip, 'fps') else 30)
             final_clip.write_videofile(
                 str(output_path),
                 codec='libx264',
                 audio_codec='aac',
-                fps=output_fps
+                fps=getattr(video_clip, 'fps', None) or 30
             )
             
             # Cleanup
@@ -221,8 +578,32 @@ class VideoGenerator:
             raise
     
     async def apply_video_effects(self, video_path: str, 
-                                effects: List[Dict[str, Any]]) -> str:
-        """Apply various effects to a video."""
+                                effects: List[Dict[str, Any]],
+                                encoder_options: Optional[Dict[str, Any]] = None,
+                                parallel: Optional[bool] = None) -> str:
+        """Apply various effects to a video.
+        
+        ``parallel`` splits the input at keyframes and filters the segments
+        concurrently; by default that happens for inputs of at least
+        VIDEO_EFFECTS_PARALLEL_MIN_SECONDS when more than one worker is configured.
+        """
+        from uuid import uuid4
+        output_path = self.temp_dir / f"effects_video_{uuid4().hex}.mp4"
+        
+        # Fast path: the whole chain as one ffmpeg filtergraph
+        if ffmpeg_available():
+            duration = media_duration(video_path)
+            graph = compile_effects(effects, duration)
+            if graph is not None:
+                if parallel is None:
+                    parallel = settings.VIDEO_EFFECTS_WORKERS > 1 and duration >= settings.VIDEO_EFFECTS_PARALLEL_MIN_SECONDS
+                loop = asyncio.get_running_loop()
+                runner = run_effects_parallel if parallel else run_effects
+                await loop.run_in_executor(None, runner, video_path, str(output_path), graph, encoder_options)
+                logger.info(f"Applied effects to video: {output_path}")
+                return str(output_path)
+            logger.info("Effects chain has no filtergraph equivalent, using moviepy")
+        
         try:
             clip = VideoFileClip(video_path)
             
@@ -245,7 +626,6 @@ class VideoGenerator:
                     factor = effect.get('factor', 1.0)
                     clip = clip.fx(lambda c: c.speedx(factor))
             
-            output_path = self.temp_dir / f"effects_video_{len(effects)}.mp4"
             clip.write_videofile(str(output_path), codec='libx264', fps=30)
             
             clip.close()
@@ -258,110 +638,125 @@ class VideoGenerator:
             raise
     
     async def create_particle_system_video(self, audio_features: Dict[str, Any],
-                                         particle_config: Dict[str, Any]) -> str:
-        """Create a particle system video synchronized to audio."""
+                                         particle_config: Dict[str, Any],
+                                         progress_callback: Optional[ProgressCallback] = None,
+                                         checkpoint_dir: Optional[Path] = None,
+                                         stream_dir: Optional[Path] = None) -> str:
+        """Create a particle system video synchronized to audio.
+
+        The particle RNG is seeded with ``seed`` from the config, or else from the
+        render inputs, so identical requests render identical videos. With a
+        ``checkpoint_dir`` the simulation state is saved after every segment, so
+        an interrupted render continues from its last complete segment; a
+        ``stream_dir`` publishes segments as HLS while rendering. Drafts
+        simulate at full rate and resolution and draw every frame_step-th frame scaled down.
+        """
+        render_path = None
         try:
             duration = audio_features.get('duration', 30)
             fps = particle_config.get('fps', 30)
             width = particle_config.get('width', 1920)
             height = particle_config.get('height', 1080)
+            geometry = render_geometry(width, height, fps, particle_config.get('draft', False))
+            step = geometry.frame_step
             
-            beats = audio_features.get('beats', [])
-            spectral_centroid = audio_features.get('spectral_centroid', [])
+            full_frames = int(duration * fps)
+            total_frames = geometry.output_frames(full_frames)
+            render_key = self._render_key('particles', audio_features, particle_config)
+            output_path = self._render_output_path('particles', render_key)
+            if self._is_cached(output_path, total_frames, progress_callback, stream_dir):
+                return str(output_path)
+            render_path = self._partial_path(output_path)
             
-            # Initialize particles
-            num_particles = particle_config.get('num_particles', 100)
-            particles = self._initialize_particles(num_particles, width, height)
+            feature_timeline = FeatureTimeline.build(audio_features, fps, full_frames, particle_config)
+            beat_intensities = feature_timeline['beat_intensity']
+            rasterizer = ParticleRasterizer(geometry.width, geometry.height, particle_config.get('blend_mode') or 'replace',
+                                            channel_order='bgr')
+            encoder_options = native_encoder_options(geometry.width, geometry.height,
+                                                     geometry.encoder_options(particle_config.get('encoder')))
             
-            frames = []
-            total_frames = int(duration * fps)
+            # (segment index, start frame, end frame, output) for every file still to render
+            thumbnails = self._new_thumbnails(geometry)
+            checkpoint = self._open_checkpoint(checkpoint_dir, total_frames, geometry.fps, render_key,
+                                               stream_dir, thumbnails)
+            state = None
+            if checkpoint is not None:
+                first = checkpoint.resume_index()
+                state = checkpoint.state(first - 1) if first else None
+                if first and state is None:
+                    # Without the simulation state the video can only continue from frame 0
+                    logger.warning("Particle state missing from the render checkpoint; re-rendering from the start")
+                    first = 0
+                segments = [(index, *checkpoint.ranges[index], checkpoint.partial_path(index))
+                            for index in range(first, len(checkpoint.ranges))]
+            else:
+                segments = [(None, 0, total_frames, render_path)]
             
-            for frame_idx in range(total_frames):
-                current_time = frame_idx / fps
-                
-                # Update particles based on audio
-                self._update_particles(particles, current_time, beats, spectral_centroid)
-                
-                # Render frame
-                frame = self._render_particles(particles, width, height)
-                frames.append(frame)
+            # Initialize particles
+            if state is not None:
+                particles = ParticleSystem.from_state_dict(state)
+            else:
+                num_particles = particle_config.get('num_particles', 100)
+                seed = particle_config.get('seed')
+                if seed is None:
+                    # A draft and its promoted render simulate the same particles
+                    seed = int(self._render_key('particles', audio_features, {**particle_config, 'draft': False})[:16], 16)
+                particles = self._initialize_particles(num_particles, width, height, seed)
+            
+            for index, start_frame, end_frame, segment_path in segments:
+                # Frames are encoded on a background thread as they are rendered
+                with FrameSink(str(segment_path), geometry.width, geometry.height, geometry.fps, encoder_options) as sink:
+                    for frame_idx in range(start_frame, end_frame):
+                        # Update particles based on audio, up to full-rate frame frame_idx * step
+                        for sim_idx in range(max(0, (frame_idx - 1) * step + 1), frame_idx * step + 1):
+                            self._update_particles(particles, float(beat_intensities[sim_idx]))
+                        
+                        # Render frame
+                        frame = self._render_particles(particles, rasterizer)
+                        sink.write_bgr(frame)
+                        if thumbnails is not None:
+                            thumbnails.capture(frame_idx, frame)
+                        done = frame_idx + 1
+                        if progress_callback and (done % PROGRESS_INTERVAL_FRAMES == 0 or done == end_frame):
+                            progress_callback(done, total_frames)
+                if checkpoint is not None:
+                    checkpoint.commit(index, segment_path, particles.state_dict())
             
-            # Save video
-            from uuid import uuid4
-            unique_id = uuid4().hex
-            output_path = self.temp_dir / f"particles_{unique_id}.mp4"
-            self._save_frames_as_video(frames, str(output_path), fps)
+            if checkpoint is not None:
+                await self._finish_checkpoint(checkpoint, render_path)
+            self._save_thumbnails(thumbnails, output_path, total_frames)
+            os.replace(render_path, output_path)
             
             logger.info(f"Generated particle system video: {output_path}")
             return str(output_path)
             
         except Exception as e:
+            if render_path is not None:
+                render_path.unlink(missing_ok=True)
             logger.error(f"Error creating particle system video: {e}")
             raise
     
-    def _initialize_particles(self, num_particles: int, width: int, height: int) -> List[Dict]:
+    def _initialize_particles(self, num_particles: int, width: int, height: int,
+                              seed: Optional[int] = None) -> ParticleSystem:
         """Initialize particle system."""
-        particles = []
-        for _ in range(num_particles):
-            particle = {
-                'x': np.random.uniform(0, width),
-                'y': np.random.uniform(0, height),
-                'vx': np.random.uniform(-2, 2),
-                'vy': np.random.uniform(-2, 2),
-                'size': np.random.uniform(2, 8),
-                'color': (
-                    np.random.randint(100, 255),
-                    np.random.randint(100, 255),
-                    np.random.randint(100, 255)
-                ),
-                'life': 1.0
-            }
-            particles.append(particle)
-        return particles
+        return ParticleSystem(num_particles, width, height, rng=np.random.default_rng(seed))
     
-    def _update_particles(self, particles: List[Dict], time: float,
-                        beats: List[float], spectral_centroid: List[float]):
+    def _update_particles(self, particles: ParticleSystem, beat_intensity: float):
         """Update particle positions and properties."""
-        # Check for beat events
-        beat_intensity = 0
-        for beat_time in beats:
-            if abs(time - beat_time) < 0.1:
-                beat_intensity = 1.0 - abs(time - beat_time) * 10
-        
-        for particle in particles:
-            # Update position
-            particle['x'] += particle['vx']
-            particle['y'] += particle['vy']
-            
-            # Apply beat effects
-            if beat_intensity > 0:
-                particle['vx'] *= (1 + beat_intensity * 0.5)
-                particle['vy'] *= (1 + beat_intensity * 0.5)
-                particle['size'] *= (1 + beat_intensity * 0.3)
-            
-            # Boundary conditions
-            if particle['x'] < 0 or particle['x'] > width:
-                particle['vx'] *= -0.8
-            if particle['y'] < 0 or particle['y'] > height:
-                particle['vy'] *= -0.8
-            
-            # Update life
-            particle['life'] *= 0.998
-            if particle['life'] < 0.1:
-                particle['life'] = 1.0
-                particle['x'] = np.random.uniform(0, width)
-                particle['y'] = np.random.uniform(0, height)
+        particles.update(beat_intensity)
     
-    def _render_particles(self, particles: List[Dict], width: int, height: int) -> np.ndarray:
-        """Render particles to frame."""
-        frame = np.zeros((height, width, 3), dtype=np.uint8)
-        
-        for particle in particles:
-            x, y = int(particle['x']), int(particle['y'])
-            size = int(particle['size'] * particle['life'])
-            color = tuple(int(c * particle['life']) for c in particle['color'])
-            
-            if 0 <= x < width and 0 <= y < height and size > 0:
-                cv2.circle(frame, (x, y), size, color, -1)
-        
-        return frame
+    def _render_particles(self, particles: ParticleSystem, rasterizer: ParticleRasterizer) -> np.ndarray:
+        """Render particles to frame (the rasterizer's reused buffer)."""
+        return rasterizer.render(particles)
+
+def _render_reactive_chunk(chunk_id: int, chunk_path: str, start_frame: int, end_frame: int,
+                           render_args: Tuple, progress_queue,
+                           thumbnails: Optional[ThumbnailSprite] = None) -> Dict[int, np.ndarray]:
+    """Render one frame range of a reactive video in a worker process; returns its thumbnail tiles."""
+    generator = VideoGenerator()
+    generator._render_reactive_range(
+        chunk_path, start_frame, end_frame, *render_args,
+        progress=lambda done, total: progress_queue.put((chunk_id, done)),
+        thumbnails=thumbnails
+    )
+    return thumbnails.tiles if thumbnails is not None else {}
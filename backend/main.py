@@ -18,6 +18,7 @@ from core.config import settings
 from core.audio_processor import AudioProcessor
 from core.video_generator import VideoGenerator
 from core.ml_models import MLModelManager
+from core.render_jobs import RenderJobQueue
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -27,6 +28,7 @@ logger = logging.getLogger(__name__)
 audio_processor = AudioProcessor()
 video_generator = VideoGenerator()
 ml_manager = MLModelManager()
+render_jobs = RenderJobQueue(video_generator, ml_manager)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -38,13 +40,21 @@ async def lifespan(app: FastAPI):
     os.makedirs(settings.TEMP_AUDIO_DIR, exist_ok=True)
     os.makedirs(settings.TEMP_VIDEO_DIR, exist_ok=True)
     os.makedirs(settings.TEMP_ML_DIR, exist_ok=True)
+    os.makedirs(settings.RENDER_JOBS_DIR, exist_ok=True)
     
     # Initialize ML models
     await ml_manager.load_default_models()
+    if settings.ML_WATCH_MODELS or settings.WORKERS > 1:
+        # With several workers the watcher also carries /models/reload to every process
+        ml_manager.start_model_watcher(watch_files=settings.ML_WATCH_MODELS)
+    
+    # Start render workers; jobs queued before a restart resume here
+    render_jobs.add_listener(websocket.publish_render_job)
+    await render_jobs.start()
     
     # Set global instances in route modules
     audio.set_global_instances(audio_processor, ml_manager)
-    video.set_global_instances(video_generator, ml_manager)
+    video.set_global_instances(video_generator, ml_manager, render_jobs)
     ml.set_global_instances(ml_manager)
     
     logger.info("Backend startup complete!")
@@ -53,7 +63,9 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down Monograuvi Backend...")
+    await render_jobs.stop()
     await ml_manager.cleanup()
+    video_generator.shutdown()
 
 # Initialize FastAPI app with lifespan
 app = FastAPI(
@@ -103,5 +115,6 @@ if __name__ == "__main__":
         host=settings.HOST,
         port=settings.PORT,
         reload=settings.DEBUG,
+        workers=1 if settings.DEBUG else settings.WORKERS,
         log_level="info"
     )